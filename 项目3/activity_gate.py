@@ -0,0 +1,89 @@
+import numpy as np
+
+from audio_analysis import compute_db
+from config import (ACTIVITY_GATE_ENABLED, ACTIVITY_HANGOVER_WINDOWS, ACTIVITY_THRESHOLD_DB,
+                    ACTIVITY_VAD_ENABLED, ACTIVITY_VAD_MIN_RATIO, VAD_AGGRESSIVENESS)
+from metrics import metrics
+
+VAD_FRAME_MS = 30
+
+
+class ActivityGate:
+    """
+    分析前的活动检测：窗口RMS低于阈值（启用VAD时还要求有足够的语音帧）判定为无信号，
+    调用方跳过速度跟踪、BPM和频谱计算，只发布响度和"无信号"状态
+
+    由有信号转为无信号后仍放行 hangover 个窗口（渐弱的结尾照常分析）；
+    当前是否无信号写入仪表 no_signal（标签 gauge_labels，如 {'stream': 流ID}），被跳过的窗口计入 no_signal_windows
+    """
+
+    def __init__(self, threshold_db=ACTIVITY_THRESHOLD_DB, use_vad=ACTIVITY_VAD_ENABLED,
+                 vad_min_ratio=ACTIVITY_VAD_MIN_RATIO, hangover=ACTIVITY_HANGOVER_WINDOWS,
+                 enabled=ACTIVITY_GATE_ENABLED, gauge_labels=None):
+        self.threshold_db = threshold_db
+        self.use_vad = use_vad
+        self.vad_min_ratio = vad_min_ratio
+        self.hangover = hangover
+        self.enabled = enabled
+        self.gauge_labels = gauge_labels
+        self.publish = True
+        self.vad = None  # 第一次用到时创建（webrtcvad在未启用VAD时不导入）
+        self.reset()
+
+    def reset(self):
+        self.active = True
+        self.level_db = None
+        self.quiet_windows = self.hangover  # 开始时就是静音的话第一个窗口即跳过
+        self._publish_state()
+
+    def _publish_state(self):
+        if self.publish:
+            metrics.set_gauge('no_signal', int(not self.active), self.gauge_labels)
+
+    def drop_gauge(self):
+        """移除仪表，之后不再写入（所属的流被删除时调用）"""
+        self.publish = False
+        metrics.remove_gauge('no_signal', self.gauge_labels)
+
+    def check(self, audio, rate):
+        """
+        判断一个窗口是否需要完整分析，同时记录窗口响度（level_db，未补偿的dBFS）
+
+        返回:
+            bool: True表示有信号（或在hangover内），False表示无信号
+        """
+        self.level_db = compute_db(audio)
+        if not self.enabled:
+            return True
+        if self._detect(audio, rate):
+            self.quiet_windows = 0
+        else:
+            self.quiet_windows += 1
+        active = self.quiet_windows <= self.hangover
+        if not active:
+            metrics.inc('no_signal_windows')
+        if active != self.active:
+            self.active = active
+            self._publish_state()
+        return active
+
+    def _detect(self, audio, rate):
+        if self.level_db < self.threshold_db:
+            return False
+        if not self.use_vad:
+            return True
+        # VAD只在响度已过阈值时运行，静音窗口只花一次RMS
+        return self._voiced_ratio(audio, rate) >= self.vad_min_ratio
+
+    def _voiced_ratio(self, audio, rate):
+        from vad_processor import VAD_RATES, frame_generator
+        if rate not in VAD_RATES:
+            return 1.0  # WebRTC VAD不支持该采样率，只按响度判断
+        if self.vad is None:
+            import webrtcvad
+            self.vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        frames = list(frame_generator(VAD_FRAME_MS, pcm, rate))
+        if not frames:
+            return 1.0
+        return sum(self.vad.is_speech(frame, rate) for frame in frames) / len(frames)
@@ -0,0 +1,77 @@
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from audio_analysis import DEFAULT_RATE, denoise_window, window_result, window_tasks
+
+METRICS = ('tempo', 'fft', 'rms')
+
+
+def _timed_call(fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    return value, time.perf_counter() - start
+
+
+class AnalysisExecutor:
+    """
+    去噪后把互相独立的BPM、主频、响度计算（audio_analysis.window_tasks）并发提交到线程池
+
+    NumPy的FFT和librosa内部的大部分数组运算会释放GIL，多核机器上
+    一个窗口的耗时接近最慢的一项而不是各项之和；结果与 audio_analysis.analyze_window 相同。
+    max_workers为1（如单核机器）时在调用线程中依次计算，没有线程切换开销
+    """
+
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            max_workers = min(len(METRICS) + 1, os.cpu_count() or 1)
+        self.max_workers = max_workers
+        self.executor = None
+        if max_workers > 1:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis')
+
+    def submit(self, fn, *args):
+        """
+        提交一个计算任务
+
+        返回:
+            Future: 结果为 (返回值, 耗时秒)
+        """
+        if self.executor is not None:
+            return self.executor.submit(_timed_call, fn, *args)
+        future = Future()
+        try:
+            future.set_result(_timed_call(fn, *args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def analyze(self, audio, rate=DEFAULT_RATE, noise_templates=None, timings=None, freq_range=None,
+                quality=None, with_tempo=True):
+        """
+        分析一个时间窗口（参数与 analyze_window 相同）
+
+        参数:
+            timings (dict, optional): 传入时记录各项耗时（秒），键为 denoise/tempo/fft/rms，
+                                      analysis_wall 为并发部分的实际耗时
+
+        返回:
+            dict: {'bpm': float, 'db': float, 'hz': float}
+        """
+        audio = denoise_window(audio, noise_templates, quality, timings)
+        start = time.perf_counter()
+        # window_tasks按耗时从大到小排列，最慢的tempo最先提交
+        futures = {name: self.submit(fn, *args)
+                   for name, (fn, args) in window_tasks(audio, rate, freq_range, quality, with_tempo).items()}
+        values = {}
+        for name, future in futures.items():
+            values[name], elapsed = future.result()
+            if timings is not None:
+                timings[name] = timings.get(name, 0.0) + elapsed
+        if timings is not None:
+            timings['analysis_wall'] = timings.get('analysis_wall', 0.0) + time.perf_counter() - start
+        return window_result(values)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频文件异步分析任务
+上传的WAV边接收边写入磁盘并计算SHA-256（不在内存中缓存整个文件），
+提交到进程池做BPM/VAD/特征分析；结果按 内容哈希 + 分析项 缓存在磁盘，重复上传直接返回
+
+目录结构（ANALYSIS_JOBS_DIR）:
+    uploads/<sha256>.wav           上传的文件（相同内容只保留一份，没有进行中的任务用到时删除）
+    results/<sha256>_<分析项>.json  分析结果缓存
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from collections import Counter
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import ANALYSIS_JOBS_DIR, ANALYSIS_JOB_WORKERS, ANALYSIS_UPLOAD_MAX_BYTES
+from metrics import metrics
+
+ANALYSES = ('bpm', 'vad', 'features')
+UPLOAD_CHUNK_BYTES = 64 * 1024
+MAX_FINISHED_JOBS = 1000  # 内存中保留的已完成任务数，超出时丢弃最早的（结果仍在磁盘缓存中）
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def _analyze_bpm(path):
+    from bpm_estimator import estimate_tempo_curve
+    from audio_analysis import compute_bpm
+    import librosa
+    audio, sr = librosa.load(path, sr=None, mono=True)
+    curve = estimate_tempo_curve(audio, sr)
+    return {
+        'bpm': compute_bpm(audio, sr),
+        'curve': {'times': [round(float(t), 3) for t in curve['times']],
+                  'bpm': [round(float(b), 2) for b in curve['bpm']],
+                  'confidence': [round(float(c), 3) for c in curve['confidence']]},
+    }
+
+
+def _analyze_vad(path):
+    from vad_processor import vad_segment_audio
+    segments = [(start, end) for start, end, _ in vad_segment_audio(path)]
+    with wave.open(path, 'rb') as wf:
+        duration = wf.getnframes() / wf.getframerate()
+    voiced = sum(end - start for start, end in segments)
+    return {
+        'segments': [{'start': start, 'end': end} for start, end in segments],
+        'voiced_seconds': round(voiced, 3),
+        'voiced_ratio': round(voiced / duration, 4) if duration else 0.0,
+    }
+
+
+def _analyze_features(path):
+    import librosa
+    import numpy as np
+    from audio_analysis import compute_db, compute_main_freq
+    from config import MEL_N_MELS
+    audio, sr = librosa.load(path, sr=None, mono=True)
+    mel = librosa.amplitude_to_db(librosa.feature.melspectrogram(y=audio, sr=sr, n_mels=MEL_N_MELS),
+                                  ref=np.max)
+    return {
+        'duration': round(len(audio) / sr, 3),
+        'sample_rate': int(sr),
+        'db': float(compute_db(audio)),
+        'hz': float(compute_main_freq(audio, sr)),
+        'spectral_centroid': float(np.mean(librosa.feature.spectral_centroid(y=audio, sr=sr))),
+        'mel_mean_db': [round(float(v), 2) for v in mel.mean(axis=1)],
+    }
+
+
+ANALYZERS = {'bpm': _analyze_bpm, 'vad': _analyze_vad, 'features': _analyze_features}
+
+
+def analyze_file(path, analyses):
+    """
+    进程池中执行：对一个WAV文件运行指定的分析
+
+    返回:
+        dict: {分析项: 结果, 'timings': {分析项: 耗时秒}}
+    """
+    result = {'timings': {}}
+    for name in analyses:
+        start = time.perf_counter()
+        result[name] = ANALYZERS[name](path)
+        result['timings'][name] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def parse_analyses(text):
+    """'bpm,vad' → ('bpm', 'vad')；为空时返回全部分析项"""
+    if not text:
+        return ANALYSES
+    names = [name.strip() for name in text.split(',') if name.strip()]
+    unknown = [name for name in names if name not in ANALYZERS]
+    if unknown:
+        raise ValueError(f"Unknown analyses: {', '.join(unknown)} (available: {', '.join(ANALYSES)})")
+    return tuple(name for name in ANALYSES if name in names)
+
+
+class AnalysisJobManager:
+    """
+    分析任务管理：接收上传、去重、调度进程池、缓存结果
+
+    任务状态: queued → running → done / error；命中缓存的任务直接为 done（cached=True）。
+    内容与分析项都相同、仍在进行中的任务会被复用，不重复计算。
+    工作进程异常退出（BrokenProcessPool）时池中的任务都以 error 结束，下一次提交重建进程池
+    """
+
+    def __init__(self, root=ANALYSIS_JOBS_DIR, max_workers=ANALYSIS_JOB_WORKERS,
+                 max_upload_bytes=ANALYSIS_UPLOAD_MAX_BYTES):
+        self.root = root
+        self.upload_dir = os.path.join(root, 'uploads')
+        self.result_dir = os.path.join(root, 'results')
+        os.makedirs(self.upload_dir, exist_ok=True)
+        os.makedirs(self.result_dir, exist_ok=True)
+        self.max_workers = max_workers
+        self.max_upload_bytes = max_upload_bytes
+        self.executor = None  # 第一次提交时才创建进程池
+        self.jobs = {}
+        self.pending = {}  # 缓存键 → 进行中的任务ID
+        self.futures = {}  # 任务ID → Future（仅进行中的任务）
+        self.upload_refs = Counter()  # sha256 → 仍要用到上传文件的请求/任务数，归零时删除文件
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+    def save_upload(self, stream):
+        """
+        把上传数据按块写入磁盘，同时计算SHA-256
+
+        参数:
+            stream: 可读的文件对象（如 request.stream）
+
+        返回:
+            tuple: (sha256十六进制, 文件路径, 字节数)；用完后须调用 _release_upload(sha)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(suffix='.part', dir=self.upload_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(UPLOAD_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if self.max_upload_bytes and size > self.max_upload_bytes:
+                        raise UploadTooLarge(f"Upload exceeds {self.max_upload_bytes} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+            sha = digest.hexdigest()
+            path = os.path.join(self.upload_dir, f'{sha}.wav')
+            with self.lock:
+                # 与 _release_upload 的删除互斥：文件要么已存在且被本次引用，要么由本次写入
+                if os.path.exists(path):
+                    os.remove(tmp_path)  # 相同内容已存在
+                else:
+                    os.replace(tmp_path, path)
+                self.upload_refs[sha] += 1
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        metrics.inc('job_upload_bytes', size)
+        return sha, path, size
+
+    @staticmethod
+    def _check_wave(path):
+        try:
+            with wave.open(path, 'rb') as wf:
+                if wf.getnframes() == 0:
+                    raise ValueError("WAV file contains no audio")
+        except (wave.Error, EOFError) as e:
+            raise ValueError(f"Not a valid PCM WAV file: {e}")
+
+    def _result_path(self, key):
+        return os.path.join(self.result_dir, f'{key}.json')
+
+    def _release_upload(self, sha):
+        """释放一次对上传文件的引用，没有请求/任务再用到时删除文件（调用方持有self.lock）"""
+        self.upload_refs[sha] -= 1
+        if self.upload_refs[sha] > 0:
+            return
+        del self.upload_refs[sha]
+        try:
+            os.remove(os.path.join(self.upload_dir, f'{sha}.wav'))
+        except OSError:
+            pass
+
+    def _submit_to_pool(self, path, analyses):
+        """
+        提交到进程池（调用方持有self.lock）；进程池已损坏时丢弃并用新建的进程池重试一次
+
+        返回:
+            tuple: (Future, 所用的进程池)
+        """
+        for attempt in range(2):
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            executor = self.executor
+            try:
+                return executor.submit(analyze_file, path, analyses), executor
+            except BrokenProcessPool:
+                self._discard_executor(executor)
+                if attempt:
+                    raise
+
+    def _discard_executor(self, executor):
+        """丢弃已损坏的进程池，下一次提交时重建（调用方持有self.lock）"""
+        if self.executor is executor:
+            self.executor = None
+            metrics.inc('job_pool_restarts')
+            executor.shutdown(wait=False)
+
+    def submit(self, stream, analyses=ANALYSES):
+        """
+        接收上传并创建分析任务
+
+        返回:
+            dict: 任务快照（命中缓存时 status 已为 done）
+        """
+        sha, path, size = self.save_upload(stream)
+        try:
+            self._check_wave(path)
+        except ValueError:
+            with self.lock:
+                self._release_upload(sha)
+            raise
+        key = f"{sha}_{'-'.join(analyses)}"
+        job = {'id': uuid.uuid4().hex, 'sha256': sha, 'size': size, 'analyses': list(analyses),
+               'status': 'queued', 'cached': False, 'created': time.time(), 'finished': None,
+               'result': None, 'error': None}
+
+        result_path = self._result_path(key)
+        if os.path.exists(result_path):
+            with open(result_path, encoding='utf-8') as f:
+                job.update(status='done', cached=True, finished=time.time(), result=json.load(f))
+            metrics.inc('job_cache_hits')
+            with self.lock:
+                self._add_job(job)
+                self._release_upload(sha)
+            return dict(job)
+
+        with self.lock:
+            existing = self.pending.get(key)
+            if existing is not None:
+                metrics.inc('job_cache_hits')
+                self._release_upload(sha)  # 进行中的任务持有自己的引用
+                return self._snapshot(self.jobs[existing])
+            try:
+                future, executor = self._submit_to_pool(path, analyses)
+            except RuntimeError as e:
+                # 新建的进程池也无法提交（BrokenProcessPool）或已关闭：任务直接失败，不登记为进行中
+                metrics.inc('errors')
+                job.update(status='error', error=f"{type(e).__name__}: {e}", finished=time.time())
+                self._add_job(job)
+                self._release_upload(sha)
+                return dict(job)
+            # 提交成功后才登记，之后相同内容的上传复用这个任务
+            self._add_job(job)
+            self.pending[key] = job['id']
+            self.futures[job['id']] = future
+        metrics.inc('job_cache_misses')
+        future.add_done_callback(lambda f: self._finish(job['id'], key, sha, f, executor))
+        return self.get(job['id'])
+
+    def _add_job(self, job):
+        self.jobs[job['id']] = job
+        if len(self.jobs) > MAX_FINISHED_JOBS:
+            for job_id in [j for j, item in self.jobs.items() if item['status'] in ('done', 'error')]:
+                if len(self.jobs) <= MAX_FINISHED_JOBS:
+                    break
+                del self.jobs[job_id]
+
+    def _finish(self, job_id, key, sha, future, executor):
+        broken = False
+        try:
+            result = future.result()
+            error = None
+        except (Exception, CancelledError) as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+            broken = isinstance(e, BrokenProcessPool)
+        if result is not None:
+            metrics.observe_many({f'job_{name}': seconds for name, seconds in result['timings'].items()})
+            tmp_path = self._result_path(key) + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, self._result_path(key))
+        with self.changed:
+            if broken:
+                # 工作进程异常退出：池中其余任务同样以 BrokenProcessPool 结束，新任务提交到重建的进程池
+                self._discard_executor(executor)
+            self.pending.pop(key, None)
+            self.futures.pop(job_id, None)
+            self._release_upload(sha)
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.update(status='error' if error else 'done', result=result, error=error,
+                           finished=time.time())
+                metrics.observe('job', job['finished'] - job['created'])
+            self.changed.notify_all()
+
+    def _snapshot(self, job):
+        snapshot = dict(job)
+        future = self.futures.get(job['id'])
+        if future is not None and future.running():
+            snapshot['status'] = 'running'
+        return snapshot
+
+    def get(self, job_id):
+        """任务快照，任务不存在时返回None"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return self._snapshot(job) if job is not None else None
+
+    def wait(self, job_id, timeout=None):
+        """
+        等待任务结束（或超时），返回最新快照
+
+        参数:
+            timeout (float, optional): 最长等待秒数，None表示一直等待
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.changed:
+            while True:
+                job = self.jobs.get(job_id)
+                if job is None or job['status'] in ('done', 'error'):
+                    return dict(job) if job is not None else None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return self._snapshot(job)
+                self.changed.wait(remaining)
+
+    def list_jobs(self):
+        """全部任务的概要（不含结果）"""
+        with self.lock:
+            return [{k: v for k, v in self._snapshot(job).items() if k != 'result'}
+                    for job in self.jobs.values()]
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,8 +1,18 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, Response, stream_with_context
+import json
 import random
 import time
 import threading
 from datetime import datetime
+from stream_manager import stream_manager
+from measurement_store import MeasurementStore
+from downsample import downsample_history
+from metrics import metrics
+from beat_tracker import BeatTracker
+from config import PUSH_SERVER_ENABLED, PUSH_SERVER_PORT, PCM_INGEST_UDP_ENABLED, PCM_INGEST_UDP_PORT
+from push_server import PushServer
+from pcm_ingest import ingest_hub
+from analysis_jobs import AnalysisJobManager, UploadTooLarge, parse_analyses
 
 audio_bp = Blueprint('audio', __name__)
 
@@ -15,6 +25,7 @@ audio_data = {
     'is_recording': False,
     'split_time': 2.0,
     'frequency_range': {'min': 1000, 'max': 16000},
+    'seq': 0,  # 每次更新加一，供长轮询判断是否有新数据
     'history': {
         'bpm': [],
         'db': [],
@@ -25,40 +36,87 @@ audio_data = {
 
 # 数据更新锁
 data_lock = threading.Lock()
+# 与data_lock共用同一把锁：开始/停止录制、修改分段时间、产生新数据时通知等待者
+data_changed = threading.Condition(data_lock)
+
+# 测量数据持久化（批量写入SQLite），多路流的结果同样写入
+measurement_store = MeasurementStore()
+stream_manager.measurement_store = measurement_store
+
+# 显示终端推送：每条新测量值推送给所有长连接客户端，替代ESP32反复轮询
+push_server = None
+if PUSH_SERVER_ENABLED:
+    push_server = PushServer(port=PUSH_SERVER_PORT).start()
+    stream_manager.result_listeners.append(
+        lambda audio_stream, result: push_server.publish_measurement(
+            int(round(result['bpm'])), int(round(result['db'])), int(round(result['hz'])),
+            stream_id=audio_stream.stream_id, no_signal=result.get('no_signal', False)))
+
+# 远程设备推送的PCM（UDP带序号；HTTP接口见 /ingest/<stream_id>）
+if PCM_INGEST_UDP_ENABLED:
+    ingest_hub.start_udp(port=PCM_INGEST_UDP_PORT)
+
+# 上传文件的异步分析（进程池），结果按内容哈希缓存
+job_manager = AnalysisJobManager()
+MAX_JOB_WAIT = 30.0          # 秒；GET /jobs/<id>?wait= 的最长等待时间
+JOB_STREAM_HEARTBEAT = 15.0  # 秒；/jobs/<id>/stream 在任务未结束时重复发送状态行的间隔
+
+# 默认数据源（模拟数据）没有音频，按当前BPM生成相位连续的节拍网格
+beat_tracker = BeatTracker()
 
 def simulate_audio_data():
-    """模拟音频数据更新"""
-    while True:
-        with data_lock:
-            if audio_data['is_recording']:
-                # 模拟BPM变化 (120-200)
-                audio_data['bpm'] = max(120, min(200, 
-                    audio_data['bpm'] + random.randint(-5, 5)))
-                
-                # 模拟dB变化 (10-50)
-                audio_data['db'] = max(10, min(50, 
-                    audio_data['db'] + random.randint(-3, 3)))
-                
-                # 模拟Hz变化 (1000-5000)
-                audio_data['hz'] = max(1000, min(5000, 
-                    audio_data['hz'] + random.randint(-200, 200)))
-                
-                # 更新时间戳
-                audio_data['timestamp'] = datetime.now().isoformat()
-                
-                # 添加到历史数据
-                audio_data['history']['bpm'].append(audio_data['bpm'])
-                audio_data['history']['db'].append(audio_data['db'])
-                audio_data['history']['hz'].append(audio_data['hz'])
-                audio_data['history']['timestamps'].append(audio_data['timestamp'])
-                
-                # 限制历史数据长度
-                max_history = 100
-                for key in audio_data['history']:
-                    if len(audio_data['history'][key]) > max_history:
-                        audio_data['history'][key] = audio_data['history'][key][-max_history:]
-        
-        time.sleep(audio_data['split_time'])
+    """
+    模拟音频数据更新
+
+    未录制时在条件变量上挂起（不定时唤醒）；开始/停止录制或修改分段时间时立即被唤醒，
+    停止后不会再多产生一个数据点
+    """
+    last_update = None
+    with data_changed:
+        while True:
+            if not audio_data['is_recording']:
+                last_update = None
+                data_changed.wait()
+                continue
+            now = time.monotonic()
+            if last_update is not None and now < last_update + audio_data['split_time']:
+                data_changed.wait(last_update + audio_data['split_time'] - now)
+                continue
+            last_update = now
+
+            # 模拟BPM变化 (120-200)
+            audio_data['bpm'] = max(120, min(200, 
+                audio_data['bpm'] + random.randint(-5, 5)))
+            
+            # 模拟dB变化 (10-50)
+            audio_data['db'] = max(10, min(50, 
+                audio_data['db'] + random.randint(-3, 3)))
+            
+            # 模拟Hz变化 (1000-5000)
+            audio_data['hz'] = max(1000, min(5000, 
+                audio_data['hz'] + random.randint(-200, 200)))
+            
+            # 更新时间戳
+            audio_data['timestamp'] = datetime.now().isoformat()
+            audio_data['seq'] += 1
+            
+            # 添加到历史数据
+            audio_data['history']['bpm'].append(audio_data['bpm'])
+            audio_data['history']['db'].append(audio_data['db'])
+            audio_data['history']['hz'].append(audio_data['hz'])
+            audio_data['history']['timestamps'].append(audio_data['timestamp'])
+            measurement_store.add(audio_data['bpm'], audio_data['db'], audio_data['hz'])
+            beat_tracker.set_tempo_hint(audio_data['bpm'])
+            if push_server is not None:
+                push_server.publish_measurement(audio_data['bpm'], audio_data['db'], audio_data['hz'])
+            
+            # 限制历史数据长度
+            max_history = 100
+            for key in audio_data['history']:
+                if len(audio_data['history'][key]) > max_history:
+                    audio_data['history'][key] = audio_data['history'][key][-max_history:]
+            # 唤醒等待新数据的长轮询请求
+            data_changed.notify_all()
 
 # 启动后台数据模拟线程
 simulation_thread = threading.Thread(target=simulate_audio_data, daemon=True)
@@ -117,19 +175,22 @@ def get_hz():
 
 @audio_bp.route('/history', methods=['GET'])
 def get_history():
-    """获取历史数据"""
+    """获取历史数据，可选参数max_points按LTTB降采样"""
+    max_points = request.args.get('max_points', type=int)
     with data_lock:
+        history = downsample_history(audio_data['history'], max_points)
         return jsonify({
-            'history': audio_data['history'],
-            'count': len(audio_data['history']['bpm']),
+            'history': history,
+            'count': len(history['bpm']),
             'timestamp': datetime.now().isoformat()
         })
 
 @audio_bp.route('/recording/start', methods=['POST'])
 def start_recording():
     """开始录制"""
-    with data_lock:
+    with data_changed:
         audio_data['is_recording'] = True
+        data_changed.notify_all()
         return jsonify({
             'status': 'success',
             'message': 'Recording started',
@@ -140,8 +201,9 @@ def start_recording():
 @audio_bp.route('/recording/stop', methods=['POST'])
 def stop_recording():
     """停止录制"""
-    with data_lock:
+    with data_changed:
         audio_data['is_recording'] = False
+        data_changed.notify_all()
         return jsonify({
             'status': 'success',
             'message': 'Recording stopped',
@@ -172,8 +234,9 @@ def get_config():
 def set_split_time(split_time):
     """设置分段时间"""
     if 0.5 <= split_time <= 10.0:
-        with data_lock:
+        with data_changed:
             audio_data['split_time'] = split_time
+            data_changed.notify_all()
             return jsonify({
                 'status': 'success',
                 'message': f'Split time set to {split_time}s',
@@ -187,15 +250,40 @@ def set_split_time(split_time):
             'timestamp': datetime.now().isoformat()
         }), 400
 
+MAX_LONG_POLL_WAIT = 30.0  # 秒；长轮询的最长等待时间
+
+def _wait_for_update(since, wait):
+    """
+    长轮询：since 与当前 seq 相同时等待新数据（或录制状态变化、超时）再返回；
+    调用方需持有 data_changed
+    """
+    if since is None or not wait:
+        return
+    deadline = time.monotonic() + min(wait, MAX_LONG_POLL_WAIT)
+    recording = audio_data['is_recording']
+    while audio_data['seq'] == since and audio_data['is_recording'] == recording:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        data_changed.wait(remaining)
+
 @audio_bp.route('/esp32/data', methods=['GET'])
 def get_esp32_data():
-    """专为ESP32优化的数据接口"""
-    with data_lock:
+    """
+    专为ESP32优化的数据接口
+    可选参数 since=上次返回的seq & wait=秒：没有新数据时挂起请求直到有新数据（长轮询），
+    设备收到响应后立即发起下一次请求，不需要固定间隔轮询
+    """
+    since = request.args.get('since', type=int)
+    wait = request.args.get('wait', type=float)
+    with data_changed:
+        _wait_for_update(since, wait)
         return jsonify({
             'bpm': audio_data['bpm'],
             'db': audio_data['db'],
             'hz': audio_data['hz'],
             'recording': 1 if audio_data['is_recording'] else 0,
+            'seq': audio_data['seq'],
             'timestamp': int(time.time())  # Unix时间戳，ESP32更容易处理
         })
 
@@ -206,3 +294,380 @@ def get_esp32_simple():
         # 返回简单的逗号分隔值，便于ESP32解析
         return f"{audio_data['bpm']},{audio_data['db']},{audio_data['hz']},{1 if audio_data['is_recording'] else 0}"
 
+@audio_bp.route('/beats', methods=['GET'])
+def get_beats():
+    """节拍事件：最近节拍时间、当前相位和预测的后续节拍时间（Unix时间戳，秒）"""
+    with data_lock:
+        recording = audio_data['is_recording']
+    data = beat_tracker.snapshot()
+    data['recording'] = 1 if recording else 0
+    return jsonify(data)
+
+@audio_bp.route('/esp32/beats', methods=['GET'])
+def get_esp32_beats():
+    """ESP32节拍接口（纯数值）: bpm,相位(0-1000),距下一拍毫秒数,拍长毫秒数"""
+    with data_lock:
+        recording = audio_data['is_recording']
+    data = beat_tracker.snapshot()
+    if not recording or not data['next_beats_in_ms']:
+        return "0,0,0,0"
+    # 设备时钟未必与服务器同步，只返回相对时间，由设备收到后自行调度
+    return f"{int(round(data['bpm']))},{int(data['phase'] * 1000)},{data['next_beats_in_ms'][0]},{int(round(data['period'] * 1000))}"
+
+
+@audio_bp.route('/streams', methods=['GET'])
+def list_streams():
+    """获取所有音频流"""
+    streams = stream_manager.list_streams()
+    return jsonify({
+        'streams': streams,
+        'count': len(streams),
+        'max_workers': stream_manager.max_workers,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@audio_bp.route('/streams', methods=['POST'])
+def add_stream():
+    """
+    添加音频流，JSON参数: id, device_index, channel, name, split_time, frequency_range
+    source为'network'时该流的音频由远程设备推送（UDP或 POST /ingest/<id>），此时可指定 rate, channels
+    """
+    params = request.get_json(silent=True) or {}
+    stream_id = str(params.get('id', '')).strip()
+    if not stream_id:
+        return jsonify({
+            'status': 'error',
+            'message': 'Stream id is required',
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    try:
+        split_time = float(params.get('split_time', 2.0))
+    except (TypeError, ValueError):
+        split_time = None
+    if split_time is None or not 0.5 <= split_time <= 10.0:
+        return jsonify({
+            'status': 'error',
+            'message': 'Split time must be between 0.5 and 10.0 seconds',
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    frequency_range = params.get('frequency_range')
+    if frequency_range is not None:
+        try:
+            frequency_range = {'min': float(frequency_range['min']), 'max': float(frequency_range['max'])}
+            if not 0 <= frequency_range['min'] < frequency_range['max']:
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            return jsonify({
+                'status': 'error',
+                'message': 'frequency_range must be {"min": Hz, "max": Hz} with 0 <= min < max',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+    source = None
+    try:
+        channel = int(params.get('channel', 0))
+        if channel < 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({
+            'status': 'error',
+            'message': 'channel must be a non-negative integer',
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    if params.get('source') == 'network':
+        try:
+            rate = int(params.get('rate', 16000))
+            channels = int(params.get('channels', 1))
+        except (TypeError, ValueError):
+            rate = channels = None
+        if rate is None or not (8000 <= rate <= 192000 and 1 <= channels <= 8 and channel < channels):
+            return jsonify({
+                'status': 'error',
+                'message': 'Network source requires 8000 <= rate <= 192000, 1 <= channels <= 8 and channel < channels',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+    try:
+        if params.get('source') == 'network':
+            source = ingest_hub.register(stream_id, rate, channels)
+        audio_stream = stream_manager.add_stream(
+            stream_id,
+            device_index=params.get('device_index'),
+            channel=channel,
+            name=params.get('name'),
+            split_time=split_time,
+            frequency_range=frequency_range,
+            source=source
+        )
+    except ValueError as e:
+        if source is not None:
+            ingest_hub.unregister(stream_id)
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 409
+    return jsonify({
+        'status': 'success',
+        'message': f'Stream {stream_id} added',
+        'stream': audio_stream.snapshot(),
+        'timestamp': datetime.now().isoformat()
+    }), 201
+
+def _stream_not_found(stream_id):
+    return jsonify({
+        'status': 'error',
+        'message': f'Stream {stream_id} not found',
+        'timestamp': datetime.now().isoformat()
+    }), 404
+
+@audio_bp.route('/streams/<stream_id>', methods=['DELETE'])
+def remove_stream(stream_id):
+    """移除音频流"""
+    if not stream_manager.remove_stream(stream_id):
+        return _stream_not_found(stream_id)
+    ingest_hub.unregister(stream_id)
+    return jsonify({
+        'status': 'success',
+        'message': f'Stream {stream_id} removed',
+        'timestamp': datetime.now().isoformat()
+    })
+
+@audio_bp.route('/streams/<stream_id>/data', methods=['GET'])
+def get_stream_data(stream_id):
+    """获取指定音频流的当前数据"""
+    audio_stream = stream_manager.get_stream(stream_id)
+    if audio_stream is None:
+        return _stream_not_found(stream_id)
+    return jsonify(audio_stream.snapshot())
+
+@audio_bp.route('/streams/<stream_id>/beats', methods=['GET'])
+def get_stream_beats(stream_id):
+    """获取指定音频流的节拍事件（由实时音频跟踪得到）"""
+    audio_stream = stream_manager.get_stream(stream_id)
+    if audio_stream is None:
+        return _stream_not_found(stream_id)
+    data = audio_stream.beat_tracker.snapshot()
+    data['stream_id'] = stream_id
+    return jsonify(data)
+
+@audio_bp.route('/streams/<stream_id>/history', methods=['GET'])
+def get_stream_history(stream_id):
+    """获取指定音频流的历史数据，可选参数max_points按LTTB降采样"""
+    audio_stream = stream_manager.get_stream(stream_id)
+    if audio_stream is None:
+        return _stream_not_found(stream_id)
+    history = downsample_history(audio_stream.history_snapshot(),
+                                 request.args.get('max_points', type=int))
+    return jsonify({
+        'stream_id': stream_id,
+        'history': history,
+        'count': len(history['bpm']),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@audio_bp.route('/streams/<stream_id>/start', methods=['POST'])
+def start_stream(stream_id):
+    """开始指定音频流的采集与分析"""
+    if not stream_manager.start_stream(stream_id):
+        return _stream_not_found(stream_id)
+    return jsonify({
+        'status': 'success',
+        'message': f'Stream {stream_id} started',
+        'stream': stream_manager.get_stream(stream_id).snapshot(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@audio_bp.route('/streams/<stream_id>/stop', methods=['POST'])
+def stop_stream(stream_id):
+    """停止指定音频流"""
+    if not stream_manager.stop_stream(stream_id):
+        return _stream_not_found(stream_id)
+    return jsonify({
+        'status': 'success',
+        'message': f'Stream {stream_id} stopped',
+        'stream': stream_manager.get_stream(stream_id).snapshot(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@audio_bp.route('/ingest', methods=['GET'])
+def list_ingest_sources():
+    """远程PCM源的接收统计（包数、丢包、乱序、缓冲时长）"""
+    sources = ingest_hub.list_sources()
+    return jsonify({
+        'sources': sources,
+        'count': len(sources),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@audio_bp.route('/ingest/<stream_id>', methods=['POST'])
+def ingest_pcm(stream_id):
+    """
+    接收远程设备推送的16位小端PCM（请求体可用chunked编码持续发送，连接保持期间边收边分析）
+    对应的流需先以 source='network' 添加并启动；发送快于实时时缓冲满后暂停读取请求体（TCP流控）
+    """
+    source = ingest_hub.get(stream_id)
+    if source is None:
+        return _stream_not_found(stream_id)
+    received = 0
+    accepted = source.opened
+    while accepted:
+        chunk = request.stream.read(4096)
+        if not chunk:
+            break
+        accepted = source.put_bytes(chunk, block=True)
+        if accepted:
+            received += len(chunk)
+    if not accepted:
+        # 流未启动（或推送期间被停止）时输入源不接收数据，不能当作已成功接收
+        return jsonify({
+            'status': 'error',
+            'message': f'Stream {stream_id} is not running',
+            'received_bytes': received,
+            'timestamp': datetime.now().isoformat()
+        }), 409
+    return jsonify({
+        'status': 'success',
+        'received_bytes': received,
+        'source': source.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+def _parse_time_arg(name):
+    """解析时间参数：支持Unix时间戳或ISO格式"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@audio_bp.route('/measurements', methods=['GET'])
+def get_measurements():
+    """查询持久化的测量数据，参数: start, end, stream, resolution(raw/minute/hour), limit, max_points"""
+    try:
+        start = _parse_time_arg('start')
+        end = _parse_time_arg('end')
+        limit = request.args.get('limit', type=int)
+        stream_id = request.args.get('stream', 'default')
+        resolution = request.args.get('resolution', 'raw')
+        data = measurement_store.query(start, end, stream_id=stream_id,
+                                       resolution=resolution, limit=limit)
+        data = downsample_history(data, request.args.get('max_points', type=int))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    return jsonify({
+        'stream_id': stream_id,
+        'resolution': resolution,
+        'data': data,
+        'count': len(data['timestamps']),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@audio_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus文本格式的阶段耗时直方图与计数器"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def _job_not_found(job_id):
+    return jsonify({
+        'status': 'error',
+        'message': f'Job {job_id} not found',
+        'timestamp': datetime.now().isoformat()
+    }), 404
+
+@audio_bp.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    上传WAV并创建分析任务，参数 analyses=bpm,vad,features（默认全部）
+    请求体为WAV原始字节（Content-Type: audio/wav），或multipart表单的file字段；
+    数据边接收边写入磁盘，相同内容的文件直接返回缓存结果
+    """
+    try:
+        analyses = parse_analyses(request.args.get('analyses'))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    if request.content_length and job_manager.max_upload_bytes and request.content_length > job_manager.max_upload_bytes:
+        return jsonify({
+            'status': 'error',
+            'message': f'Upload exceeds {job_manager.max_upload_bytes} bytes',
+            'timestamp': datetime.now().isoformat()
+        }), 413
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Multipart upload requires a "file" field',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        stream = upload.stream
+    else:
+        stream = request.stream
+    try:
+        job = job_manager.submit(stream, analyses)
+    except UploadTooLarge as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 413
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    return jsonify({
+        'status': 'success',
+        'job': job,
+        'timestamp': datetime.now().isoformat()
+    }), 200 if job['status'] == 'done' else 202
+
+@audio_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """获取全部分析任务（不含结果）"""
+    jobs = job_manager.list_jobs()
+    return jsonify({
+        'jobs': jobs,
+        'count': len(jobs),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@audio_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询分析任务，可选参数wait=秒：任务未结束时最多等待这么久再返回（长轮询）"""
+    wait = request.args.get('wait', type=float)
+    if wait:
+        job = job_manager.wait(job_id, min(wait, MAX_JOB_WAIT))
+    else:
+        job = job_manager.get(job_id)
+    if job is None:
+        return _job_not_found(job_id)
+    return jsonify({
+        'job': job,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@audio_bp.route('/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    """以NDJSON流推送任务状态：立即发送一行，状态变化时再发送，任务结束的一行包含结果后关闭"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return _job_not_found(job_id)
+
+    def generate(job):
+        while True:
+            yield json.dumps(job) + '\n'
+            if job['status'] in ('done', 'error'):
+                return
+            job = job_manager.wait(job_id, JOB_STREAM_HEARTBEAT) or job
+
+    return Response(stream_with_context(generate(job)), mimetype='application/x-ndjson')
@@ -0,0 +1,344 @@
+import contextlib
+import functools
+import math
+import time
+
+import numpy as np
+
+DEFAULT_RATE = 16000
+DIRECT_DFT_MAX_POINTS = 65536  # 带内频点数×窗口长度不超过此值时直接求带内DFT（矩阵约512KB），否则用rfft
+
+
+class StageTimings:
+    """把各阶段耗时（秒）记录到一个dict中"""
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+def timed(timings, name):
+    """timings为None时不计时"""
+    if timings is None:
+        return contextlib.nullcontext()
+    return StageTimings(timings, name)
+
+
+def pcm16_to_float(pcm_bytes):
+    """16位PCM字节流转为[-1, 1]浮点数组"""
+    return np.frombuffer(pcm_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def spectral_denoise(audio, noise_templates):
+    """多模板谱减法去噪（与GUI测量逻辑一致）"""
+    if not noise_templates:
+        return audio
+    min_len = min([len(audio)] + [len(n) for n in noise_templates])
+    audio = audio[:min_len]
+    noise_stack = np.stack([n[:min_len] for n in noise_templates], axis=0)
+    noise_mean = np.mean(noise_stack, axis=0)
+    audio_fft = np.fft.rfft(audio)
+    noise_fft = np.fft.rfft(noise_mean)
+    clean_fft = audio_fft - np.abs(noise_fft)
+    return np.fft.irfft(clean_fft)
+
+
+def compute_bpm(audio, rate=DEFAULT_RATE, decimation=1):
+    """
+    BPM估算
+
+    参数:
+        decimation (int): 大于1时先整数倍降采样再估算，起音包络的帧移和FFT长度按同样倍数缩小，
+                          帧率（速度分辨率）不变，计算量约为原来的 1/decimation
+    """
+    import librosa
+    if decimation <= 1:
+        return float(librosa.beat.tempo(y=audio, sr=rate)[0])
+    audio, rate = decimate(audio, rate, decimation)
+    hop_length = 512 // decimation
+    onset_env = librosa.onset.onset_strength(y=audio, sr=rate, hop_length=hop_length, n_fft=2048 // decimation)
+    return float(librosa.beat.tempo(onset_envelope=onset_env, sr=rate, hop_length=hop_length)[0])
+
+
+class OnsetEnvelope:
+    """
+    流式谱通量起音包络：逐块送入样本，块与块之间保留未满一帧的样本和上一帧频谱，
+    分块计算的结果与整段一次计算相同，窗口边界不会产生伪起音
+    """
+
+    def __init__(self, n_fft=1024, hop=256):
+        self.n_fft = n_fft
+        self.hop = hop
+        self.window = np.hanning(n_fft).astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.prev_mag = None
+
+    def push(self, samples):
+        """
+        送入一块样本
+
+        返回:
+            np.ndarray: 新得到的各帧起音强度（对数幅度谱的正向差分之和）
+        """
+        self.buffer = np.concatenate([self.buffer, np.asarray(samples, dtype=np.float32)])
+        if len(self.buffer) < self.n_fft:
+            return np.zeros(0, dtype=np.float32)
+        frames = frame_signal(self.buffer, self.n_fft, self.hop)
+        self.buffer = self.buffer[len(frames) * self.hop:]
+        mags = np.log1p(np.abs(np.fft.rfft(frames * self.window, axis=1)))
+        previous = self.prev_mag if self.prev_mag is not None else mags[0]
+        diffs = np.diff(np.vstack([previous[None, :], mags]), axis=0)
+        self.prev_mag = mags[-1]
+        return np.maximum(diffs, 0).sum(axis=1).astype(np.float32)
+
+
+def compute_main_freq(audio, rate=DEFAULT_RATE):
+    """主频估算：全长rfft幅度最大处的频率"""
+    fft = np.fft.rfft(audio)
+    freqs = np.fft.rfftfreq(len(audio), 1/rate)
+    return float(freqs[np.argmax(np.abs(fft))])
+
+
+@functools.lru_cache(maxsize=8)
+def _hann(n):
+    return np.hanning(n).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=8)
+def _band_dft_matrix(n, lo, count):
+    """汉宁窗加权的带内DFT矩阵：n×2count，前count列为实部、后count列为虚部，频点为 lo..lo+count-1"""
+    phase = 2 * np.pi * np.outer(np.arange(n), np.arange(lo, lo + count)) / n
+    window = np.hanning(n)[:, None]
+    return np.concatenate([window * np.cos(phase), -window * np.sin(phase)], axis=1).astype(np.float32)
+
+
+def band_spectrum(audio, lo, hi):
+    """
+    汉宁窗信号在FFT频点 lo..hi-1 上的幅度（单精度）
+
+    频点数 × 窗口长度不超过 DIRECT_DFT_MAX_POINTS 时只在这些频点上求DFT（Goertzel组的矩阵形式，
+    窗口长度与频带不变时DFT矩阵缓存复用），否则做一次单精度rfft后截取
+    """
+    n = len(audio)
+    count = hi - lo
+    audio = np.asarray(audio, dtype=np.float32)
+    if count * n <= DIRECT_DFT_MAX_POINTS:
+        parts = audio @ _band_dft_matrix(n, lo, count)
+        return np.hypot(parts[:count], parts[count:])
+    from scipy import fft as sp_fft
+    return np.abs(sp_fft.rfft(audio * _hann(n))[lo:hi])
+
+
+def _parabolic_offset(left, center, right):
+    """三点抛物线插值的峰值偏移（单位：点间距，范围[-0.5, 0.5]）"""
+    denominator = left - 2 * center + right
+    if denominator == 0:
+        return 0.0
+    return min(max(0.5 * (left - right) / denominator, -0.5), 0.5)
+
+
+def estimate_band_frequency(audio, rate=DEFAULT_RATE, f_min=0.0, f_max=None):
+    """
+    频带内的高分辨率主频估算
+
+    1. 只求 [f_min, f_max] 内（及两侧各一个）频点的汉宁窗幅度谱（见 band_spectrum）
+    2. 带内幅度最大的频点与相邻两点的对数幅度做抛物线插值
+
+    汉宁窗主瓣在对数域接近抛物线，插值误差在0.016个频点以内（0.1s窗口约0.16Hz），
+    计算量不超过一次全长FFT，窄频带时远小于全长FFT
+
+    返回:
+        float: 主频（Hz）
+    """
+    n = len(audio)
+    if n < 3:
+        return 0.0
+    nyquist = rate / 2
+    f_max = nyquist if f_max is None else min(f_max, nyquist)
+    f_min = max(0.0, min(f_min, f_max))
+    bin_width = rate / n
+    lo = math.ceil(f_min / bin_width)
+    hi = math.floor(f_max / bin_width) + 1
+    if hi <= lo:
+        return 0.0
+    start, stop = max(lo - 1, 0), min(hi + 1, n // 2 + 1)
+    spectrum = band_spectrum(audio, start, stop)
+    i = lo - start + int(np.argmax(spectrum[lo - start:hi - start]))
+    if 0 < i < len(spectrum) - 1:
+        left, center, right = (math.log(float(v) + 1e-12) for v in spectrum[i - 1:i + 2])
+        return (start + i + _parabolic_offset(left, center, right)) * bin_width
+    return float((start + i) * bin_width)
+
+
+def estimate_frequency(audio, rate=DEFAULT_RATE, freq_range=None):
+    """
+    实时分析使用的主频估算：给定频带时在带内做高分辨率估算（汉宁窗 + 抛物线插值），否则全频带argmax
+
+    参数:
+        freq_range (dict, optional): {'min': Hz, 'max': Hz}
+    """
+    if freq_range:
+        return estimate_band_frequency(audio, rate, freq_range['min'], freq_range['max'])
+    return compute_main_freq(audio, rate)
+
+
+def compute_db(audio):
+    """响度估算：RMS转dB"""
+    rms = np.sqrt(np.mean(audio**2))
+    return float(20 * np.log10(rms + 1e-6))
+
+
+def frame_signal(audio, window, hop=None):
+    """
+    把长信号切成(窗口数, window)的二维视图（零拷贝，跨步视图只读）；不足一个窗口的尾部舍去
+    """
+    hop = hop or window
+    if len(audio) < window:
+        return np.empty((0, window), dtype=audio.dtype)
+    return np.lib.stride_tricks.sliding_window_view(audio, window)[::hop]
+
+
+def batch_db_hz(frames, rate=DEFAULT_RATE):
+    """
+    对二维窗口数组逐行计算dB与主频，一次二维rfft完成，
+    结果与逐窗口调用 compute_db / compute_main_freq 相同
+
+    返回:
+        (db数组, hz数组)
+    """
+    window = frames.shape[1]
+    rms = np.sqrt(np.mean(frames**2, axis=1))
+    db = 20 * np.log10(rms + 1e-6)
+    spectrum = np.abs(np.fft.rfft(frames, axis=1))
+    freqs = np.fft.rfftfreq(window, 1/rate)
+    hz = freqs[np.argmax(spectrum, axis=1)]
+    return db.astype(float), hz.astype(float)
+
+
+def analyze_batch(audio, rate=DEFAULT_RATE, window_seconds=2.0, hop_seconds=None, block_windows=256):
+    """
+    批量计算长信号每个窗口的dB与主频（不含BPM），用于小时级录音的离线报告
+
+    参数:
+        audio (np.ndarray): 浮点音频数据
+        rate (int): 采样率
+        window_seconds (float): 窗口时长（秒）
+        hop_seconds (float, optional): 窗口间隔，默认等于窗口时长（不重叠）
+        block_windows (int): 每次rfft处理的窗口数，限制频谱的内存占用
+
+    返回:
+        dict: {'times': 窗口起始时间(秒), 'db': ..., 'hz': ...}
+    """
+    window = int(rate * window_seconds)
+    hop = int(rate * (hop_seconds or window_seconds))
+    frames = frame_signal(audio, window, hop)
+    db = np.empty(len(frames))
+    hz = np.empty(len(frames))
+    for start in range(0, len(frames), block_windows):
+        block = slice(start, start + block_windows)
+        db[block], hz[block] = batch_db_hz(frames[block], rate)
+    return {'times': np.arange(len(frames)) * hop / rate, 'db': db, 'hz': hz}
+
+
+def decimate(audio, rate, factor):
+    """
+    整数倍降采样（相邻样本取平均作为简单的抗混叠），用于降低速度估算的输入量
+
+    返回:
+        (降采样后的音频, 新采样率)
+    """
+    if factor <= 1:
+        return audio, rate
+    usable = len(audio) - len(audio) % factor
+    return audio[:usable].reshape(-1, factor).mean(axis=1), rate / factor
+
+
+def fft_segment(audio, size):
+    """
+    取窗口内能量最大的一段size个样本做主频估算（size为None或不小于窗口长度时返回原数组）；
+    节拍稀疏的音乐里主频来自有声的那一段，取固定位置可能只截到静音
+    """
+    if not size or size >= len(audio):
+        return audio
+    frames = audio[:len(audio) - len(audio) % size].reshape(-1, size)
+    return frames[int(np.argmax(np.einsum('ij,ij->i', frames, frames)))]
+
+
+def denoise_window(audio, noise_templates=None, quality=None, timings=None):
+    """质量档位要求时做谱减法去噪（计时键为denoise）"""
+    if (quality or {}).get('denoise', True):
+        with timed(timings, 'denoise'):
+            return spectral_denoise(audio, noise_templates)
+    return audio
+
+
+def window_level(audio, noise_templates=None, quality=None):
+    """窗口响度，与 analyze_window 结果中的db一致（按质量档位去噪后计算）；用于跳过完整分析的无信号窗口"""
+    return compute_db(denoise_window(audio, noise_templates, quality))
+
+
+def window_frequency(audio, rate=DEFAULT_RATE, freq_range=None, fft_size=None):
+    """窗口主频：取能量最大的一段（fft_size）后按频率范围估算"""
+    return estimate_frequency(fft_segment(audio, fft_size), rate, freq_range)
+
+
+def window_tasks(audio, rate=DEFAULT_RATE, freq_range=None, quality=None, with_tempo=True):
+    """
+    一个（已去噪）窗口的各项指标计算，analyze_window 依次执行，AnalysisExecutor 并发执行
+
+    参数:
+        with_tempo (bool): 是否做单窗口BPM估算；有跨窗口速度跟踪（TempoTracker）时不需要，
+                           它是最耗时的一项，其结果反正会被跟踪值替换
+
+    返回:
+        dict: {指标名: (函数, 参数元组)}，指标名为 tempo/fft/rms，按耗时从大到小排列
+    """
+    quality = quality or {}
+    tasks = {}
+    if with_tempo:
+        tasks['tempo'] = (compute_bpm, (audio, rate, quality.get('tempo_decimate', 1)))
+    tasks['fft'] = (window_frequency, (audio, rate, freq_range, quality.get('fft_size')))
+    tasks['rms'] = (compute_db, (audio,))
+    return tasks
+
+
+def window_result(values):
+    """各项指标的值 → {'bpm', 'db', 'hz'}；未估算BPM时bpm为None"""
+    return {'bpm': values.get('tempo'), 'db': values['rms'], 'hz': values['fft']}
+
+
+def analyze_window(audio, rate=DEFAULT_RATE, noise_templates=None, timings=None, freq_range=None,
+                   quality=None, with_tempo=True):
+    """
+    分析一个时间窗口的音频，返回未补偿的原始测量值
+
+    参数:
+        audio (np.ndarray): 浮点音频数据
+        rate (int): 采样率
+        noise_templates (list, optional): 噪声模板列表，用于谱减法去噪
+        timings (dict, optional): 传入时记录各阶段耗时（秒），键为 denoise/tempo/fft/rms
+        freq_range (dict, optional): {'min': Hz, 'max': Hz}，给定时在该频带内做高分辨率主频估算
+        quality (dict, optional): 质量档位（见 governor.QUALITY_LEVELS），None为完整质量
+        with_tempo (bool): False时跳过BPM估算（由TempoTracker提供BPM），返回的bpm为None
+
+    返回:
+        dict: {'bpm': float, 'db': float, 'hz': float}
+    """
+    audio = denoise_window(audio, noise_templates, quality, timings)
+    values = {}
+    for name, (fn, args) in window_tasks(audio, rate, freq_range, quality, with_tempo).items():
+        with timed(timings, name):
+            values[name] = fn(*args)
+    return window_result(values)
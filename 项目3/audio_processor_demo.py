@@ -5,7 +5,6 @@
 展示主要功能和数据模拟
 """
 
-import time
 import random
 import threading
 from datetime import datetime
@@ -20,6 +19,7 @@ class AudioProcessorDemo:
         self.frequency_unit = "Hz"
         self.frequency_range = {"min": 1000, "max": 20000}
         self.debug_mode = False
+        self.state_changed = threading.Condition()  # 开始/停止录制时唤醒模拟线程
         
         # 数据历史
         self.bpm_history = []
@@ -43,7 +43,9 @@ class AudioProcessorDemo:
         
     def toggle_recording(self):
         """切换录音状态"""
-        self.is_recording = not self.is_recording
+        with self.state_changed:
+            self.is_recording = not self.is_recording
+            self.state_changed.notify_all()
         if self.is_recording:
             self.add_log("info", "开始音频录制")
             print("🎵 开始录制...")
@@ -52,36 +54,40 @@ class AudioProcessorDemo:
             print("⏹️  停止录制...")
             
     def simulate_data(self):
-        """模拟数据更新"""
+        """模拟数据更新：未录制时挂起等待，停止录制立即生效"""
         while True:
-            if self.is_recording:
-                # 模拟BPM变化
-                self.current_bpm = max(120, min(200, 
-                    self.current_bpm + random.randint(-5, 5)))
-                
-                # 模拟dB变化
-                self.current_db = max(10, min(50, 
-                    self.current_db + random.randint(-3, 3)))
-                
-                # 模拟Hz变化
-                self.current_hz = max(1000, min(5000, 
-                    self.current_hz + random.randint(-200, 200)))
-                
-                # 添加到历史数据
-                self.bpm_history.append(self.current_bpm)
-                self.db_history.append(self.current_db)
-                self.hz_history.append(self.current_hz)
-                
-                # 限制历史数据长度
-                if len(self.bpm_history) > 20:
-                    self.bpm_history = self.bpm_history[-20:]
-                    self.db_history = self.db_history[-20:]
-                    self.hz_history = self.hz_history[-20:]
-                
-                # 显示当前数据
-                self.display_current_data()
-                
-            time.sleep(self.split_time)
+            with self.state_changed:
+                while not self.is_recording:
+                    self.state_changed.wait()
+            # 模拟BPM变化
+            self.current_bpm = max(120, min(200, 
+                self.current_bpm + random.randint(-5, 5)))
+            
+            # 模拟dB变化
+            self.current_db = max(10, min(50, 
+                self.current_db + random.randint(-3, 3)))
+            
+            # 模拟Hz变化
+            self.current_hz = max(1000, min(5000, 
+                self.current_hz + random.randint(-200, 200)))
+            
+            # 添加到历史数据
+            self.bpm_history.append(self.current_bpm)
+            self.db_history.append(self.current_db)
+            self.hz_history.append(self.current_hz)
+            
+            # 限制历史数据长度
+            if len(self.bpm_history) > 20:
+                self.bpm_history = self.bpm_history[-20:]
+                self.db_history = self.db_history[-20:]
+                self.hz_history = self.hz_history[-20:]
+            
+            # 显示当前数据
+            self.display_current_data()
+
+            # 等待下一个分段；期间停止录制会被立即唤醒
+            with self.state_changed:
+                self.state_changed.wait_for(lambda: not self.is_recording, timeout=self.split_time)
             
     def display_current_data(self):
         """显示当前数据"""
@@ -5,21 +5,41 @@
 基于用户提供的UI设计要素创建的小窗口桌面应用
 """
 
+import time
+STARTUP_TIME = time.perf_counter()  # 冷启动计时起点
+
 import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
-import time
 import random
 import math
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-import matplotlib.animation as animation
-import pyaudio
-import librosa
 import csv
+import os
+from datetime import datetime
 from tkinter import filedialog
+from config import (WARMUP_ON_STARTUP, DEVICE_SAMPLE_RATE, SESSION_ARCHIVE_ENABLED, SESSION_ARCHIVE_DIR,
+                    TEMPO_TRACKING_ENABLED, ANALYSIS_THREADS)
+from lazy_import import lazy_module
+from warmup import configure_jit_cache, start_warmup
+from audio_analysis import pcm16_to_float, window_level
+from analysis_executor import AnalysisExecutor
+from input_source import create_source
+from measurement_store import MeasurementStore
+from session_archive import SessionArchiveWriter
+from session_export import export_in_background, parquet_available
+from calibration_store import CalibrationStore, measure_calibration_value
+from tempo_tracker import TempoTracker
+from governor import QualityGovernor
+from activity_gate import ActivityGate
+from downsample import downsample
+from metrics import metrics
+
+# 重量级依赖延迟导入：首次使用时才加载（librosa在audio_analysis中按需导入，并由后台预热线程提前加载）
+configure_jit_cache()  # 必须在numba/librosa导入前设置
+pyaudio = lazy_module('pyaudio')
+mpl_figure = lazy_module('matplotlib.figure')
+backend_tkagg = lazy_module('matplotlib.backends.backend_tkagg')
 
 class AudioProcessorGUI:
     def __init__(self, root):
@@ -38,7 +58,12 @@ class AudioProcessorGUI:
         self.frequency_unit = "Hz"
         self.frequency_range = {"min": 1000, "max": 16000}
         self.debug_mode = False
+        metrics.enabled = self.debug_mode  # 阶段计时仅在调试模式下开启
         self.selected_mic_index = None  # 新增：当前选择的麦克风索引
+        self.input_source = None  # 可选：替代麦克风的输入源（如文件回放）
+        self.capture_source = None  # 测量期间保持打开的麦克风输入，窗口之间不断流
+        self.capture_device = None
+        self.last_capture_end = None  # 上一个窗口读完的时刻（time.monotonic）
         self.audio_data = None  # 存储音频数据
         self.sample_rate = 16000  # 采样率
         
@@ -50,26 +75,72 @@ class AudioProcessorGUI:
         self.waveform_data = []
         self.log_data = []
         self.noise_templates = []  # 支持多个噪声模板
+        self.measurement_store = MeasurementStore()  # 完整测量记录持久化到SQLite
+        self.session_start = time.time()  # 导出完整会话的起点
+        self.session_archive = None  # 当前会话的音频+测量归档（开始测量后第一个窗口时创建）
+        self.archive_lock = threading.Lock()  # 采集线程追加与界面线程停止测量时关闭归档互斥
+        self.last_pcm = None  # 最近一个分析窗口的单声道16位PCM
+        self.tempo_tracker = TempoTracker(self.sample_rate)  # 跨窗口速度跟踪，短窗口下BPM也保持稳定
+        self.tempo_elapsed = 0.0  # 距上次速度跟踪更新经过的时长
+        self.tempo_gap = False  # 上次更新之后音频有间断（跳过的窗口或读取间隔），下次更新不接续起音历史
+        self.bpm_confidence = 0.0
+        self.analysis_executor = AnalysisExecutor(ANALYSIS_THREADS)  # 各项指标并发计算
+        self.governor = QualityGovernor()  # 分析跟不上时逐级降低质量，有余量时恢复
+        self.activity_gate = ActivityGate()  # 静音窗口跳过速度/频谱分析
+        self.no_signal = False  # 最近一个窗口无信号（界面显示"无信号"，不写入测量库）
+        self.state_changed = threading.Condition()  # 开始/停止测量或修改分段时间时唤醒采集线程
         
         # 初始化日志
         self.add_log("info", "音频检测系统已启动")
         self.add_log("info", "BPM检测正常运行")
         self.add_log("debug", "频谱分析完成")
         
-        self.mic_list = self.get_microphone_list()  # 获取麦克风列表
+        # 界面构建期间在后台预热librosa/numba，避免首次BPM测量等待JIT编译
+        self.first_analysis_logged = False
+        self.first_measurement_logged = False
+        self.recording_started_at = None
+        if WARMUP_ON_STARTUP:
+            self.warmup_done = start_warmup(self.sample_rate, on_done=self.on_warmup_done)
+        
+        self.calibration_store = CalibrationStore()
+        self.calibration_profile = None
         self.setup_ui()
+        self.load_calibration_profile()
         self.start_data_simulation()
+        startup = time.perf_counter() - STARTUP_TIME
+        metrics.set_gauge('startup_ui_seconds', round(startup, 3))
+        self.add_log("info", f"界面就绪，冷启动耗时 {startup:.2f}s")
+        # 枚举设备要初始化PortAudio（可能耗时数百毫秒），放到后台，完成后再刷新下拉框
+        threading.Thread(target=self.enumerate_devices_in_background, daemon=True).start()
+        
+    def on_warmup_done(self, elapsed, error):
+        """后台预热完成回调（在预热线程中调用）"""
+        if error is not None:
+            self.add_log("error", f"分析预热失败: {error}")
+            return
+        since_start = time.perf_counter() - STARTUP_TIME
+        metrics.set_gauge('warmup_seconds', round(elapsed, 3))
+        self.add_log("info", f"分析预热完成，耗时 {elapsed:.2f}s（启动后 {since_start:.2f}s 可进行首次测量）")
         
-    def get_microphone_list(self):
-        """获取可用麦克风设备列表"""
-        p = pyaudio.PyAudio()
-        mic_list = []
-        for i in range(p.get_device_count()):
-            info = p.get_device_info_by_index(i)
-            if info.get('maxInputChannels', 0) > 0:
-                mic_list.append({'index': i, 'name': info['name']})
-        p.terminate()
-        return mic_list
+    def enumerate_devices_in_background(self):
+        """后台线程：枚举麦克风，结果交给界面线程更新"""
+        try:
+            devices = self.list_microphone_devices()
+        except Exception as e:
+            self.add_log("error", f"枚举麦克风失败: {e}")
+            return
+        self.root.after(0, lambda: self.on_devices_listed(devices))
+
+    def on_devices_listed(self, devices):
+        self.mic_devices = devices
+        names = [name for idx, name in devices]
+        if getattr(self, 'mic_menu', None) is not None and self.mic_menu.winfo_exists():
+            self.mic_menu.configure(values=names)
+        if self.selected_mic_index not in [idx for idx, name in devices]:
+            self.selected_mic_index = devices[0][0]
+        if hasattr(self, 'mic_var'):
+            self.mic_var.set(self.current_device_name())
+        self.load_calibration_profile()
 
     def setup_ui(self):
         """设置用户界面"""
@@ -84,9 +155,9 @@ class AudioProcessorGUI:
         self.content_frame = tk.Frame(main_frame, bg='#000000')
         self.content_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
         
-        # 麦克风设备初始化
+        # 麦克风设备列表在界面显示后由后台线程枚举，此前只有默认设备
         self.selected_mic_index = 0
-        self.mic_devices = self.list_microphone_devices()
+        self.mic_devices = [(0, '默认麦克风')]
         
         # 默认显示测量页面
         self.show_measure_page()
@@ -224,12 +295,10 @@ class AudioProcessorGUI:
         frame.pack(fill=tk.X, pady=(10, 5))
         self.mic_var = tk.StringVar()
         mic_names = [name for idx, name in self.mic_devices]
-        if self.selected_mic_index >= len(mic_names):
-            self.selected_mic_index = 0
-        self.mic_var.set(mic_names[self.selected_mic_index])
-        mic_menu = ttk.Combobox(frame, textvariable=self.mic_var, values=mic_names, state='readonly', font=('Arial', 10))
-        mic_menu.pack(fill=tk.X, padx=5, pady=5)
-        mic_menu.bind('<<ComboboxSelected>>', self.on_mic_selected)
+        self.mic_var.set(self.current_device_name())
+        self.mic_menu = ttk.Combobox(frame, textvariable=self.mic_var, values=mic_names, state='readonly', font=('Arial', 10))
+        self.mic_menu.pack(fill=tk.X, padx=5, pady=5)
+        self.mic_menu.bind('<<ComboboxSelected>>', self.on_mic_selected)
         # 刷新按钮
         btn = tk.Button(frame, text="刷新设备", font=('Arial', 9), bg='#404040', fg='#fff', relief='flat', command=self.refresh_mic_devices)
         btn.pack(side=tk.RIGHT, padx=5, pady=2)
@@ -241,6 +310,7 @@ class AudioProcessorGUI:
             if n == name:
                 self.selected_mic_index = idx
                 self.add_log("info", f"切换麦克风: {n}")
+                self.load_calibration_profile()
                 break
 
     def refresh_mic_devices(self):
@@ -249,6 +319,7 @@ class AudioProcessorGUI:
         mic_names = [name for idx, name in self.mic_devices]
         self.mic_var.set(mic_names[0] if mic_names else '默认麦克风')
         self.selected_mic_index = self.mic_devices[0][0] if self.mic_devices else 0
+        self.load_calibration_profile()
         self.show_measure_page()
 
     def create_digital_display(self, parent):
@@ -358,7 +429,7 @@ class AudioProcessorGUI:
         plot_frame = tk.Frame(parent, bg='#1a1a1a', relief='solid', bd=1)
         plot_frame.pack(fill=tk.BOTH, expand=True, pady=10)
         
-        self.fig = Figure(figsize=(6, 3), facecolor='#1a1a1a')
+        self.fig = mpl_figure.Figure(figsize=(6, 3), facecolor='#1a1a1a')
         self.ax = self.fig.add_subplot(111, facecolor='#1a1a1a')
         
         # 初始化空频谱图
@@ -371,7 +442,7 @@ class AudioProcessorGUI:
         self.ax.tick_params(colors='#888888')
         self.ax.grid(True, alpha=0.3, color='#404040')
         
-        self.canvas = FigureCanvasTkAgg(self.fig, plot_frame)
+        self.canvas = backend_tkagg.FigureCanvasTkAgg(self.fig, plot_frame)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         
         # 添加点击事件处理
@@ -420,12 +491,12 @@ class AudioProcessorGUI:
         """创建频率图：左bpm右hz"""
         freq_frame = tk.Frame(parent, bg='#1a1a1a', relief='solid', bd=1)
         freq_frame.pack(fill=tk.BOTH, expand=True, pady=10)
-        self.freq_fig = Figure(figsize=(3, 4), facecolor='#1a1a1a')
+        self.freq_fig = mpl_figure.Figure(figsize=(3, 4), facecolor='#1a1a1a')
         self.freq_ax = self.freq_fig.add_subplot(111, facecolor='#1a1a1a')
         # 绘制bpm和hz
         t_points = np.arange(len(self.bpm_history)) * self.split_time if self.bpm_history else []
-        hz_points = self.hz_history if self.hz_history else []
-        bpm_points = self.bpm_history if self.bpm_history else []
+        hz_points = np.asarray(self.hz_history, dtype=float)  # None（无信号）→ NaN
+        bpm_points = np.asarray(self.bpm_history, dtype=float)
         if len(t_points) and len(hz_points):
             self.freq_ax.plot(t_points, hz_points, color='#3b82f6', linewidth=2, label='Hz')
         if len(t_points) and len(bpm_points):
@@ -435,7 +506,7 @@ class AudioProcessorGUI:
         self.freq_ax.tick_params(colors='#888888', labelsize=7)
         self.freq_ax.grid(True, alpha=0.3, color='#404040')
         self.freq_ax.legend(facecolor='#1a1a1a', edgecolor='#404040', labelcolor='#ffffff')
-        self.freq_canvas = FigureCanvasTkAgg(self.freq_fig, freq_frame)
+        self.freq_canvas = backend_tkagg.FigureCanvasTkAgg(self.freq_fig, freq_frame)
         self.freq_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
 
     def show_stats_page(self):
@@ -492,6 +563,8 @@ class AudioProcessorGUI:
         btn_frame.pack(fill=tk.X, pady=5)
         export_btn = tk.Button(btn_frame, text="导出CSV", font=('Arial', 9, 'bold'), bg='#3b82f6', fg='#fff', command=self.export_csv, relief='flat', padx=10, pady=6, height=1)
         export_btn.pack(side=tk.RIGHT, padx=2)
+        session_btn = tk.Button(btn_frame, text="导出完整会话", font=('Arial', 9, 'bold'), bg='#8b5cf6', fg='#fff', command=self.export_session, relief='flat', padx=10, pady=6, height=1)
+        session_btn.pack(side=tk.RIGHT, padx=2)
         reset_btn = tk.Button(btn_frame, text="重置测量数据", font=('Arial', 9, 'bold'), bg='#ef4444', fg='#fff', command=self.reset_measure_data, relief='flat', padx=10, pady=6, height=1)
         reset_btn.pack(side=tk.RIGHT, padx=2)
 
@@ -500,23 +573,27 @@ class AudioProcessorGUI:
         plot_frame = tk.Frame(self.content_frame, bg='#1a1a1a', relief='solid', bd=1)
         plot_frame.pack(fill=tk.BOTH, expand=True, pady=10)
         
-        self.stats_fig = Figure(figsize=(8, 5), facecolor='#1a1a1a')
+        self.stats_fig = mpl_figure.Figure(figsize=(8, 5), facecolor='#1a1a1a')
         self.stats_ax = self.stats_fig.add_subplot(111, facecolor='#1a1a1a')
         self.stats_ax2 = self.stats_fig.add_subplot(112, facecolor='#1a1a1a')  # 新增db条形图
         self.update_stats_plot()
-        self.stats_canvas = FigureCanvasTkAgg(self.stats_fig, plot_frame)
+        self.stats_canvas = backend_tkagg.FigureCanvasTkAgg(self.stats_fig, plot_frame)
         self.stats_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
 
     def update_stats_plot(self):
         """更新统计图表"""
         if hasattr(self, 'stats_ax'):
             self.stats_ax.clear()
+            # 按图表像素宽度降采样，历史很长时重绘开销不随点数增长
+            max_points = int(self.stats_fig.get_figwidth() * self.stats_fig.dpi)
             if self.bpm_history:
                 time_points = self.time_history if self.time_history else np.arange(len(self.bpm_history)) * self.split_time
                 if self.show_bpm.get():
-                    self.stats_ax.plot(time_points, self.bpm_history, color='#ef4444', linewidth=2, label='BPM')
+                    t, bpm = downsample(time_points, np.asarray(self.bpm_history, dtype=float), max_points)
+                    self.stats_ax.plot(t, bpm, color='#ef4444', linewidth=2, label='BPM')
                 if self.show_hz.get():
-                    self.stats_ax.plot(time_points, self.hz_history, color='#3b82f6', linewidth=2, label='Hz')
+                    t, hz = downsample(time_points, np.asarray(self.hz_history, dtype=float), max_points)
+                    self.stats_ax.plot(t, hz, color='#3b82f6', linewidth=2, label='Hz')
                 self.stats_ax.set_xlabel('时间 (s)', color='#888888')
                 self.stats_ax.set_ylabel('BPM/Hz', color='#888888')
                 self.stats_ax.legend(facecolor='#1a1a1a', edgecolor='#404040', labelcolor='#ffffff')
@@ -527,7 +604,8 @@ class AudioProcessorGUI:
                 self.stats_ax2.clear()
                 if self.show_db.get() and self.db_history:
                     time_points = self.time_history if self.time_history else np.arange(len(self.db_history)) * self.split_time
-                    self.stats_ax2.bar(time_points, self.db_history, color='#22c55e', label='dB', alpha=0.7)
+                    t, db = downsample(time_points, self.db_history, max_points, method='minmax')
+                    self.stats_ax2.bar(t, db, color='#22c55e', label='dB', alpha=0.7)
                     self.stats_ax2.set_ylabel('dB', color='#22c55e')
                     self.stats_ax2.legend(facecolor='#1a1a1a', edgecolor='#404040', labelcolor='#22c55e')
                 self.stats_ax2.tick_params(colors='#888888')
@@ -738,6 +816,18 @@ class AudioProcessorGUI:
             command=self.toggle_debug_mode
         ).pack(side=tk.LEFT)
         
+        # 性能指标（仅调试模式下显示）
+        self.metrics_label = tk.Label(
+            self.content_frame,
+            text="",
+            font=('Courier New', 9),
+            fg='#fbbf24',
+            bg='#000000',
+            justify=tk.LEFT,
+            anchor='w'
+        )
+        self.metrics_label.pack(fill=tk.X)
+        
         # 日志显示区域
         log_frame = tk.Frame(self.content_frame, bg='#1a1a1a', relief='solid', bd=1)
         log_frame.pack(fill=tk.BOTH, expand=True, pady=10)
@@ -766,8 +856,17 @@ class AudioProcessorGUI:
         
         self.update_log_display()
         
+    def update_metrics_display(self):
+        """更新日志页的性能指标（仅调试模式）"""
+        if hasattr(self, 'metrics_label') and self.metrics_label.winfo_exists():
+            lines = metrics.summary_lines() if self.debug_mode else []
+            if self.debug_mode and not lines:
+                lines = ["暂无性能指标，开始录制后显示各阶段耗时"]
+            self.metrics_label.configure(text="\n".join(lines))
+
     def update_log_display(self):
         """更新日志显示"""
+        self.update_metrics_display()
         if hasattr(self, 'log_text'):
             self.log_text.delete(1.0, tk.END)
             
@@ -785,19 +884,55 @@ class AudioProcessorGUI:
             self.log_text.see(tk.END)
             
     # 事件处理方法
+    def notify_state_changed(self):
+        """唤醒等待中的采集线程（开始/停止测量或分段时间变化后调用）"""
+        with self.state_changed:
+            self.state_changed.notify_all()
+
     def toggle_recording(self):
         """切换录音状态"""
         self.is_recording = not self.is_recording
+        self.notify_state_changed()
         self.play_button.configure(text="⏸" if self.is_recording else "▶")
         
         if self.is_recording:
+            self.recording_started_at = time.perf_counter()
+            self.reset_tempo_tracking()
+            self.governor.reset()
+            self.activity_gate.reset()
+            self.no_signal = False
             self.add_log("info", "开始音频录制")
         else:
             self.add_log("info", "停止音频录制")
+            self.close_session_archive()
+
+    def archive_window(self, bpm=None, db=None, hz=None):
+        """把最近一个窗口的音频和测量值追加到会话归档；没有测量值（未分析的窗口）时只追加音频"""
+        if not SESSION_ARCHIVE_ENABLED or self.last_pcm is None:
+            return
+        with self.archive_lock:
+            if not self.is_recording:
+                return  # 已停止测量并关闭归档，不再为这个窗口新建会话
+            if self.session_archive is None:
+                path = os.path.join(SESSION_ARCHIVE_DIR, datetime.now().strftime('%Y%m%d_%H%M%S'))
+                self.session_archive = SessionArchiveWriter(path, self.sample_rate)
+                self.add_log("info", f"会话归档: {path}")
+            media_time = self.session_archive.append_audio(self.last_pcm)
+            if bpm is not None:
+                self.session_archive.append_measurement(bpm, db, hz, media_time=media_time)
+
+    def close_session_archive(self):
+        with self.archive_lock:
+            archive, self.session_archive = self.session_archive, None
+            if archive is not None:
+                archive.close()
+        if archive is not None:
+            self.add_log("info", f"会话归档已保存: {archive.path}")
             
     def update_split_time(self, value):
         """更新分段时间"""
         self.split_time = float(value)
+        self.notify_state_changed()
         
     def set_frequency_unit(self, unit):
         """设置频率单位"""
@@ -828,6 +963,7 @@ class AudioProcessorGUI:
         try:
             # 应用分段时间
             self.split_time = self.config_split_scale.get()
+            self.notify_state_changed()
             
             # 应用单位偏好
             self.frequency_unit = self.unit_var.get()
@@ -851,6 +987,7 @@ class AudioProcessorGUI:
     def toggle_debug_mode(self):
         """切换调试模式"""
         self.debug_mode = self.debug_var.get()
+        metrics.enabled = self.debug_mode
         self.update_log_display()
         
     def add_log(self, log_type, message):
@@ -961,16 +1098,9 @@ class AudioProcessorGUI:
             # 2. 分析实际值
             actual = self.analyze_calib_actual(audio, t)
             self.add_log("info", f"录制{t}校准样本，目标: {target}，实际: {actual:.2f}")
-            # 3. 计算补偿并保存
-            compensation = target - actual
-            if not hasattr(self, 'calib_compensations'):
-                self.calib_compensations = {'hz': 0, 'db': 0, 'bpm': 0}
-            self.calib_compensations[t] = compensation
+            # 3. 保存样本并更新补偿（持久化到当前设备的校准配置）
+            compensation = self.store_calib_sample(t, audio, target, actual)
             self.add_log("info", f"{t}补偿值: {compensation:+.2f} 已保存，后续测量将自动修正")
-            # 4. 保存样本
-            if not hasattr(self, 'calib_samples'):
-                self.calib_samples = {'hz': [], 'db': [], 'bpm': []}
-            self.calib_samples[t].append(audio)
             self.refresh_calib_sample_list()
             messagebox.showinfo("录制完成", f"{t}样本已保存，可多次录制。\n补偿值: {compensation:+.2f}")
         except Exception as e:
@@ -978,30 +1108,8 @@ class AudioProcessorGUI:
             self.add_log("error", f"录制校准样本失败: {e}")
 
     def analyze_calib_actual(self, audio, t):
-        """分析录音样本的实际bpm/hz/db"""
-        rate = 16000
-        if t == 'bpm':
-            try:
-                bpm = librosa.beat.tempo(y=audio, sr=rate)[0]
-                return float(bpm)
-            except:
-                return 0.0
-        elif t == 'hz':
-            try:
-                fft = np.fft.rfft(audio)
-                freqs = np.fft.rfftfreq(len(audio), 1/rate)
-                main_freq = freqs[np.argmax(np.abs(fft))]
-                return float(main_freq)
-            except:
-                return 0.0
-        elif t == 'db':
-            try:
-                rms = np.sqrt(np.mean(audio**2))
-                db = 20 * np.log10(rms + 1e-6)
-                return float(db)
-            except:
-                return 0.0
-        return 0.0
+        """分析录音样本的实际bpm/hz/db（主频与实时测量一样在当前频率范围内估算）"""
+        return measure_calibration_value(audio, t, 16000, self.frequency_range)
 
     def apply_calib_compensation(self, t, value):
         """测量时自动应用补偿"""
@@ -1009,90 +1117,282 @@ class AudioProcessorGUI:
             return value + self.calib_compensations[t]
         return value
 
-    def estimate_from_microphone(self, duration=None, rate=16000, chunk=1024):
-        duration = duration or self.split_time
-        p = pyaudio.PyAudio()
-        device_index = getattr(self, 'selected_mic_index', 0)
-        
+    def current_device_name(self):
+        for idx, name in getattr(self, 'mic_devices', []):
+            if idx == self.selected_mic_index:
+                return name
+        return '默认麦克风'
+
+    def load_calibration_profile(self):
+        """加载当前麦克风+采样率的校准配置（补偿值与样本）"""
         try:
-            stream = p.open(format=pyaudio.paInt16, 
-                           channels=1, 
-                           rate=rate, 
-                           input=True, 
-                           frames_per_buffer=chunk, 
-                           input_device_index=device_index)
-            frames = []
-            for _ in range(int(rate / chunk * duration)):
-                data = stream.read(chunk, exception_on_overflow=False)
-                frames.append(data)
-            stream.stop_stream()
-            stream.close()
-            
-            audio = np.frombuffer(b''.join(frames), dtype=np.int16).astype(np.float32) / 32768.0
-            # 存储音频数据供频谱图使用
-            self.audio_data = audio
-        finally:
+            profile = self.calibration_store.load(self.current_device_name(), self.sample_rate)
+            self.calib_samples = {t: [profile.load_audio(s) for s in profile.samples_of(t)]
+                                  for t in ('hz', 'db', 'bpm')}
+        except Exception as e:
+            self.add_log("error", f"加载校准配置失败: {e}")
+            return
+        self.calibration_profile = profile
+        self.calib_compensations = dict(profile.compensations)
+        if profile.samples:
+            offsets = ", ".join(f"{t}{v:+.2f}" for t, v in profile.compensations.items())
+            self.add_log("info", f"已加载校准配置 {os.path.basename(profile.path)}（{len(profile.samples)}个样本，补偿 {offsets}）")
+        self.refresh_calib_sample_list()
+
+    def store_calib_sample(self, t, audio, target, actual):
+        """保存校准样本到内存和磁盘，返回更新后的补偿值（该类型全部样本偏差的平均）"""
+        if not hasattr(self, 'calib_samples'):
+            self.calib_samples = {'hz': [], 'db': [], 'bpm': []}
+        self.calib_samples[t].append(audio)
+        if self.calibration_profile is None:
+            if not hasattr(self, 'calib_compensations'):
+                self.calib_compensations = {'hz': 0, 'db': 0, 'bpm': 0}
+            self.calib_compensations[t] = target - actual
+            return self.calib_compensations[t]
+        compensation = self.calibration_profile.add_sample(t, audio, target, actual,
+                                                           freq_range=dict(self.frequency_range))
+        self.calib_compensations = dict(self.calibration_profile.compensations)
+        if t in self.calibration_profile.manual:
+            self.add_log("warn", f"{t}补偿为手动设置值 {compensation:+.2f}，新样本已保存但不改变补偿")
+        return compensation
+
+    def recalibrate_samples(self):
+        """后台并行重新分析当前配置的全部样本（分析算法变更后使用）"""
+        profile = self.calibration_profile
+        if profile is None or not profile.samples:
+            messagebox.showinfo("重新分析", "当前设备没有已保存的校准样本")
+            return
+
+        def run():
+            try:
+                changes = profile.recalibrate()
+            except Exception as e:
+                self.add_log("error", f"重新分析校准样本失败: {e}")
+                return
+            for cal_type, old, new in changes:
+                self.add_log("info", f"{cal_type}样本实际值 {old:.2f} -> {new:.2f}")
+            self.calib_compensations = dict(profile.compensations)
+            offsets = ", ".join(f"{t}{v:+.2f}" for t, v in profile.compensations.items())
+            self.add_log("info", f"校准样本重新分析完成，补偿 {offsets}")
+
+        self.add_log("info", f"开始重新分析{len(profile.samples)}个校准样本")
+        threading.Thread(target=run, daemon=True).start()
+
+    def open_capture_source(self, rate):
+        """
+        返回测量用的麦克风输入源，第一次调用或切换了麦克风时（重新）打开
+
+        返回:
+            tuple: (输入源, 是否沿用了已打开的输入源)
+        """
+        device_index = getattr(self, 'selected_mic_index', 0)
+        if self.capture_source is not None and self.capture_device != device_index:
+            self.close_capture_source()
+        if self.capture_source is not None:
+            return self.capture_source, True
+        self.capture_source = create_source(device_index, rate, 1, device_rate=DEVICE_SAMPLE_RATE).open()
+        self.capture_device = device_index
+        return self.capture_source, False
+
+    def close_capture_source(self):
+        """关闭麦克风输入（停止测量或采集出错时由采集线程调用）"""
+        source, self.capture_source = self.capture_source, None
+        self.last_capture_end = None
+        if source is not None:
             # 确保PyAudio实例被正确终止
-            p.terminate()
-        # 多模板谱减法去噪
-        if self.noise_templates:
-            min_len = min([len(audio)] + [len(n) for n in self.noise_templates])
-            audio = audio[:min_len]
-            noise_stack = np.stack([n[:min_len] for n in self.noise_templates], axis=0)
-            noise_mean = np.mean(noise_stack, axis=0)
-            audio_fft = np.fft.rfft(audio)
-            noise_fft = np.fft.rfft(noise_mean)
-            clean_fft = audio_fft - np.abs(noise_fft)
-            audio = np.fft.irfft(clean_fft)
-        # BPM估算
-        bpm = librosa.beat.tempo(y=audio, sr=rate)[0]
-        # 主频估算
-        fft = np.fft.rfft(audio)
-        freqs = np.fft.rfftfreq(len(audio), 1/rate)
-        main_freq = freqs[np.argmax(np.abs(fft))]
-        # 响度估算
-        rms = np.sqrt(np.mean(audio**2))
-        db_raw = 20 * np.log10(rms + 1e-6)
+            source.close()
+
+    def reset_tempo_tracking(self):
+        self.tempo_tracker.reset()
+        self.tempo_elapsed = 0.0
+        self.tempo_gap = False
+
+    def estimate_from_microphone(self, duration=None, rate=16000, chunk=1024):
+        duration = duration or self.split_time
+        # 指定了输入源（如文件回放）时从该源读取，否则使用测量期间一直打开的麦克风
+        source = self.input_source
+        if source is None:
+            source, reused = self.open_capture_source(rate)
+            capture_start = time.monotonic()
+            try:
+                with metrics.stage('capture'):
+                    pcm = source.read_seconds(duration, chunk)
+            except Exception:
+                self.close_capture_source()
+                raise
+            capture_end = time.monotonic()
+            # 两次读取之间麦克风继续录音，由驱动缓冲；间隔超过一个读取块时可能已溢出丢帧，按间断处理
+            if not reused or self.last_capture_end is None or capture_start - self.last_capture_end > chunk / source.rate:
+                self.tempo_gap = True
+            self.tempo_elapsed += duration if self.last_capture_end is None else capture_end - self.last_capture_end
+            self.last_capture_end = capture_end
+        else:
+            # 回放源按顺序输出，相邻窗口在媒体时间上总是连续的
+            with metrics.stage('capture'):
+                pcm = source.read_seconds(duration, chunk)
+            self.tempo_elapsed += duration
+        if not pcm:
+            raise EOFError("输入源数据已读完")
+        rate = source.rate
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        if source.channels > 1:
+            samples = samples.reshape(-1, source.channels)[:, 0]
+        self.last_pcm = samples.tobytes()
+        audio = pcm16_to_float(self.last_pcm)
+        # 存储音频数据供频谱图使用
+        self.audio_data = audio
+        if not self.activity_gate.check(audio, rate):
+            # 无信号：不做速度跟踪、BPM和频谱计算，只报告响度
+            if not self.no_signal:
+                self.no_signal = True
+                self.reset_tempo_tracking()
+                self.add_log("info", "无信号，暂停BPM与频谱分析")
+            # 响度与有信号的窗口一样按噪声模板去噪后计算，门限开合时读数不跳变
+            db = self.apply_calib_compensation('db', window_level(audio, self.noise_templates,
+                                                                  self.governor.settings))
+            return None, int(round(db)), None
+        if self.no_signal:
+            self.no_signal = False
+            self.add_log("info", "检测到信号，恢复BPM与频谱分析")
+        if not self.governor.should_analyze():
+            # 降档后按更低的频率更新，本窗口不产生测量值（界面保持上一次的读数）
+            metrics.inc('skipped_windows')
+            self.tempo_gap = True  # 这个窗口没有送入速度跟踪
+            return None
+        # 去噪 + BPM/主频/响度估算（与多路流分析共用同一套算法），各项指标在线程池中并发计算
+        timings = {} if metrics.enabled else None
+        analysis_start = time.perf_counter()
+        quality = self.governor.settings
+        tempo_future = None
+        if TEMPO_TRACKING_ENABLED:
+            if self.tempo_tracker.rate != rate:
+                self.tempo_tracker = TempoTracker(rate)
+            tempo_future = self.analysis_executor.submit(self.tempo_tracker.update, audio, self.tempo_elapsed,
+                                                         not self.tempo_gap)
+            self.tempo_elapsed = 0.0
+            self.tempo_gap = False
+        # 速度跟踪开启时BPM取跟踪值，不再做单窗口速度估算
+        result = self.analysis_executor.analyze(audio, rate, self.noise_templates, timings=timings,
+                                                freq_range=self.frequency_range, quality=quality,
+                                                with_tempo=tempo_future is None)
+        if tempo_future is not None:
+            tempo, elapsed = tempo_future.result()
+            if timings is not None:
+                timings['tempo_track'] = elapsed
+            result['bpm'] = tempo['bpm']
+            self.bpm_confidence = tempo['confidence']
+            metrics.set_gauge('bpm_confidence', round(tempo['confidence'], 3))
+        metrics.observe_many(timings)
+        level = self.governor.level
+        if self.governor.record(time.perf_counter() - analysis_start, duration) != level:
+            self.add_log("info", f"分析质量调整为 {self.governor.settings['name']}（档位 {self.governor.level}）")
+        if not self.first_analysis_logged:
+            self.first_analysis_logged = True
+            first_analysis = time.perf_counter() - analysis_start
+            metrics.set_gauge('first_analysis_seconds', round(first_analysis, 3))
+            self.add_log("info", f"首次测量分析耗时 {first_analysis:.2f}s")
         # 应用补偿
-        bpm = self.apply_calib_compensation('bpm', bpm)
-        main_freq = self.apply_calib_compensation('hz', main_freq)
-        db = self.apply_calib_compensation('db', db_raw)
+        bpm = self.apply_calib_compensation('bpm', result['bpm'])
+        main_freq = self.apply_calib_compensation('hz', result['hz'])
+        db = self.apply_calib_compensation('db', result['db'])
         return int(round(bpm)), int(round(db)), int(round(main_freq))
 
+    def log_first_measurement(self):
+        """记录冷启动（进程启动）到第一个测量值的耗时，以及其中从点击开始测量算起的部分"""
+        self.first_measurement_logged = True
+        now = time.perf_counter()
+        since_start = now - STARTUP_TIME
+        metrics.set_gauge('first_measurement_seconds', round(since_start, 3))
+        message = f"冷启动到首次测量耗时 {since_start:.2f}s"
+        if self.recording_started_at is not None:
+            since_record = now - self.recording_started_at
+            metrics.set_gauge('record_to_first_measurement_seconds', round(since_record, 3))
+            message += f"（开始测量后 {since_record:.2f}s，含采集 {self.split_time:g}s）"
+        self.add_log("info", message)
+
+    def wait_for_recording(self):
+        """未在测量时挂起采集线程（不占CPU、不定时唤醒），直到开始测量"""
+        with self.state_changed:
+            while not self.is_recording:
+                self.state_changed.wait()
+
+    def wait_next_window(self, started):
+        """
+        等到下一个测量窗口的开始时刻（started + 分段时间）；
+        停止测量时立即返回，等待期间修改分段时间按新值重新计算
+        """
+        with self.state_changed:
+            while self.is_recording:
+                remaining = started + self.split_time - time.monotonic()
+                if remaining <= 0:
+                    return
+                self.state_changed.wait(remaining)
+
     def start_data_simulation(self):
         """启动真实麦克风音频采集线程"""
         def collect_data():
             while True:
-                if self.is_recording:
-                    try:
-                        bpm, db, hz = self.estimate_from_microphone(duration=self.split_time)
+                if not self.is_recording:
+                    self.close_capture_source()
+                self.wait_for_recording()
+                window_started = time.monotonic()
+                try:
+                    measurement = self.estimate_from_microphone(duration=self.split_time)
+                    if not self.is_recording:
+                        continue  # 采集期间已停止测量，丢弃这个窗口
+                    if measurement is None:
+                        # 降档跳过分析的窗口：没有新的测量值，不入库也不写测量记录，只归档音频
+                        self.archive_window()
+                        continue
+                    bpm, db, hz = measurement
+                    if not self.first_measurement_logged:
+                        self.log_first_measurement()
+                    self.current_db = db
+                    if not self.no_signal:
+                        # 无信号窗口没有BPM/主频（bpm/hz为None），界面显示"无信号"
                         self.current_bpm = bpm
-                        self.current_db = db
                         self.current_hz = hz
-                        # 新增：采集波形数据和时间戳
-                        self.waveform_data = self.waveform_data[-99:] + [random.uniform(-1, 1) for _ in range(100)]
-                    
-                        # 修正：使用split_time的倍数作为时间戳，确保与表格显示一致
-                        if not self.time_history:
-                            self.start_time = time.time()
-                            self.time_counter = 0
-                        else:
-                            self.time_counter += 1
-                    
-                        # 使用理论时间（split_time的倍数）而不是实际时间
-                        self.time_history.append(round(self.time_counter * self.split_time, 3))
-                    except Exception as e:
-                        self.add_log("error", f"音频采集/分析失败: {e}")
-                    self.root.after(0, self.update_displays)
-                    self.bpm_history.append(self.current_bpm)
-                    self.db_history.append(self.current_db)
-                    self.hz_history.append(self.current_hz)
-                    if len(self.bpm_history) > 50:
-                        self.bpm_history = self.bpm_history[-50:]
-                        self.db_history = self.db_history[-50:]
-                        self.hz_history = self.hz_history[-50:]
-                        self.time_history = self.time_history[-50:]
-                time.sleep(self.split_time)
+                    # 新增：采集波形数据和时间戳
+                    self.waveform_data = self.waveform_data[-99:] + [random.uniform(-1, 1) for _ in range(100)]
+                
+                    # 修正：使用split_time的倍数作为时间戳，确保与表格显示一致
+                    if not self.time_history:
+                        self.start_time = time.time()
+                        self.time_counter = 0
+                    else:
+                        self.time_counter += 1
+                
+                    # 使用理论时间（split_time的倍数）而不是实际时间
+                    self.time_history.append(round(self.time_counter * self.split_time, 3))
+                    if self.no_signal:
+                        self.archive_window()  # 无信号窗口不入库、不写测量记录，只归档音频
+                    else:
+                        self.measurement_store.add(bpm, db, hz, stream_id='gui',
+                                                   confidence=self.bpm_confidence if TEMPO_TRACKING_ENABLED else None)
+                        self.archive_window(bpm, db, hz)
+                except EOFError:
+                    self.is_recording = False
+                    self.add_log("info", "回放文件已结束，停止测量")
+                    self.root.after(0, lambda: self.play_button.configure(text="▶"))
+                    continue
+                except Exception as e:
+                    metrics.inc('errors')
+                    self.add_log("error", f"音频采集/分析失败: {e}")
+                self.root.after(0, self.update_displays)
+                # 无信号窗口的BPM/主频记为None：曲线在此断开，CSV中留空
+                self.bpm_history.append(None if self.no_signal else self.current_bpm)
+                self.db_history.append(self.current_db)
+                self.hz_history.append(None if self.no_signal else self.current_hz)
+                if len(self.bpm_history) > 50:
+                    self.bpm_history = self.bpm_history[-50:]
+                    self.db_history = self.db_history[-50:]
+                    self.hz_history = self.hz_history[-50:]
+                    self.time_history = self.time_history[-50:]
+                # 输入源自身控制节奏（回放源按墙钟或尽快输出）
+                if self.input_source is not None:
+                    continue
+                # 从窗口开始算起：麦克风持续录音，读满一个窗口后立即接着读下一个，窗口之间不留空档
+                self.wait_next_window(window_started)
         # 在后台线程中运行数据采集
         data_thread = threading.Thread(target=collect_data, daemon=True)
         data_thread.start()
@@ -1118,17 +1418,24 @@ class AudioProcessorGUI:
     
     def update_displays(self):
         """更新显示数据"""
+        with metrics.stage('tk_redraw'):
+            self._update_displays()
+        if self.debug_mode:
+            self.update_metrics_display()
+
+    def _update_displays(self):
         # 更新数字显示
         if hasattr(self, 'bpm_label'):
-            self.bpm_label.configure(text=f"{self.current_bpm}")
+            self.bpm_label.configure(text="--" if self.no_signal else f"{self.current_bpm}")
         if hasattr(self, 'db_label'):
             self.db_label.configure(text=f"{self.current_db} dB")
         if hasattr(self, 'hz_label'):
             hz_display = f"{self.current_hz/1000:.1f} kHz" if self.frequency_unit == 'kHz' else f"{self.current_hz} Hz"
-            self.hz_label.configure(text=hz_display)
+            self.hz_label.configure(text="无信号" if self.no_signal else hz_display)
             
-        # 更新频谱图
-        if hasattr(self, 'spectrum_line') and self.audio_data is not None and len(self.audio_data) > 1:
+        # 更新频谱图（无信号时保留上一次的频谱，不再计算FFT）
+        if (hasattr(self, 'spectrum_line') and not self.no_signal
+                and self.audio_data is not None and len(self.audio_data) > 1):
             # 计算FFT
             n = len(self.audio_data)
             fft_data = np.fft.rfft(self.audio_data * np.hamming(n))
@@ -1151,6 +1458,10 @@ class AudioProcessorGUI:
         self.current_bpm = 0
         self.current_db = 0
         self.current_hz = 0
+        self.reset_tempo_tracking()
+        self.governor.reset()
+        self.activity_gate.reset()
+        self.no_signal = False
         self.add_log("info", "测量数据已重置")
         self.update_displays()
         self.update_stats_plot()
@@ -1188,6 +1499,31 @@ class AudioProcessorGUI:
             messagebox.showerror("导出失败", str(e))
             self.add_log("error", f"CSV导出失败: {e}")
 
+    def export_session(self):
+        """导出本次运行以来的全部测量记录（列式NPZ/Parquet，后台分块写入，不阻塞界面）"""
+        filetypes = [('压缩NPZ', '*.npz')]
+        if parquet_available():
+            filetypes.append(('Parquet', '*.parquet'))
+        file_path = filedialog.asksaveasfilename(
+            defaultextension='.npz',
+            filetypes=filetypes,
+            title='导出完整会话'
+        )
+        if not file_path:
+            return
+        self.add_log("info", f"开始导出会话: {file_path}")
+
+        def on_done(rows, error):
+            if error is not None:
+                self.add_log("error", f"会话导出失败: {error}")
+                self.root.after(0, lambda: messagebox.showerror("导出失败", str(error)))
+                return
+            self.add_log("info", f"会话导出完成: {rows} 条记录 -> {file_path}")
+            self.root.after(0, lambda: messagebox.showinfo("导出成功", f"{rows} 条记录已导出到: {file_path}"))
+
+        export_in_background(self.measurement_store, file_path, stream_id='gui',
+                             start=self.session_start, on_done=on_done)
+
     def show_advanced_calib_page(self):
         """显示高级校准页面，支持多样本录制/删除，类型选择"""
         self.set_active_nav("高级校准")
@@ -1203,6 +1539,7 @@ class AudioProcessorGUI:
             tk.Radiobutton(type_frame, text=label, variable=self.calib_type_var, value=t, font=('Arial', 10), fg='#fff', bg='#000000', selectcolor='#404040').pack(side=tk.LEFT, padx=10)
         # 录制按钮
         tk.Button(calib_frame, text="录制2s样本", font=('Arial', 12, 'bold'), bg='#3b82f6', fg='#fff', command=self.record_calib_sample).pack(pady=10)
+        tk.Button(calib_frame, text="重新分析全部样本", font=('Arial', 10), bg='#404040', fg='#fff', relief='flat', command=self.recalibrate_samples).pack(pady=(0, 10))
         # 样本列表
         self.calib_sample_frame = tk.Frame(calib_frame, bg='#1a1a1a')
         self.calib_sample_frame.pack(fill=tk.X, pady=5)
@@ -1262,18 +1599,10 @@ class AudioProcessorGUI:
                 actual = self.analyze_calib_actual(audio, t)
                 self.add_log("info", f"录制{t}校准样本，目标: {target}，实际: {actual:.2f}")
                 
-                # 3. 计算补偿并保存
-                compensation = target - actual
-                if not hasattr(self, 'calib_compensations'):
-                    self.calib_compensations = {'hz': 0, 'db': 0, 'bpm': 0}
-                self.calib_compensations[t] = compensation
+                # 3. 保存样本并更新补偿（持久化到当前设备的校准配置）
+                compensation = self.store_calib_sample(t, audio, target, actual)
                 self.add_log("info", f"{t}补偿值: {compensation:+.2f} 已保存，后续测量将自动修正")
                 
-                # 4. 保存样本
-                if not hasattr(self, 'calib_samples'):
-                    self.calib_samples = {'hz': [], 'db': [], 'bpm': []}
-                self.calib_samples[t].append(audio)
-                
                 # 使用after方法在主线程中安全地更新UI
                 if hasattr(self, 'root') and self.root.winfo_exists():
                     self.root.after(0, self.refresh_calib_sample_list)
@@ -1290,30 +1619,8 @@ class AudioProcessorGUI:
             self.add_log("error", f"录制校准样本失败: {e}")
 
     def analyze_calib_actual(self, audio, t):
-        """分析录音样本的实际bpm/hz/db"""
-        rate = 16000
-        if t == 'bpm':
-            try:
-                bpm = librosa.beat.tempo(y=audio, sr=rate)[0]
-                return float(bpm)
-            except:
-                return 0.0
-        elif t == 'hz':
-            try:
-                fft = np.fft.rfft(audio)
-                freqs = np.fft.rfftfreq(len(audio), 1/rate)
-                main_freq = freqs[np.argmax(np.abs(fft))]
-                return float(main_freq)
-            except:
-                return 0.0
-        elif t == 'db':
-            try:
-                rms = np.sqrt(np.mean(audio**2))
-                db = 20 * np.log10(rms + 1e-6)
-                return float(db)
-            except:
-                return 0.0
-        return 0.0
+        """分析录音样本的实际bpm/hz/db（主频与实时测量一样在当前频率范围内估算）"""
+        return measure_calibration_value(audio, t, 16000, self.frequency_range)
 
     def refresh_calib_sample_list(self):
         """刷新校准样本列表UI"""
@@ -1350,6 +1657,9 @@ class AudioProcessorGUI:
         """删除指定类型的校准样本"""
         if hasattr(self, 'calib_samples') and typ in self.calib_samples and 0 <= idx < len(self.calib_samples[typ]):
             del self.calib_samples[typ][idx]
+            if self.calibration_profile is not None:
+                self.calibration_profile.remove_sample(typ, idx)
+                self.calib_compensations = dict(self.calibration_profile.compensations)
             self.refresh_calib_sample_list()
             self.add_log("info", f"已删除{typ}校准样本{idx+1}")
 
@@ -1366,12 +1676,9 @@ class AudioProcessorGUI:
         # 分析实际值
         actual = self.analyze_calibration_value(audio, cal_type)
         self.add_log("info", f"实际{cal_type}: {actual:.2f}")
-        # 计算补偿
-        compensation = target - actual
-        self.save_calibration_compensation(cal_type, compensation)
+        # 保存样本并按全部样本的平均偏差更新补偿（与校准页录制样本相同）
+        compensation = self.store_calib_sample(cal_type, audio, target, actual)
         self.add_log("info", f"补偿值: {compensation:+.2f} 已保存")
-        # 保存样本（如有需要）
-        # ...existing code...
 
     def ask_target_value(self, cal_type):
         """弹窗让用户输入目标bpm/hz/db"""
@@ -1389,30 +1696,19 @@ class AudioProcessorGUI:
 
     def analyze_calibration_value(self, audio, cal_type):
         """分析录音样本的实际bpm/hz/db"""
-        # 这里假设已有相关分析函数
-        if cal_type == 'bpm':
-            return self.estimate_bpm(audio)
-        elif cal_type == 'hz':
-            return self.estimate_hz(audio)
-        elif cal_type == 'db':
-            return self.estimate_db(audio)
-        else:
-            return 0
+        return self.analyze_calib_actual(audio, cal_type)
 
     def save_calibration_compensation(self, cal_type, compensation):
-        """保存补偿参数到字典并持久化"""
-        if not hasattr(self, 'calibration_compensations'):
-            self.calibration_compensations = {'bpm': 0, 'hz': 0, 'db': 0}
-        self.calibration_compensations[cal_type] = compensation
-        # 可扩展为写入文件
-        # with open('calibration_compensations.json', 'w') as f:
-        #     json.dump(self.calibration_compensations, f)
+        """保存补偿参数到字典并持久化到当前设备的校准配置"""
+        if not hasattr(self, 'calib_compensations'):
+            self.calib_compensations = {'bpm': 0, 'hz': 0, 'db': 0}
+        self.calib_compensations[cal_type] = compensation
+        if self.calibration_profile is not None:
+            self.calibration_profile.set_compensation(cal_type, compensation)
 
     def apply_calibration_compensation(self, cal_type, value):
         """测量时自动应用补偿"""
-        if hasattr(self, 'calibration_compensations') and cal_type in self.calibration_compensations:
-            return value + self.calibration_compensations[cal_type]
-        return value
+        return self.apply_calib_compensation(cal_type, value)
 
     # 在测量/估算bpm/hz/db时调用apply_calibration_compensation
     def update_measurement_display(self, bpm, hz, db):
@@ -1423,8 +1719,18 @@ class AudioProcessorGUI:
 
 def main():
     """主函数"""
+    import argparse
+    parser = argparse.ArgumentParser(description='音频处理器桌面界面')
+    parser.add_argument('--replay', help='用WAV/NPY文件或会话归档目录代替麦克风作为输入')
+    parser.add_argument('--fast', action='store_true', help='回放时不按真实时间节奏，尽快输出')
+    args = parser.parse_args()
+
     root = tk.Tk()
     app = AudioProcessorGUI(root)
+    if args.replay:
+        app.input_source = create_source(args.replay, realtime=not args.fast).open()
+        app.sample_rate = app.input_source.rate
+        app.add_log("info", f"使用回放输入: {args.replay}")
     
     # 设置窗口图标（如果有的话）
     try:
@@ -1434,6 +1740,8 @@ def main():
         pass
     
     root.mainloop()
+    app.close_session_archive()
+    app.analysis_executor.shutdown()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
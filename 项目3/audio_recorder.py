@@ -1,74 +1,245 @@
-
-import pyaudio
-import wave
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from input_source import PyAudioSource, SAMPLE_WIDTH
+from metrics import metrics
 
 CHUNK = 1024
-FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 44100
 RECORD_SECONDS = 5
 WAVE_OUTPUT_FILENAME = "output.wav"
 
-def record_audio(filename=WAVE_OUTPUT_FILENAME, record_seconds=RECORD_SECONDS, device_index=None):
+WRITER_QUEUE_CHUNKS = 2048  # 写线程队列上限（44.1kHz/1024帧时约47秒的缓冲）
+HEADER_FIXUP_INTERVAL = 1.0  # 秒；定期回写WAV头并刷盘，崩溃时最多丢失这么长的数据
+WAV_HEADER_SIZE = 44
+WAV_MAX_DATA_BYTES = 0xFFFFFFFF - 36  # RIFF长度字段为uint32（= 36 + data长度），单个WAV文件的数据上限
+
+
+class StreamingWavWriter:
+    """
+    边录边写的WAV写入器
+
+    采集线程调用 write() 只把数据放入队列，磁盘写入由后台线程完成，磁盘延迟不会阻塞读音频；
+    写线程定期回写RIFF/data长度并刷盘，进程崩溃时已写入的部分仍是合法的WAV文件。
+    设置 max_seconds / max_bytes 时按时长/大小轮转到新文件：output_000.wav, output_001.wav, ...；
+    未设置时写满WAV格式上限（约4GiB）后也会接着写 output_001.wav, ...
+
+    写线程出错后 error 被置位并计入 record_write_errors，之后 write() 一律返回False，调用方应停止录制
+    """
+
+    def __init__(self, filename, rate, channels=1, sample_width=SAMPLE_WIDTH,
+                 max_seconds=None, max_bytes=None, queue_chunks=WRITER_QUEUE_CHUNKS,
+                 fixup_interval=HEADER_FIXUP_INTERVAL):
+        self.filename = filename
+        self.rate = rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_bytes = channels * sample_width
+        for name, value in (('max_seconds', max_seconds), ('max_bytes', max_bytes)):
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} must be positive, got {value}")
+        self.rotate = max_seconds is not None or max_bytes is not None
+        limits = [WAV_MAX_DATA_BYTES // self.frame_bytes * self.frame_bytes]
+        if max_seconds is not None:
+            # 至少一帧，否则极短的时长会让 _write_data 不停轮转而写不进数据
+            limits.append(max(1, int(max_seconds * rate)) * self.frame_bytes)
+        if max_bytes is not None:
+            limits.append(max(self.frame_bytes, (max_bytes - WAV_HEADER_SIZE) // self.frame_bytes * self.frame_bytes))
+        self.max_data_bytes = min(limits)
+        self.fixup_interval = fixup_interval
+
+        self.queue = queue.Queue(maxsize=queue_chunks)
+        self.files = []          # 已创建的文件路径
+        self.dropped_chunks = 0  # 队列满（磁盘长时间跟不上）时丢弃的数据块数
+        self.error = None
+        self.file = None
+        self.data_bytes = 0
+        self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+
+    def write(self, data):
+        """提交一块PCM数据（不阻塞）；返回False表示写线程已出错（见error）或队列已满被丢弃"""
+        if self.error is not None:
+            return False
+        try:
+            self.queue.put_nowait(data)
+            return True
+        except queue.Full:
+            self.dropped_chunks += 1
+            metrics.inc('dropped_record_chunks')
+            return False
+
+    def close(self):
+        """写完队列中剩余的数据并关闭文件"""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _next_path(self):
+        if not self.rotate and not self.files:
+            return self.filename
+        base, ext = os.path.splitext(self.filename)
+        return f"{base}_{len(self.files):03d}{ext or '.wav'}"
+
+    def _header(self, data_bytes):
+        return struct.pack('<4sI4s4sIHHIIHH4sI',
+                           b'RIFF', 36 + data_bytes, b'WAVE',
+                           b'fmt ', 16, 1, self.channels, self.rate,
+                           self.rate * self.frame_bytes, self.frame_bytes, self.sample_width * 8,
+                           b'data', data_bytes)
+
+    def _open_file(self):
+        path = self._next_path()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'wb')
+        self.file.write(self._header(0))
+        self.data_bytes = 0
+        self.files.append(path)
+
+    def _fixup_header(self):
+        """回写当前长度到WAV头并刷盘"""
+        self.file.flush()
+        position = self.file.tell()
+        self.file.seek(0)
+        self.file.write(self._header(self.data_bytes))
+        self.file.seek(position)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _close_file(self):
+        if self.file is not None:
+            self._fixup_header()
+            self.file.close()
+            self.file = None
+
+    def _write_data(self, data):
+        while data:
+            if self.file is None:
+                self._open_file()
+            room = self.max_data_bytes - self.data_bytes
+            part, data = data[:room], data[room:]
+            self.file.write(part)
+            self.data_bytes += len(part)
+            if self.data_bytes >= self.max_data_bytes:
+                self._close_file()
+
+    def _writer_loop(self):
+        last_fixup = time.monotonic()
+        try:
+            while True:
+                try:
+                    data = self.queue.get(timeout=self.fixup_interval)
+                except queue.Empty:
+                    data = b''
+                if data is None:
+                    break
+                if data:
+                    with metrics.stage('record_write'):
+                        self._write_data(data)
+                if self.file is not None and time.monotonic() - last_fixup >= self.fixup_interval:
+                    self._fixup_header()
+                    last_fixup = time.monotonic()
+        except Exception as e:
+            self.error = e
+            metrics.inc('record_write_errors')
+            print(f"Error writing {self.files[-1] if self.files else self.filename}: {e}", file=sys.stderr)
+            # 出错后继续取走队列中的数据，避免close()阻塞
+            while self.queue.get() is not None:
+                pass
+        finally:
+            try:
+                self._close_file()
+            except Exception as e:
+                self.error = self.error or e
+
+
+def record_audio(filename=WAVE_OUTPUT_FILENAME, record_seconds=RECORD_SECONDS, device_index=None, source=None,
+                 max_file_seconds=None, max_file_bytes=None):
     """
-    录制音频并保存为WAV文件
-    
+    录制音频并边录边写入WAV文件（内存占用恒定）
+
     参数:
         filename (str): 输出文件名
-        record_seconds (int): 录制时长（秒）
+        record_seconds (int): 录制时长（秒），None表示一直录制到Ctrl+C或输入源结束
         device_index (int, optional): 输入设备索引，None表示使用默认设备
-    
+        source (InputSource, optional): 替代麦克风的输入源（如文件回放），采样率/声道以其为准
+        max_file_seconds (float, optional): 单个文件的最长时长，超过后轮转到新文件
+        max_file_bytes (int, optional): 单个文件的最大字节数，超过后轮转到新文件
+
     返回:
         bool: 录制是否成功
     """
-    p = pyaudio.PyAudio()
-    
+    if source is None:
+        source = PyAudioSource(device_index, RATE, CHANNELS, CHUNK)
+
     try:
-        stream = p.open(format=FORMAT,
-                        channels=CHANNELS,
-                        rate=RATE,
-                        input=True,
-                        input_device_index=device_index,
-                        frames_per_buffer=CHUNK)
+        source.open()
+        writer = None
+        try:
+            writer = StreamingWavWriter(filename, source.rate, source.channels,
+                                        max_seconds=max_file_seconds, max_bytes=max_file_bytes)
+            print("* recording")
+            total_chunks = None if record_seconds is None else int(source.rate / CHUNK * record_seconds)
+            i = 0
+            while total_chunks is None or i < total_chunks:
+                i += 1
+                try:
+                    data = source.read(CHUNK)
+                    if not writer.write(data) and writer.error is not None:
+                        break  # 写入失败（如磁盘已满），不再继续采集；错误由下面的 close() 报告
+                except EOFError:
+                    # 回放源已读完
+                    break
+                except IOError as e:
+                    # 处理录音过程中可能出现的IO错误
+                    print(f"Warning: {e}")
+                    continue
 
-        print("* recording")
-        frames = []
+            print("* done recording")
+        except KeyboardInterrupt:
+            print("* recording stopped")
+        finally:
+            # 确保输入流被正确关闭
+            source.close()
 
-        for i in range(0, int(RATE / CHUNK * record_seconds)):
-            try:
-                data = stream.read(CHUNK, exception_on_overflow=False)
-                frames.append(data)
-            except IOError as e:
-                # 处理录音过程中可能出现的IO错误
-                print(f"Warning: {e}")
-                continue
-
-        print("* done recording")
-        
-        # 确保流被正确关闭
-        stream.stop_stream()
-        stream.close()
-        
-        # 保存录音文件
+        if writer is None:
+            return False
         try:
-            wf = wave.open(filename, 'wb')
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(p.get_sample_size(FORMAT))
-            wf.setframerate(RATE)
-            wf.writeframes(b''.join(frames))
-            wf.close()
-            return True
+            writer.close()
         except Exception as e:
             print(f"Error saving audio file: {e}")
             return False
-            
+        if writer.dropped_chunks:
+            print(f"Warning: {writer.dropped_chunks} chunks dropped (disk too slow)")
+        return True
+
     except Exception as e:
         print(f"Error recording audio: {e}")
         return False
-    finally:
-        # 确保PyAudio实例被正确终止
-        p.terminate()
 
 if __name__ == "__main__":
-    record_audio("audio_bpm_detector/data/recorded_audio.wav")
+    import argparse
+
+    def positive_float(text):
+        value = float(text)
+        if value <= 0:
+            raise argparse.ArgumentTypeError(f"must be positive, got {text}")
+        return value
 
+    parser = argparse.ArgumentParser(description='录制音频到WAV文件')
+    parser.add_argument('filename', nargs='?', default="audio_bpm_detector/data/recorded_audio.wav")
+    parser.add_argument('--seconds', type=float, default=RECORD_SECONDS, help='录制时长，0表示一直录制到Ctrl+C')
+    parser.add_argument('--device', type=int, help='输入设备索引')
+    parser.add_argument('--rotate-seconds', type=positive_float, help='按时长轮转文件（秒）')
+    parser.add_argument('--rotate-mb', type=positive_float, help='按大小轮转文件（MB）')
+    args = parser.parse_args()
+    record_audio(args.filename, args.seconds or None, args.device,
+                 max_file_seconds=args.rotate_seconds,
+                 max_file_bytes=int(args.rotate_mb * 1024 * 1024) if args.rotate_mb else None)
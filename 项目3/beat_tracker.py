@@ -0,0 +1,199 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+from audio_analysis import DEFAULT_RATE, OnsetEnvelope
+
+N_FFT = 1024
+HOP = 256
+HISTORY_SECONDS = 8.0      # 估算速度/相位使用的起音包络长度
+UPDATE_INTERVAL = 0.25     # 秒；每隔多久重新估算一次速度和相位
+MIN_BPM = 60
+MAX_BPM = 200
+PRIOR_BPM = 120.0          # 没有外部速度提示时的先验中心（与librosa一致）
+RECENT_BEATS = 16
+PREDICTED_BEATS = 4
+
+
+class BeatTracker:
+    """
+    在线节拍跟踪：随采集逐块计算谱通量起音包络，定期用自相关估算节拍周期、
+    用梳状滤波在最近几秒的包络上估算节拍相位，并把节拍网格换算为墙钟时间
+
+    客户端拿到 next_beats（预测的后续节拍时间）后可以提前调度灯光，抵消网络和分析延迟
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, n_fft=N_FFT, hop=HOP, history_seconds=HISTORY_SECONDS,
+                 update_interval=UPDATE_INTERVAL, min_bpm=MIN_BPM, max_bpm=MAX_BPM):
+        self.rate = rate
+        self.n_fft = n_fft
+        self.hop = hop
+        self.frame_rate = rate / hop
+        self.history_frames = int(history_seconds * self.frame_rate)
+        self.update_frames = max(1, int(update_interval * self.frame_rate))
+        self.min_lag = int(np.floor(60.0 / max_bpm * self.frame_rate))
+        self.max_lag = int(np.ceil(60.0 / min_bpm * self.frame_rate))
+        self.onsets = OnsetEnvelope(n_fft, hop)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.onsets.reset()
+            self.envelope = np.zeros(self.history_frames, dtype=np.float32)  # 环形缓冲，按帧序号取模
+            self.frames_total = 0
+            self.samples_total = 0
+            self.last_wall = None          # 最新样本对应的墙钟时间
+            self.frames_since_update = 0
+            self.tempo_hint = None         # 外部速度提示（如窗口分析得到的BPM），作为先验中心
+            self.period = None             # 节拍周期（秒）
+            self.anchor = None             # 某个节拍的墙钟时间
+            self.confidence = 0.0
+            self.recent_beats = collections.deque(maxlen=RECENT_BEATS)
+            self.suspended = False         # 无信号期间不外推节拍，也不重新估算
+
+    def suspend(self):
+        """无信号时暂停预测：snapshot()不再返回节拍，包络照常累积，resume()后下一块立即重新估算"""
+        with self.lock:
+            self.suspended = True
+
+    def resume(self):
+        with self.lock:
+            self.suspended = False
+
+    def set_tempo_hint(self, bpm):
+        """设置速度先验；没有音频输入时（如模拟数据）直接按该速度生成节拍网格"""
+        with self.lock:
+            if not bpm or bpm <= 0:
+                return
+            self.tempo_hint = float(bpm)
+            if self.frames_total == 0:
+                now = time.time()
+                period = 60.0 / self.tempo_hint
+                if self.anchor is None or self.period is None:
+                    self.anchor = now
+                else:
+                    # 保持当前相位连续，只改变周期
+                    self.anchor = self._last_beat(now)
+                self.period = period
+                self.confidence = 0.0
+
+    def push(self, samples, now=None):
+        """
+        送入一块采集到的浮点样本
+
+        参数:
+            samples (np.ndarray): 单声道浮点音频
+            now (float, optional): 该块最后一个样本的采集时刻（墙钟时间），默认当前时间；
+                                   实时输入应减去输入源的延迟（InputSource.latency），否则预测的节拍偏晚
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            flux = self.onsets.push(samples)
+            self.samples_total += len(samples)
+            self.last_wall = now
+            if not len(flux):
+                return
+            positions = np.arange(self.frames_total, self.frames_total + len(flux)) % self.history_frames
+            self.envelope[positions] = flux
+            self.frames_total += len(flux)
+            self.frames_since_update += len(flux)
+            if self.frames_since_update >= self.update_frames and not self.suspended:
+                self.frames_since_update = 0
+                self._update()
+
+    def _ordered_envelope(self):
+        """按时间顺序返回最近的包络（最后一个元素为最新帧）"""
+        count = min(self.frames_total, self.history_frames)
+        start = self.frames_total - count
+        positions = np.arange(start, self.frames_total) % self.history_frames
+        return self.envelope[positions]
+
+    def _frame_wall_time(self, frame):
+        """包络帧中心对应的墙钟时间"""
+        sample = frame * self.hop + self.n_fft / 2
+        return self.last_wall - (self.samples_total - sample) / self.rate
+
+    def _update(self):
+        env = self._ordered_envelope()
+        if len(env) < 2 * self.max_lag:
+            return
+        env = env - np.mean(env)
+        env = np.maximum(env, 0)
+        energy = float(np.dot(env, env))
+        if energy <= 0:
+            self.confidence = 0.0
+            return
+
+        # 周期：包络自相关在[min_lag, max_lag]内、乘以对数正态先验后的峰值，再抛物线插值
+        n = len(env)
+        spectrum = np.fft.rfft(env, 2 * n)
+        autocorr = np.fft.irfft(spectrum * np.conj(spectrum))[:self.max_lag + 2]
+        lags = np.arange(self.min_lag, self.max_lag + 1)
+        bpms = 60.0 * self.frame_rate / lags
+        center = self.tempo_hint or PRIOR_BPM
+        prior = np.exp(-0.5 * (np.log2(bpms) - np.log2(center)) ** 2)
+        scores = autocorr[lags] / energy * prior
+        best = int(np.argmax(scores))
+        lag = float(lags[best])
+        if 0 < best < len(lags) - 1:
+            left, mid, right = autocorr[lags[best] - 1], autocorr[lags[best]], autocorr[lags[best] + 1]
+            denominator = left - 2 * mid + right
+            if denominator:
+                lag += float(np.clip(0.5 * (left - right) / denominator, -0.5, 0.5))
+        self.confidence = float(np.clip(autocorr[lags[best]] / energy, 0.0, 1.0))
+
+        # 相位：对每个候选偏移，沿周期向过去累加包络（梳状滤波），取总和最大的偏移
+        offsets = np.arange(int(np.ceil(lag)))
+        pulses = np.arange(int((n - 1) // lag))
+        positions = np.rint((n - 1) - offsets[:, None] - pulses[None, :] * lag).astype(int)
+        positions = np.clip(positions, 0, n - 1)
+        phase_scores = env[positions].sum(axis=1)
+        offset = int(offsets[np.argmax(phase_scores)])
+        beat_frame = self.frames_total - 1 - offset
+
+        self.period = lag / self.frame_rate
+        self.anchor = self._frame_wall_time(beat_frame)
+        self._record_beats(self.last_wall)
+
+    def _last_beat(self, now):
+        """now之前（含）最近一个节拍的墙钟时间"""
+        return self.anchor + np.floor((now - self.anchor) / self.period) * self.period
+
+    def _record_beats(self, now):
+        """把已经过去的网格节拍记入最近节拍列表（去重）"""
+        beat = self._last_beat(now)
+        beats = [beat - k * self.period for k in range(3, -1, -1)]
+        for b in beats:
+            if not self.recent_beats or b - self.recent_beats[-1] > 0.5 * self.period:
+                self.recent_beats.append(float(b))
+
+    def snapshot(self, now=None):
+        """
+        当前节拍状态
+
+        返回:
+            dict: bpm、phase（当前拍内已走过的比例0~1）、last_beat、next_beats（墙钟时间，秒）、
+                  next_beats_in_ms（相对now的毫秒数，便于时钟未同步的设备调度）、recent_beats、confidence
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            if self.period is None or self.anchor is None or self.suspended:
+                return {'bpm': 0, 'phase': 0.0, 'last_beat': None, 'next_beats': [],
+                        'next_beats_in_ms': [], 'recent_beats': [], 'confidence': 0.0,
+                        'server_time': now}
+            last = float(self._last_beat(now))
+            next_beats = [last + k * self.period for k in range(1, PREDICTED_BEATS + 1)]
+            return {
+                'bpm': round(60.0 / self.period, 2),
+                'period': round(self.period, 4),
+                'phase': round((now - last) / self.period, 4),
+                'last_beat': round(last, 4),
+                'next_beats': [round(b, 4) for b in next_beats],
+                'next_beats_in_ms': [int(round((b - now) * 1000)) for b in next_beats],
+                'recent_beats': [round(b, 4) for b in self.recent_beats],
+                'confidence': round(self.confidence, 3),
+                'server_time': round(now, 4),
+            }
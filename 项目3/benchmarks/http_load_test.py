@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP接口压力测试
+在本机另起一个进程运行 audio_bp（Flask/werkzeug多线程服务器），模拟N个并发客户端
+（仪表盘、ESP32）按配置的比例请求各接口，统计吞吐量、p50/p95/p99延迟和错误率；
+结果保存为JSON，可与之前的结果对比
+
+用法:
+    python benchmarks/http_load_test.py --clients 50 --duration 20
+    python benchmarks/http_load_test.py --mix data=4,history=1,esp32/data=4,esp32/simple=2
+    python benchmarks/http_load_test.py --url http://127.0.0.1:5000   # 压测已运行的服务器
+    python benchmarks/http_load_test.py --compare benchmarks/results/http_load_上次结果.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from run_benchmarks import RESULTS_DIR, compare_results, percentiles
+
+API_PREFIX = '/api/audio'
+DEFAULT_MIX = 'data=4,history=1,esp32/data=4,esp32/simple=2'
+REQUEST_TIMEOUT = 10.0
+
+SERVER_SCRIPT = """
+import logging
+import sys
+from flask import Flask
+from werkzeug.serving import make_server
+import audio
+logging.getLogger('werkzeug').setLevel(logging.ERROR)  # 每个请求一行访问日志会明显拖慢服务器
+app = Flask(__name__)
+app.register_blueprint(audio.audio_bp, url_prefix='{prefix}')
+with audio.data_lock:
+    audio.audio_data['is_recording'] = True
+server = make_server('127.0.0.1', int(sys.argv[1]), app, threaded=True)
+print('ready', flush=True)
+server.serve_forever()
+"""
+
+
+def parse_mix(text):
+    """'data=4,history=1' → [('data', 4.0), ('history', 1.0)]"""
+    mix = []
+    for item in text.split(','):
+        name, _, weight = item.strip().partition('=')
+        mix.append((name.strip('/'), float(weight or 1)))
+    return mix
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, workdir):
+    """在独立进程中启动服务器（工作目录为临时目录，测量数据库不写入项目目录）"""
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    process = subprocess.Popen([sys.executable, '-W', 'ignore', '-c', SERVER_SCRIPT.format(prefix=API_PREFIX),
+                                str(port)], cwd=workdir, env=env, stdout=subprocess.PIPE, text=True)
+    if process.stdout.readline().strip() != 'ready':
+        process.kill()
+        raise RuntimeError("HTTP server failed to start")
+    return process
+
+
+class ClientWorker(threading.Thread):
+    """一个模拟客户端：按权重随机选择接口，串行发送请求（保持连接，服务器关闭时重连）"""
+
+    def __init__(self, host, port, mix, deadline, think_time, seed):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.paths = [f"{API_PREFIX}/{name}" for name, _ in mix]
+        weights = np.array([w for _, w in mix], dtype=float)
+        self.weights = weights / weights.sum()
+        self.deadline = deadline
+        self.think_time = think_time
+        self.rng = np.random.default_rng(seed)
+        self.samples = []   # (接口序号, 延迟秒, 是否成功)
+        self.connection = None
+
+    def _request(self, path):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=REQUEST_TIMEOUT)
+        self.connection.request('GET', path)
+        response = self.connection.getresponse()
+        response.read()
+        if response.will_close:
+            self.connection.close()
+            self.connection = None
+        return response.status
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            index = int(self.rng.choice(len(self.paths), p=self.weights))
+            start = time.perf_counter()
+            try:
+                ok = self._request(self.paths[index]) == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                if self.connection is not None:
+                    self.connection.close()
+                    self.connection = None
+            self.samples.append((index, time.perf_counter() - start, ok))
+            if self.think_time:
+                time.sleep(self.think_time)
+        if self.connection is not None:
+            self.connection.close()
+
+
+def summarize(samples, duration):
+    if not samples:
+        return {'requests': 0}
+    latencies = [latency for _, latency, _ in samples]
+    errors = sum(1 for _, _, ok in samples if not ok)
+    summary = {'requests': len(samples), 'throughput_rps': len(samples) / duration,
+               'error_rate': errors / len(samples)}
+    summary.update(percentiles(latencies))
+    return summary
+
+
+def run_load_test(url, clients, duration, mix, think_time=0.0):
+    """
+    运行一次压测
+
+    返回:
+        dict: 总体与各接口的吞吐量、延迟分位数、错误率
+    """
+    parts = urlsplit(url)
+    deadline = time.monotonic() + duration
+    workers = [ClientWorker(parts.hostname, parts.port, mix, deadline, think_time, seed)
+               for seed in range(clients)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    samples = [s for worker in workers for s in worker.samples]
+    result = {'overall': summarize(samples, elapsed), 'endpoints': {}}
+    for index, (name, _) in enumerate(mix):
+        result['endpoints'][name] = summarize([s for s in samples if s[0] == index], elapsed)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP接口压力测试（仅本机）')
+    parser.add_argument('--clients', type=int, default=20, help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=10.0, help='持续时间（秒）')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='接口及权重，如 data=4,history=1')
+    parser.add_argument('--think-time', type=float, default=0.0, help='每个客户端两次请求之间的间隔（秒）')
+    parser.add_argument('--url', help='已运行服务器的地址（默认在本机另起一个进程）')
+    parser.add_argument('--compare', help='与之前保存的结果对比')
+    parser.add_argument('--output', help='结果文件路径（默认 benchmarks/results/http_load_时间.json）')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    server = None
+    workdir = None
+    url = args.url
+    if url is None:
+        workdir = tempfile.TemporaryDirectory()
+        port = free_port()
+        server = start_server(port, workdir.name)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        result = run_load_test(url, args.clients, args.duration, mix, args.think_time)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+            workdir.cleanup()
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'url': url,
+        'clients': args.clients,
+        'duration': args.duration,
+        'mix': dict(mix),
+        'think_time': args.think_time,
+        'benchmarks': {'http_load': result},
+    }
+    overall = result['overall']
+    print(f"{overall['requests']} requests, {overall.get('throughput_rps', 0):.1f} req/s, "
+          f"errors {overall.get('error_rate', 0):.2%}")
+    for name, stats in [('overall', overall)] + list(result['endpoints'].items()):
+        if stats['requests']:
+            print(f"  {name:14s} n={stats['requests']:6d}  p50 {stats['p50_ms']:7.2f}ms  "
+                  f"p95 {stats['p95_ms']:7.2f}ms  p99 {stats['p99_ms']:7.2f}ms  errors {stats['error_rate']:.2%}")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"http_load_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
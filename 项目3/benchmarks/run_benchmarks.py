@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端基准测试
+使用已知真值的合成信号，测量吞吐量、单次调用延迟分位数、峰值内存和准确度，
+结果保存为JSON，可与之前的结果对比发现性能/精度回退
+
+用法:
+    python benchmarks/run_benchmarks.py                       # 运行全部并保存结果
+    python benchmarks/run_benchmarks.py --only analyze_window
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/上次结果.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_signals import (DEFAULT_RATE, click_track, pure_tone, calibrated_noise,
+                               speech_like_bursts, write_wav)
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+REGRESSION_THRESHOLD = 0.2  # p50延迟增加（或HTTP吞吐量下降）超过20%视为回退
+ERROR_RATE_TOLERANCE = 0.01  # HTTP错误率比基线高出1个百分点以上视为回退
+
+
+def percentiles(latencies):
+    """延迟分位数（毫秒）"""
+    ms = np.asarray(latencies) * 1000
+    return {
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'mean_ms': float(np.mean(ms)),
+    }
+
+
+def measure(fn, repeat, audio_seconds):
+    """
+    重复调用fn并统计性能；峰值内存单独再跑一次（tracemalloc会拖慢计时）
+
+    返回:
+        (最后一次调用的返回值, 性能统计dict)
+    """
+    fn()  # 预热：排除首次调用的JIT编译等一次性开销
+    latencies = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    stats = percentiles(latencies)
+    stats.update({
+        'calls': repeat,
+        'throughput_x_realtime': float(audio_seconds * repeat / sum(latencies)),
+        'peak_memory_mb': peak / 1024 / 1024,
+    })
+    return result, stats
+
+
+def octave_match(estimate, truth, tolerance=0.04):
+    """BPM在容差内与真值或其半/倍频一致"""
+    return any(abs(estimate - truth * k) <= truth * k * tolerance for k in (0.5, 1, 2))
+
+
+def bench_estimate_bpm(repeat, workdir):
+    """bpm_estimator.estimate_bpm：整首文件BPM"""
+    from bpm_estimator import estimate_bpm
+    cases = []
+    for bpm in (90, 120, 150):
+        path = os.path.join(workdir, f'click_{bpm}.wav')
+        write_wav(path, click_track(bpm, duration=20))
+        estimate, stats = measure(lambda: estimate_bpm(path), repeat, 20)
+        cases.append({'truth_bpm': bpm, 'estimate_bpm': float(estimate),
+                      'abs_error': abs(float(estimate) - bpm),
+                      'octave_match': octave_match(float(estimate), bpm), **stats})
+    return {'cases': cases,
+            'mean_abs_error': float(np.mean([c['abs_error'] for c in cases])),
+            'octave_accuracy': float(np.mean([c['octave_match'] for c in cases]))}
+
+
+def bench_tempo_curve(repeat, workdir):
+    """bpm_estimator.estimate_tempo_curve：整段速度曲线（变速点击音轨）"""
+    from bpm_estimator import estimate_tempo_curve
+    segments = (100, 140)
+    duration = 30.0
+    audio = np.concatenate([click_track(bpm, duration) for bpm in segments])
+    curve, stats = measure(lambda: estimate_tempo_curve(audio, DEFAULT_RATE), repeat,
+                           duration * len(segments))
+    truth = np.where(curve['times'] < duration, segments[0], segments[1])
+    # 跨越变速点的窗口不计入准确率
+    clean = np.abs(curve['times'] - duration) > 4.0
+    matches = [octave_match(float(e), t) for e, t in zip(curve['bpm'][clean], truth[clean])]
+    return {'windows': len(curve['times']), 'octave_accuracy': float(np.mean(matches)),
+            'mean_confidence': float(np.mean(curve['confidence'])), **stats}
+
+
+def bench_tempo_tracking(repeat, workdir):
+    """tempo_tracker.TempoTracker：短窗口（0.5s/1s）下跨窗口跟踪与逐窗口估算的准确率对比"""
+    from audio_analysis import compute_bpm
+    from tempo_tracker import TempoTracker
+    segments = (100, 140)
+    duration = 20.0
+    audio = np.concatenate([click_track(bpm, duration) for bpm in segments])
+    cases = []
+    for window in (0.5, 1.0):
+        size = int(window * DEFAULT_RATE)
+        windows = [audio[i:i + size] for i in range(0, len(audio) - size + 1, size)]
+        times = np.arange(len(windows)) * window
+        truth = np.where(times < duration, segments[0], segments[1])
+        # 开始和变速点后留出收敛时间
+        settled = ((times >= 4.0) & (times < duration)) | (times >= duration + 4.0)
+
+        def track():
+            tracker = TempoTracker()
+            return [tracker.update(w)['bpm'] for w in windows]
+
+        tracked, stats = measure(track, repeat, len(audio) / DEFAULT_RATE)
+        raw = [compute_bpm(w, DEFAULT_RATE) for w in windows]
+        cases.append({
+            'window_s': window,
+            'tracked_octave_accuracy': float(np.mean([octave_match(b, t) for b, t in zip(np.array(tracked)[settled], truth[settled])])),
+            'raw_octave_accuracy': float(np.mean([octave_match(b, t) for b, t in zip(np.array(raw)[settled], truth[settled])])),
+            'tracked_median_abs_error': float(np.median(np.abs(np.array(tracked)[settled] - truth[settled]))),
+            'raw_median_abs_error': float(np.median(np.abs(np.array(raw)[settled] - truth[settled]))),
+            **stats})
+    return {'cases': cases}
+
+
+def bench_analyze_window(repeat, workdir):
+    """GUI estimate_from_microphone的分析部分（audio_analysis.analyze_window）"""
+    from audio_analysis import analyze_window
+    window = 2.0
+    cases = []
+    for bpm in (100, 128):
+        audio = click_track(bpm, window)
+        result, stats = measure(lambda: analyze_window(audio, DEFAULT_RATE), repeat, window)
+        cases.append({'signal': f'click_{bpm}bpm', 'metric': 'bpm', 'truth': bpm,
+                      'estimate': result['bpm'], 'abs_error': abs(result['bpm'] - bpm),
+                      'octave_match': octave_match(result['bpm'], bpm), **stats})
+    for hz in (440, 1000, 3150.5):
+        audio = pure_tone(hz, window)
+        result, stats = measure(lambda: analyze_window(audio, DEFAULT_RATE), repeat, window)
+        cases.append({'signal': f'tone_{hz}hz', 'metric': 'hz', 'truth': hz,
+                      'estimate': result['hz'], 'abs_error': abs(result['hz'] - hz), **stats})
+    for db in (-40, -20, -6):
+        audio = calibrated_noise(db, window)
+        result, stats = measure(lambda: analyze_window(audio, DEFAULT_RATE), repeat, window)
+        cases.append({'signal': f'noise_{db}dbfs', 'metric': 'db', 'truth': db,
+                      'estimate': result['db'], 'abs_error': abs(result['db'] - db), **stats})
+    summary = {}
+    for metric in ('bpm', 'hz', 'db'):
+        errors = [c['abs_error'] for c in cases if c['metric'] == metric]
+        summary[f'{metric}_mean_abs_error'] = float(np.mean(errors))
+    return {'cases': cases, **summary}
+
+
+def bench_analysis_executor(repeat, workdir):
+    """analysis_executor.AnalysisExecutor：各项指标并发计算与analyze_window串行计算的延迟对比"""
+    from audio_analysis import analyze_window
+    from analysis_executor import AnalysisExecutor
+    executor = AnalysisExecutor()
+    cases = []
+    try:
+        for window in (0.5, 2.0, 5.0):
+            audio = click_track(128, window)
+            freq_range = {'min': 100, 'max': 8000}
+            serial, serial_stats = measure(lambda: analyze_window(audio, DEFAULT_RATE, freq_range=freq_range),
+                                           repeat, window)
+            concurrent, stats = measure(lambda: executor.analyze(audio, DEFAULT_RATE, freq_range=freq_range),
+                                        repeat, window)
+            cases.append({'window_s': window, 'threads': executor.max_workers,
+                          'serial_p50_ms': serial_stats['p50_ms'],
+                          'speedup': serial_stats['p50_ms'] / stats['p50_ms'],
+                          'identical': all(serial[k] == concurrent[k] for k in concurrent), **stats})
+    finally:
+        executor.shutdown()
+    return {'cases': cases}
+
+
+def bench_quality_levels(repeat, workdir):
+    """
+    governor.QUALITY_LEVELS：各质量档位下用户看到的单窗口耗时与BPM/主频精度
+
+    与GUI/多路流相同：开启速度跟踪时BPM取 TempoTracker 连续送入几个窗口后的跟踪值，
+    窗口分析不做单窗口速度估算（tempo_decimate 不起作用）；关闭时BPM为单窗口估算
+    """
+    from audio_analysis import analyze_window
+    from config import TEMPO_TRACKING_ENABLED
+    from governor import QUALITY_LEVELS
+    from tempo_tracker import TempoTracker
+    rng = np.random.default_rng(0)
+    window = 2.0
+    windows_per_track = 4
+    size = int(DEFAULT_RATE * window)
+    noise_templates = [rng.normal(0, 0.01, size) for _ in range(3)]
+    tracks = {bpm: click_track(bpm, window * windows_per_track) + rng.normal(0, 0.01, size * windows_per_track)
+              for bpm in (96, 128, 150, 174)}
+
+    def visible_window(audio, quality, tracker):
+        result = analyze_window(audio, DEFAULT_RATE, noise_templates, quality=quality,
+                                with_tempo=tracker is None)
+        if tracker is not None:
+            result['bpm'] = tracker.update(audio)['bpm']
+        return result
+
+    def visible_track(audio, quality):
+        tracker = TempoTracker() if TEMPO_TRACKING_ENABLED else None
+        for start in range(0, len(audio), size):
+            result = visible_window(audio[start:start + size], quality, tracker)
+        return result
+
+    cases = []
+    for quality in QUALITY_LEVELS:
+        audio = tracks[128][:size]
+        tracker = TempoTracker() if TEMPO_TRACKING_ENABLED else None
+        _, stats = measure(lambda: visible_window(audio, quality, tracker), repeat, window)
+        results = {bpm: visible_track(audio, quality) for bpm, audio in tracks.items()}
+        cases.append({'level': quality['name'], 'update_interval': quality['update_interval'],
+                      'bpm_accuracy': float(np.mean([octave_match(r['bpm'], bpm) for bpm, r in results.items()])),
+                      'hz_abs_error': float(np.mean([abs(r['hz'] - 1000) for r in results.values()])),
+                      **stats})
+    return {'tempo_tracking': TEMPO_TRACKING_ENABLED, 'cases': cases}
+
+
+def bench_activity_gate(repeat, workdir):
+    """activity_gate.ActivityGate：各类信号的判定结果，以及静音窗口跳过分析后的耗时（对比完整分析）"""
+    from activity_gate import ActivityGate
+    from audio_analysis import analyze_window
+    window = 2.0
+    signals = {
+        'silence_-80db': calibrated_noise(-80, window),
+        'room_noise_-65db': calibrated_noise(-65, window),
+        'click_track_128': click_track(128, window),
+        'tone_440hz': pure_tone(440, window),
+    }
+    cases = []
+    for name, audio in signals.items():
+        gate = ActivityGate(hangover=0)
+        active = gate.check(audio, DEFAULT_RATE)
+        _, gated = measure(lambda: gate.check(audio, DEFAULT_RATE) and analyze_window(audio, DEFAULT_RATE),
+                           repeat, window)
+        cases.append({'signal': name, 'active': active, 'level_db': gate.level_db, **gated})
+    _, full = measure(lambda: analyze_window(signals['silence_-80db'], DEFAULT_RATE), repeat, window)
+    silent = cases[0]
+    return {'cases': cases, 'silent_window_full_p50_ms': full['p50_ms'],
+            'silent_window_speedup': full['p50_ms'] / silent['p50_ms']}
+
+
+def bench_band_frequency(repeat, workdir):
+    """
+    audio_analysis.estimate_band_frequency：短窗口频带内主频精度与耗时（对比全长rfft argmax，即compute_main_freq）
+
+    speedup为argmax耗时/频带估算耗时，窄频带走带内DFT、宽频带走单精度rfft
+    """
+    from audio_analysis import estimate_band_frequency, compute_main_freq
+    bands = {'wide': (100, 8000), 'narrow': (1000, 1100)}
+    cases = []
+    for window in (0.1, 0.5, 2.0):
+        for hz in (440.3, 1050.37, 3150.5):
+            audio = pure_tone(hz, window)
+            _, argmax_stats = measure(lambda: compute_main_freq(audio, DEFAULT_RATE), repeat, window)
+            for band, (f_min, f_max) in bands.items():
+                if not f_min <= hz <= f_max:
+                    continue
+                estimate, stats = measure(lambda: estimate_band_frequency(audio, DEFAULT_RATE, f_min, f_max),
+                                          repeat, window)
+                cases.append({'signal': f'tone_{hz}hz_{window}s', 'band': band, 'truth': hz, 'estimate': estimate,
+                              'abs_error': abs(estimate - hz),
+                              'argmax_abs_error': abs(compute_main_freq(audio, DEFAULT_RATE) - hz),
+                              'argmax_p50_ms': argmax_stats['p50_ms'],
+                              'speedup': argmax_stats['p50_ms'] / stats['p50_ms'], **stats})
+    return {'cases': cases, 'max_abs_error': float(max(c['abs_error'] for c in cases)),
+            'min_speedup': float(min(c['speedup'] for c in cases))}
+
+
+def bench_vad(repeat, workdir):
+    """vad_processor.vad_segment_audio：帧级别准确率（10ms网格）"""
+    from vad_processor import vad_segment_audio
+    duration = 20.0
+    audio, truth = speech_like_bursts(duration)
+    path = os.path.join(workdir, 'speech_bursts.wav')
+    write_wav(path, audio)
+    segments, stats = measure(lambda: vad_segment_audio(path), repeat, duration)
+    grid = np.arange(0, duration, 0.01)
+
+    def mask(spans):
+        m = np.zeros(len(grid), dtype=bool)
+        for start, end in spans:
+            m |= (grid >= start) & (grid < end)
+        return m
+
+    truth_mask = mask(truth)
+    detected_mask = mask([(s, e) for s, e, _ in segments])
+    tp = np.sum(truth_mask & detected_mask)
+    return {'truth_segments': len(truth), 'detected_segments': len(segments),
+            'frame_accuracy': float(np.mean(truth_mask == detected_mask)),
+            'precision': float(tp / max(np.sum(detected_mask), 1)),
+            'recall': float(tp / max(np.sum(truth_mask), 1)), **stats}
+
+
+def bench_extract_features(repeat, workdir):
+    """feature_extractor.extract_features：STFT/Mel特征与图像输出"""
+    import contextlib
+    import io
+    from feature_extractor import extract_features
+    duration = 10.0
+    path = os.path.join(workdir, 'features_input.wav')
+    write_wav(path, click_track(120, duration) + pure_tone(440, duration, amplitude=0.1))
+    output_dir = os.path.join(workdir, 'features')
+    os.makedirs(output_dir, exist_ok=True)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            extract_features(path, output_dir)
+
+    _, stats = measure(run, repeat, duration)
+    mel = np.load(os.path.join(output_dir, 'mel_features.npy'))
+    return {'mel_shape': list(mel.shape), **stats}
+
+
+COLD_START_SCRIPT = """
+import time
+start = time.perf_counter()
+import numpy as np
+from warmup import configure_jit_cache
+configure_jit_cache()
+from audio_analysis import analyze_window
+imported = time.perf_counter()
+analyze_window(np.zeros(32000, dtype=np.float32), 16000)
+done = time.perf_counter()
+print(imported - start, done - imported, done - start)
+"""
+
+
+def bench_cold_start(repeat, workdir):
+    """新进程从导入到完成首次窗口分析的耗时；第一次运行会填充JIT持久化缓存"""
+    import subprocess
+    project_dir = os.path.dirname(BENCH_DIR)
+    runs = []
+    for _ in range(max(repeat, 2)):
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-c', COLD_START_SCRIPT],
+                             cwd=project_dir, capture_output=True, text=True, check=True)
+        import_s, first_s, total_s = (float(v) for v in out.stdout.split()[-3:])
+        runs.append({'import_s': import_s, 'first_analysis_s': first_s, 'total_s': total_s})
+    warm = runs[1:]
+    return {'runs': runs,
+            'first_run_total_s': runs[0]['total_s'],
+            'cached_total_p50_s': float(np.median([r['total_s'] for r in warm])),
+            'cached_first_analysis_p50_s': float(np.median([r['first_analysis_s'] for r in warm]))}
+
+
+BENCHMARKS = {
+    'estimate_bpm': bench_estimate_bpm,
+    'tempo_curve': bench_tempo_curve,
+    'tempo_tracking': bench_tempo_tracking,
+    'analyze_window': bench_analyze_window,
+    'analysis_executor': bench_analysis_executor,
+    'quality_levels': bench_quality_levels,
+    'activity_gate': bench_activity_gate,
+    'band_frequency': bench_band_frequency,
+    'vad_segment_audio': bench_vad,
+    'extract_features': bench_extract_features,
+    'cold_start': bench_cold_start,
+}
+
+
+def run_benchmarks(names=None, repeat=5):
+    """运行指定的基准测试，缺少依赖的项记录为skipped"""
+    results = {
+        'timestamp': datetime.now().isoformat(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'repeat': repeat,
+        'benchmarks': {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names or BENCHMARKS:
+            print(f"* {name} ...", flush=True)
+            try:
+                results['benchmarks'][name] = BENCHMARKS[name](repeat, workdir)
+            except ImportError as e:
+                results['benchmarks'][name] = {'skipped': str(e)}
+                print(f"  skipped: {e}")
+    return results
+
+
+def _flatten(data, prefix=''):
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(_flatten(value, f"{prefix}{key}."))
+    elif isinstance(data, list):
+        for i, value in enumerate(data):
+            flat.update(_flatten(value, f"{prefix}{i}."))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix[:-1]] = data
+    return flat
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    与基线结果对比：延迟(p50)或误差上升超过阈值、准确率下降、
+    HTTP压测（http_load，含各接口）的吞吐量下降超过阈值或错误率上升均视为回退
+
+    返回:
+        list: 回退项描述
+    """
+    base = _flatten(baseline.get('benchmarks', {}))
+    cur = _flatten(current.get('benchmarks', {}))
+    regressions = []
+    for key, value in cur.items():
+        if key not in base:
+            continue
+        old = base[key]
+        if key.endswith('p50_ms') or key.endswith('p50_s') or key.endswith('abs_error'):
+            if value > old * (1 + threshold) and value - old > 1e-6:
+                regressions.append(f"{key}: {old:.4g} -> {value:.4g}")
+        elif key.endswith('accuracy') or key.endswith('recall') or key.endswith('precision'):
+            if value < old - 1e-6:
+                regressions.append(f"{key}: {old:.4g} -> {value:.4g}")
+        elif key.endswith('throughput_rps'):
+            if value < old * (1 - threshold):
+                regressions.append(f"{key}: {old:.4g} -> {value:.4g}")
+        elif key.endswith('error_rate'):
+            if value > old + ERROR_RATE_TOLERANCE:
+                regressions.append(f"{key}: {old:.2%} -> {value:.2%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='音频分析端到端基准测试')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='只运行指定项')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例的计时次数')
+    parser.add_argument('--output', help='结果JSON路径（默认保存到benchmarks/results/）')
+    parser.add_argument('--compare', help='用于对比的基线结果JSON')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only, args.repeat)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results)
+        if regressions:
+            print("Regressions detected:")
+            for item in regressions:
+                print(f"  {item}")
+            sys.exit(1)
+        print("No regressions detected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import wave
+
+import numpy as np
+
+DEFAULT_RATE = 16000
+
+
+def click_track(bpm, duration=10.0, rate=DEFAULT_RATE, click_ms=10, click_hz=1000):
+    """已知BPM的节拍音轨：每拍一个带指数衰减的短促正弦"""
+    audio = np.zeros(int(duration * rate), dtype=np.float32)
+    click_len = int(rate * click_ms / 1000)
+    t = np.arange(click_len) / rate
+    click = (np.sin(2 * np.pi * click_hz * t) * np.exp(-t * 400)).astype(np.float32)
+    period = 60.0 / bpm
+    for onset in np.arange(0, duration, period):
+        start = int(onset * rate)
+        end = min(start + click_len, len(audio))
+        audio[start:end] += click[:end - start]
+    return audio * 0.8
+
+
+def pure_tone(hz, duration=2.0, rate=DEFAULT_RATE, amplitude=0.5):
+    """已知频率的纯音"""
+    t = np.arange(int(duration * rate)) / rate
+    return (amplitude * np.sin(2 * np.pi * hz * t)).astype(np.float32)
+
+
+def calibrated_noise(db, duration=2.0, rate=DEFAULT_RATE, seed=0):
+    """已知响度的白噪声：RMS精确满足 20*log10(rms) == db（dBFS）"""
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal(int(duration * rate))
+    noise *= (10 ** (db / 20)) / np.sqrt(np.mean(noise ** 2))
+    return noise.astype(np.float32)
+
+
+def speech_like_bursts(duration=10.0, rate=DEFAULT_RATE, burst_range=(0.4, 1.2),
+                       gap_range=(0.5, 1.5), seed=0):
+    """
+    类语音片段：带音节包络的谐波突发，间隔为静音
+
+    返回:
+        (audio, segments): segments为真实语音区间 [(start_s, end_s), ...]
+    """
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(duration * rate), dtype=np.float32)
+    segments = []
+    t = rng.uniform(*gap_range)
+    while t < duration - burst_range[1]:
+        length = rng.uniform(*burst_range)
+        n = int(length * rate)
+        tt = np.arange(n) / rate
+        f0 = rng.uniform(110, 220)
+        voiced = sum(np.sin(2 * np.pi * f0 * k * tt) / k for k in range(1, 8))
+        syllables = 0.5 * (1 - np.cos(2 * np.pi * rng.uniform(3, 6) * tt))
+        burst = voiced * syllables * np.hanning(n) * 0.3
+        start = int(t * rate)
+        audio[start:start + n] += burst.astype(np.float32)
+        segments.append((t, t + length))
+        t += length + rng.uniform(*gap_range)
+    audio += (rng.standard_normal(len(audio)) * 1e-4).astype(np.float32)
+    return audio, segments
+
+
+def write_wav(path, audio, rate=DEFAULT_RATE):
+    """浮点音频写为单声道16位WAV"""
+    pcm = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(pcm.tobytes())
@@ -1,49 +1,93 @@
 import librosa
 import os
+import numpy as np
 from config import INPUT_AUDIO_PATH, FEATURES_DIR
-import pyaudio
+from input_source import PyAudioSource
 
 def estimate_bpm(audio_path):
     y, sr = librosa.load(audio_path, sr=None)
     tempo = librosa.beat.tempo(y=y, sr=sr)
     return tempo[0] # Access the scalar value from the array
 
-def estimate_bpm_from_mic(duration=10, segment_duration=2):
+def estimate_tempo_curve(audio, sr=None, window_seconds=8.0, hop_seconds=2.0,
+                         hop_length=512, start_bpm=120.0, max_tempo=320.0):
+    """
+    离线计算整段音频的速度曲线。
+    起音包络和速度图（tempogram）只在整段音频上计算一次，
+    再按窗口对速度图的列求平均并取峰值，而不是每个窗口重新调用 librosa.beat.tempo。
+
+    参数:
+        audio (str|np.ndarray): 音频文件路径或浮点音频数据
+        sr (int): 采样率（audio为数组时必需；为路径时None表示保持原采样率）
+        window_seconds (float): 每个估算窗口的时长（秒）
+        hop_seconds (float): 相邻窗口的间隔（秒）
+        hop_length (int): 起音包络的帧移（采样点）
+        start_bpm (float): 对数正态先验的中心速度，与 librosa.beat.tempo 一致
+        max_tempo (float): 忽略高于该值的速度
+
+    返回:
+        dict: {'times': 窗口中心时间(秒), 'bpm': 每个窗口的速度,
+               'confidence': 峰值处的归一化自相关(0~1)}
+    """
+    if isinstance(audio, str):
+        audio, sr = librosa.load(audio, sr=sr)
+    elif sr is None:
+        raise ValueError("sr is required when audio is an array")
+
+    onset_env = librosa.onset.onset_strength(y=audio, sr=sr, hop_length=hop_length)
+    ac_frames = int(librosa.time_to_frames(window_seconds, sr=sr, hop_length=hop_length))
+    tempogram = librosa.feature.tempogram(onset_envelope=onset_env, sr=sr,
+                                          hop_length=hop_length, win_length=ac_frames)
+    n_frames = tempogram.shape[1]
+
+    # 用列累加和一次性求出所有窗口的平均速度图
+    win_frames = max(1, min(n_frames, ac_frames))
+    hop_frames = max(1, int(librosa.time_to_frames(hop_seconds, sr=sr, hop_length=hop_length)))
+    starts = np.arange(0, n_frames - win_frames + 1, hop_frames)
+    cumulative = np.concatenate([np.zeros((tempogram.shape[0], 1)),
+                                 np.cumsum(tempogram, axis=1)], axis=1)
+    windows = (cumulative[:, starts + win_frames] - cumulative[:, starts]) / win_frames
+
+    # 与 librosa.beat.tempo 相同的对数正态先验（跳过0延迟）
+    bpms = librosa.tempo_frequencies(tempogram.shape[0], sr=sr, hop_length=hop_length)
+    with np.errstate(divide='ignore'):
+        logprior = -0.5 * (np.log2(bpms) - np.log2(start_bpm)) ** 2
+    logprior[bpms >= max_tempo] = -np.inf
+    best = np.argmax(np.log1p(1e6 * windows) + logprior[:, None], axis=0)
+
+    columns = np.arange(len(starts))
+    times = librosa.frames_to_time(starts + win_frames / 2, sr=sr, hop_length=hop_length)
+    return {
+        'times': times,
+        'bpm': bpms[best],
+        'confidence': np.clip(windows[best, columns], 0.0, 1.0),
+    }
+
+def estimate_bpm_from_mic(duration=10, segment_duration=2, source=None):
     """
     实时录音并每2秒估算一次BPM。
     duration: 总录音时长（秒）
     segment_duration: 每段BPM估算时长（秒）
+    source: 可选的InputSource（如WavReplaySource），默认使用麦克风
     """
     CHUNK = 1024
-    FORMAT = pyaudio.paInt16
-    CHANNELS = 1
-    RATE = 16000
-    p = pyaudio.PyAudio()
-    stream = p.open(format=FORMAT,
-                    channels=CHANNELS,
-                    rate=RATE,
-                    input=True,
-                    frames_per_buffer=CHUNK)
+    RATE = source.rate if source is not None else 16000
+    source = source or PyAudioSource(rate=RATE, chunk=CHUNK)
     print(f"* 正在录音 {duration} 秒，每{segment_duration}秒输出一次BPM...")
-    frames = []
     segment_frames = int(RATE * segment_duration)
     total_frames = int(RATE * duration)
-    for i in range(0, total_frames, segment_frames):
-        segment = b''
-        frames_needed = segment_frames // CHUNK
-        for _ in range(frames_needed):
-            data = stream.read(CHUNK)
-            segment += data
-        # 转为numpy数组
-        import numpy as np
-        audio_np = np.frombuffer(segment, dtype=np.int16).astype(float) / 32768.0
-        # BPM估算
-        import librosa
-        bpm = librosa.beat.tempo(y=audio_np, sr=RATE)[0]
-        print(f"{i//segment_frames+1}: BPM = {bpm:.2f}")
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
+    with source:
+        for i in range(0, total_frames, segment_frames):
+            segment = source.read_chunks(segment_frames // CHUNK, CHUNK)
+            if not segment:
+                break
+            # 转为numpy数组
+            audio_np = np.frombuffer(segment, dtype=np.int16).astype(float) / 32768.0
+            if source.channels > 1:
+                audio_np = audio_np.reshape(-1, source.channels)[:, 0]
+            # BPM估算
+            bpm = librosa.beat.tempo(y=audio_np, sr=RATE)[0]
+            print(f"{i//segment_frames+1}: BPM = {bpm:.2f}")
     print("* 录音结束")
 
 if __name__ == "__main__":
@@ -58,4 +102,11 @@ if __name__ == "__main__":
         f.write(f"Estimated BPM: {bpm:.2f}")
     print(f"Estimated BPM saved to {os.path.join(output_dir, 'estimated_bpm.txt')}")
 
+    # 速度随时间的变化曲线
+    curve = estimate_tempo_curve(input_audio_path)
+    curve_path = os.path.join(output_dir, "tempo_curve.csv")
+    np.savetxt(curve_path, np.column_stack([curve['times'], curve['bpm'], curve['confidence']]),
+               delimiter=",", fmt="%.3f", header="time,bpm,confidence", comments="")
+    print(f"Tempo curve saved to {curve_path}")
+
 
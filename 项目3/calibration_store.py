@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+校准配置持久化
+按 输入设备名称 + 采样率 保存补偿值和校准样本，启动时自动加载；
+分析算法变更后可批量并行重新分析全部样本并更新补偿值
+
+用法:
+    python calibration_store.py                          # 列出已保存的校准配置
+    python calibration_store.py --recalibrate            # 重新分析所有配置的样本
+"""
+
+import json
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from audio_analysis import DEFAULT_RATE, compute_bpm, compute_db, estimate_frequency
+from config import CALIBRATION_DIR
+
+CALIBRATION_TYPES = ('hz', 'db', 'bpm')
+PROFILE_FILE = 'profile.json'
+
+
+def measure_calibration_value(audio, cal_type, rate=DEFAULT_RATE, freq_range=None):
+    """
+    校准样本的实际测量值（与实时测量使用同一套算法）
+
+    参数:
+        freq_range (dict, optional): 实时测量的频率范围 {'min': Hz, 'max': Hz}；
+            主频补偿必须用与实时测量相同的频带估算
+    """
+    try:
+        if cal_type == 'bpm':
+            return compute_bpm(audio, rate)
+        if cal_type == 'hz':
+            return estimate_frequency(audio, rate, freq_range)
+        if cal_type == 'db':
+            return compute_db(audio)
+    except Exception:
+        return 0.0
+    return 0.0
+
+
+def _measure_sample_file(path, cal_type, rate, freq_range=None):
+    """进程池中执行：加载一个样本文件并重新测量"""
+    return measure_calibration_value(np.load(path), cal_type, rate, freq_range)
+
+
+def profile_key(device_name, rate):
+    """设备名 + 采样率 → 目录名（去掉文件系统不允许的字符）"""
+    name = re.sub(r'[\\/:*?"<>|\s]+', '_', str(device_name or 'default')).strip('_') or 'default'
+    return f"{name}@{int(rate)}"
+
+
+class CalibrationProfile:
+    """一个设备/采样率的校准配置：补偿值 + 样本（音频保存为.npy，元数据保存在profile.json）"""
+
+    def __init__(self, path, device_name, rate):
+        self.path = path
+        self.device_name = device_name
+        self.rate = rate
+        self.compensations = {t: 0.0 for t in CALIBRATION_TYPES}
+        self.manual = set()  # 手动设置了补偿值的类型：增删样本、重新分析都不覆盖
+        self.samples = []  # [{'type', 'file', 'target', 'actual', 'recorded', 'frequency_range'}, ...]
+        self.updated = None
+
+    @classmethod
+    def load(cls, path, device_name, rate):
+        profile = cls(path, device_name, rate)
+        profile_path = os.path.join(path, PROFILE_FILE)
+        if os.path.exists(profile_path):
+            with open(profile_path, encoding='utf-8') as f:
+                data = json.load(f)
+            profile.compensations.update(data.get('compensations', {}))
+            profile.manual = set(data.get('manual', []))
+            profile.samples = [s for s in data.get('samples', [])
+                               if os.path.exists(os.path.join(path, s['file']))]
+            profile.updated = data.get('updated')
+        return profile
+
+    def save(self):
+        """写入临时文件后替换，避免写到一半时崩溃损坏配置"""
+        os.makedirs(self.path, exist_ok=True)
+        self.updated = datetime.now().isoformat()
+        data = {
+            'device': self.device_name,
+            'rate': self.rate,
+            'compensations': self.compensations,
+            'manual': sorted(self.manual),
+            'samples': self.samples,
+            'updated': self.updated,
+        }
+        tmp_path = os.path.join(self.path, PROFILE_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.path, PROFILE_FILE))
+
+    def samples_of(self, cal_type):
+        return [s for s in self.samples if s['type'] == cal_type]
+
+    def load_audio(self, sample):
+        return np.load(os.path.join(self.path, sample['file']))
+
+    def _update_compensation(self, cal_type):
+        """补偿值取该类型所有样本 (目标 - 实际) 的平均；手动设置的补偿值保持不变"""
+        if cal_type in self.manual:
+            return
+        offsets = [s['target'] - s['actual'] for s in self.samples_of(cal_type)]
+        self.compensations[cal_type] = float(np.mean(offsets)) if offsets else 0.0
+
+    def add_sample(self, cal_type, audio, target, actual, freq_range=None):
+        """
+        保存一个样本并更新补偿值，返回新的补偿值
+
+        参数:
+            freq_range (dict, optional): 测量actual时使用的频率范围，重新分析时沿用
+        """
+        os.makedirs(self.path, exist_ok=True)
+        file_name = f"{cal_type}_{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}.npy"
+        np.save(os.path.join(self.path, file_name), np.asarray(audio, dtype=np.float32))
+        self.samples.append({'type': cal_type, 'file': file_name, 'target': float(target),
+                             'actual': float(actual), 'recorded': datetime.now().isoformat(),
+                             'frequency_range': freq_range})
+        self._update_compensation(cal_type)
+        self.save()
+        return self.compensations[cal_type]
+
+    def remove_sample(self, cal_type, idx):
+        """删除该类型的第idx个样本"""
+        samples = self.samples_of(cal_type)
+        if not 0 <= idx < len(samples):
+            return False
+        sample = samples[idx]
+        self.samples.remove(sample)
+        try:
+            os.remove(os.path.join(self.path, sample['file']))
+        except OSError:
+            pass
+        self._update_compensation(cal_type)
+        self.save()
+        return True
+
+    def set_compensation(self, cal_type, value):
+        """直接设置补偿值（不录制样本时使用）；此后该类型的样本不再改变补偿值，直到 clear_compensation"""
+        self.compensations[cal_type] = float(value)
+        self.manual.add(cal_type)
+        self.save()
+
+    def clear_compensation(self, cal_type):
+        """取消手动补偿，恢复为样本偏差的平均，返回新的补偿值"""
+        self.manual.discard(cal_type)
+        self._update_compensation(cal_type)
+        self.save()
+        return self.compensations[cal_type]
+
+    def recalibrate(self, executor=None):
+        """
+        用当前算法重新分析全部样本并更新补偿值
+
+        返回:
+            list: [(类型, 旧实际值, 新实际值), ...]
+        """
+        own_executor = executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor()
+        try:
+            return self._apply_recalibration(self._submit_recalibration(executor))
+        finally:
+            if own_executor:
+                executor.shutdown()
+
+    def _submit_recalibration(self, executor):
+        return [executor.submit(_measure_sample_file, os.path.join(self.path, s['file']),
+                                s['type'], self.rate, s.get('frequency_range')) for s in self.samples]
+
+    def _apply_recalibration(self, futures):
+        changes = []
+        for sample, future in zip(self.samples, futures):
+            actual = float(future.result())
+            changes.append((sample['type'], sample['actual'], actual))
+            sample['actual'] = actual
+        for cal_type in CALIBRATION_TYPES:
+            self._update_compensation(cal_type)
+        self.save()
+        return changes
+
+
+class CalibrationStore:
+    """校准配置目录：每个 设备@采样率 一个子目录"""
+
+    def __init__(self, root=CALIBRATION_DIR):
+        self.root = root
+
+    def load(self, device_name, rate=DEFAULT_RATE):
+        """加载（不存在时创建空的）校准配置"""
+        path = os.path.join(self.root, profile_key(device_name, rate))
+        return CalibrationProfile.load(path, device_name, rate)
+
+    def list_profiles(self):
+        """返回全部已保存的配置"""
+        profiles = []
+        if not os.path.isdir(self.root):
+            return profiles
+        for name in sorted(os.listdir(self.root)):
+            profile_path = os.path.join(self.root, name, PROFILE_FILE)
+            if not os.path.exists(profile_path):
+                continue
+            with open(profile_path, encoding='utf-8') as f:
+                data = json.load(f)
+            profiles.append(CalibrationProfile.load(os.path.join(self.root, name),
+                                                    data.get('device'), data.get('rate', DEFAULT_RATE)))
+        return profiles
+
+    def recalibrate_all(self, max_workers=None):
+        """所有配置的样本共用一个进程池并行重新分析"""
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # 先提交全部样本再等待结果，多个配置的样本同时在进程池中分析
+            pending = [(profile, profile._submit_recalibration(executor)) for profile in self.list_profiles()]
+            return {os.path.basename(profile.path): profile._apply_recalibration(futures)
+                    for profile, futures in pending}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='校准配置管理')
+    parser.add_argument('--recalibrate', action='store_true', help='用当前算法重新分析全部样本')
+    parser.add_argument('--workers', type=int, help='并行进程数（默认CPU核数）')
+    args = parser.parse_args()
+
+    store = CalibrationStore()
+    if args.recalibrate:
+        for key, changes in store.recalibrate_all(args.workers).items():
+            print(f"{key}: {len(changes)} samples")
+            for cal_type, old, new in changes:
+                print(f"  {cal_type}: {old:.2f} -> {new:.2f}")
+    for profile in store.list_profiles():
+        counts = ", ".join(f"{t}={len(profile.samples_of(t))}" for t in CALIBRATION_TYPES)
+        offsets = ", ".join(f"{t}={v:+.2f}{' (manual)' if t in profile.manual else ''}"
+                            for t, v in profile.compensations.items())
+        print(f"{os.path.basename(profile.path)}  samples: {counts}  compensations: {offsets}")
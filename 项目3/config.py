@@ -8,6 +8,22 @@ INPUT_AUDIO_PATH = os.path.join("data", INPUT_AUDIO_FILENAME)
 VAD_SEGMENTS_DIR = os.path.join("data", "vad_segments")
 FEATURES_DIR = os.path.join("data", "features")
 
+# Capture settings
+DEVICE_SAMPLE_RATE = None  # native device rate (e.g. 44100); resampled to the analysis rate. None opens devices at the analysis rate
+
+# Tempo settings
+TEMPO_TRACKING_ENABLED = True  # carry tempo state across analysis windows (stable BPM with short split_time); False reports each window's own estimate
+ANALYSIS_THREADS = None  # GUI per-metric analysis threads (tempo/fft/rms run concurrently); None = min(4, CPU count), 1 = serial
+QUALITY_GOVERNOR_ENABLED = True  # step analysis quality down (smaller FFT, no denoise, decimated tempo, fewer updates) when it falls behind
+ANALYSIS_LATENCY_BUDGET = None  # seconds per window; None = half the window length
+
+# Activity gate settings (inactive windows skip tempo/spectral analysis and report "no signal")
+ACTIVITY_GATE_ENABLED = True
+ACTIVITY_THRESHOLD_DB = -55.0     # window RMS in dBFS (before calibration) below this counts as silence
+ACTIVITY_VAD_ENABLED = False      # additionally require WebRTC VAD to find voiced frames (speech-only deployments)
+ACTIVITY_VAD_MIN_RATIO = 0.1      # fraction of voiced 30 ms frames needed when the VAD is enabled
+ACTIVITY_HANGOVER_WINDOWS = 1     # inactive windows still analyzed after activity, so fade-outs are not cut off
+
 # Audio recording settings (if microphone input were available)
 RECORD_SECONDS = 5
 WAVE_OUTPUT_FILENAME = "recorded_audio.wav"
@@ -19,3 +35,38 @@ VAD_AGGRESSIVENESS = 3 # 0-3, 3 is most aggressive
 MEL_N_MELS = 128
 
 
+
+# Session archive settings (raw audio + measurements, indexed by time)
+SESSION_ARCHIVE_ENABLED = True
+SESSION_ARCHIVE_DIR = os.path.join("data", "sessions")
+
+# Calibration profiles (per input device name and sample rate)
+CALIBRATION_DIR = os.path.join("data", "calibration")
+
+# Measurement persistence settings
+MEASUREMENT_DB_PATH = os.path.join("data", "measurements.db")
+MEASUREMENT_BATCH_SIZE = 200      # rows per write transaction
+MEASUREMENT_FLUSH_INTERVAL = 5.0  # seconds between forced flushes
+
+# File analysis job settings (uploaded WAVs analyzed in a process pool, results cached by content hash)
+ANALYSIS_JOBS_DIR = os.path.join("data", "jobs")
+ANALYSIS_JOB_WORKERS = None  # worker processes; None = CPU count
+ANALYSIS_UPLOAD_MAX_BYTES = 512 * 1024 * 1024
+
+# Remote PCM ingest settings (network devices stream 16-bit PCM into the analysis pipeline)
+PCM_INGEST_UDP_ENABLED = False
+PCM_INGEST_UDP_PORT = 5005
+PCM_INGEST_JITTER_MS = 200        # buffered before playout; missing packets are waited for this long, then filled with silence
+PCM_INGEST_MAX_BUFFER_MS = 2000   # oldest audio is dropped beyond this (analysis falling behind)
+PCM_INGEST_IDLE_TIMEOUT = 10.0    # seconds without data after the device started sending -> stream stops
+
+# Push server settings (persistent TCP connections for display clients, one JSON line per measurement)
+PUSH_SERVER_ENABLED = False
+PUSH_SERVER_PORT = 8765
+
+# Metrics settings
+METRICS_ENABLED = True  # stage timers / counters for the /metrics endpoint
+
+# Startup settings
+JIT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "audio_processor", "numba")
+WARMUP_ON_STARTUP = True  # run the tempo path once in the background while the UI builds
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+def lttb_indices(y, n_out, x=None):
+    """
+    Largest-Triangle-Three-Buckets降采样，返回保留点的下标
+
+    参数:
+        y (array-like): 数据序列
+        n_out (int): 输出点数（通常取图表的像素宽度）
+        x (array-like, optional): 横坐标，默认使用下标
+
+    返回:
+        np.ndarray: 升序下标，首尾两点总是保留
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 0)]
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+
+    # 中间n-2个点均分为n_out-2个桶；每个桶的均值一次性用reduceat算出
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    mean_x = np.append(mean_x[1:], x[-1])
+    mean_y = np.append(mean_y[1:], y[-1])
+
+    indices = np.empty(n_out, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - mean_x[i]) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (mean_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def minmax_indices(y, n_out):
+    """
+    Min/Max降采样：每个桶保留最小值和最大值两点，完全向量化，适合柱状图等只关心峰值的场景
+
+    返回:
+        np.ndarray: 升序下标，长度不超过n_out
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n == 0:
+        return np.arange(n)
+    n_buckets = max(n_out // 2, 1)
+    size = int(np.ceil(n / n_buckets))
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(n_buckets, size)
+    valid = ~np.all(np.isnan(buckets), axis=1)
+    offsets = np.arange(n_buckets)[valid] * size
+    lows = np.nanargmin(buckets[valid], axis=1) + offsets
+    highs = np.nanargmax(buckets[valid], axis=1) + offsets
+    return np.unique(np.concatenate([lows, highs]))
+
+
+def downsample(x, y, n_out, method='lttb'):
+    """对(x, y)序列降采样，返回降采样后的(x, y)数组"""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if method == 'minmax':
+        indices = minmax_indices(y, n_out)
+    else:
+        indices = lttb_indices(y, n_out, x if np.issubdtype(x.dtype, np.number) else None)
+    return x[indices], y[indices]
+
+
+def downsample_history(history, max_points, keys=('bpm', 'db', 'hz')):
+    """
+    对历史数据字典（各键为等长列表）降采样，所有序列共享同一组下标，保持时间对齐
+
+    每个序列各自按LTTB挑选 max_points/len(keys) 个点，再取并集，因此每条曲线的峰值都被保留
+
+    返回:
+        dict: 与history结构相同的新字典
+    """
+    keys = [k for k in keys if k in history]
+    length = len(history[keys[0]]) if keys else 0
+    if not max_points or length <= max_points:
+        return {k: list(v) for k, v in history.items()}
+    per_series = max(max_points // len(keys), 3)
+    indices = np.unique(np.concatenate([lttb_indices(history[k], per_series) for k in keys]))
+    return {k: [v[i] for i in indices] for k, v in history.items()}
@@ -12,6 +12,11 @@ const char* password = "YOUR_WIFI_PASSWORD";    // 替换为你的WiFi密码
 const char* apiHost = "YOUR_API_SERVER_IP"; // 替换为运行Python API的电脑的IP地址
 const int apiPort = 5000;                   // Python API的端口，默认为5000
 const char* apiEndpoint = "/api/audio/esp32/data"; // 获取数据的API接口
+const int longPollSeconds = 25;             // 长轮询：服务器没有新数据时最多挂起请求这么久
+const int retryDelayMs = 2000;              // 请求失败或WiFi断开时的重试间隔
+
+HTTPClient http;
+long lastSeq = -1;                          // 上次收到的数据序号，-1表示还没有收到过
 
 void setup() {
   Serial.begin(115200);
@@ -30,12 +35,18 @@ void setup() {
 WiFi connected");
   Serial.print("IP address: ");
   Serial.println(WiFi.localIP());
+
+  http.setReuse(true);                       // 保持长连接，每次请求不必重新握手
+  http.setTimeout((longPollSeconds + 5) * 1000);
 }
 
 void loop() {
   if (WiFi.status() == WL_CONNECTED) {
-    HTTPClient http;
+    // 带上次的序号发起长轮询：有新数据时服务器立即返回，否则挂起直到有新数据或超时
     String serverPath = String("http://") + apiHost + ":" + apiPort + apiEndpoint;
+    if (lastSeq >= 0) {
+      serverPath += String("?since=") + lastSeq + "&wait=" + longPollSeconds;
+    }
 
     Serial.println("\nMaking HTTP GET request to: ");
     Serial.println(serverPath);
@@ -57,6 +68,8 @@ void loop() {
       if (error) {
         Serial.print(F("deserializeJson() failed: "));
         Serial.println(error.f_str());
+        http.end();
+        delay(retryDelayMs);
         return;
       }
 
@@ -65,6 +78,7 @@ void loop() {
       int hz = doc["hz"];
       bool recording = doc["recording"];
       long timestamp = doc["timestamp"];
+      lastSeq = doc["seq"] | -1;
 
       Serial.print("BPM: ");
       Serial.println(bpm);
@@ -77,6 +91,8 @@ void loop() {
       Serial.print("Timestamp: ");
       Serial.println(timestamp);
 
+      http.end();
+      return;  // 立即发起下一次长轮询
     } else {
       Serial.print("Error code: ");
       Serial.println(httpResponseCode);
@@ -86,7 +102,7 @@ void loop() {
   else {
     Serial.println("WiFi Disconnected");
   }
-  delay(2000); // 每2秒获取一次数据
+  delay(retryDelayMs); // 出错时稍后重试
 }
 
 
@@ -0,0 +1,111 @@
+from config import ANALYSIS_LATENCY_BUDGET, QUALITY_GOVERNOR_ENABLED
+from metrics import metrics
+
+# 质量档位：从完整质量依次降级，每一档在上一档的基础上再省掉一部分计算
+#   fft_size        主频估算只取窗口中间的这么多样本（None为整个窗口）
+#   denoise         是否做谱减法去噪
+#   tempo_decimate  单窗口速度估算前的整数倍降采样（开启速度跟踪时不做单窗口估算，此项不起作用）
+#   update_interval 每几个窗口分析一次（其余窗口不产生测量值，显示沿用上一次的结果）
+QUALITY_LEVELS = (
+    {'name': 'full', 'fft_size': None, 'denoise': True, 'tempo_decimate': 1, 'update_interval': 1},
+    {'name': 'small_fft', 'fft_size': 8192, 'denoise': True, 'tempo_decimate': 1, 'update_interval': 1},
+    {'name': 'no_denoise', 'fft_size': 8192, 'denoise': False, 'tempo_decimate': 1, 'update_interval': 1},
+    {'name': 'decimated_tempo', 'fft_size': 4096, 'denoise': False, 'tempo_decimate': 2, 'update_interval': 1},
+    {'name': 'low_rate', 'fft_size': 4096, 'denoise': False, 'tempo_decimate': 2, 'update_interval': 2},
+)
+BUDGET_FRACTION = 0.5  # 未配置预算时，每个窗口的分析耗时不超过窗口时长的这个比例
+SMOOTHING = 0.3        # 耗时指数平均的权重
+STEP_UP_RATIO = 0.5    # 平均耗时低于预算的这个比例才考虑升档
+STEP_UP_WINDOWS = 5    # 连续这么多个窗口有余量才升一档（避免在两档之间来回切换）
+
+
+class QualityGovernor:
+    """
+    按每个窗口的分析耗时与延迟预算调节分析质量
+
+    平均耗时超过预算（或有窗口因上一窗口未完成而被丢弃）时降一档；
+    连续 STEP_UP_WINDOWS 个窗口的平均耗时低于预算的 STEP_UP_RATIO 时升一档。
+    换档后平均耗时从新档位的第一个窗口重新计算。当前档位写入仪表 quality_level（标签 gauge_labels，
+    如 {'stream': 流ID}）
+    """
+
+    def __init__(self, budget=ANALYSIS_LATENCY_BUDGET, levels=QUALITY_LEVELS,
+                 enabled=QUALITY_GOVERNOR_ENABLED, gauge_labels=None):
+        self.budget = budget  # 秒；None表示按窗口时长的 BUDGET_FRACTION 计算
+        self.levels = levels
+        self.enabled = enabled
+        self.gauge_labels = gauge_labels
+        self.publish = True
+        self.reset()
+
+    def reset(self):
+        self.level = 0
+        self.warming_up = True  # 第一个窗口包含进程池启动和JIT编译时间，不计入
+        self.average = None
+        self.headroom_windows = 0
+        self.window_counter = 0
+        self._publish_level()
+
+    def _publish_level(self):
+        if self.publish:
+            metrics.set_gauge('quality_level', self.level, self.gauge_labels)
+
+    def drop_gauge(self):
+        """移除仪表，之后不再写入（所属的流被删除时调用）"""
+        self.publish = False
+        metrics.remove_gauge('quality_level', self.gauge_labels)
+
+    @property
+    def settings(self):
+        """当前档位的参数（传给 analyze_window / AnalysisExecutor.analyze 的 quality）"""
+        return self.levels[self.level]
+
+    def budget_for(self, window_seconds):
+        return self.budget if self.budget is not None else window_seconds * BUDGET_FRACTION
+
+    def should_analyze(self):
+        """按当前档位的 update_interval 决定本窗口是否分析"""
+        self.window_counter += 1
+        interval = self.settings['update_interval']
+        return interval <= 1 or self.window_counter % interval == 0
+
+    def record(self, seconds, window_seconds):
+        """
+        记录一个窗口从开始分析到拿到结果的耗时
+
+        返回:
+            int: 调整后的档位
+        """
+        if not self.enabled:
+            return self.level
+        if self.warming_up:
+            self.warming_up = False
+            return self.level
+        if self.average is None:
+            self.average = seconds
+        else:
+            self.average += SMOOTHING * (seconds - self.average)
+        budget = self.budget_for(window_seconds)
+        if self.average > budget:
+            self._step(1)
+        elif self.average < budget * STEP_UP_RATIO:
+            self.headroom_windows += 1
+            if self.headroom_windows >= STEP_UP_WINDOWS:
+                self._step(-1)
+        else:
+            self.headroom_windows = 0
+        return self.level
+
+    def record_overrun(self):
+        """窗口因上一个仍在分析而被丢弃：已经跟不上，直接降一档"""
+        if self.enabled:
+            self._step(1)
+
+    def _step(self, direction):
+        level = min(max(self.level + direction, 0), len(self.levels) - 1)
+        self.average = None
+        self.headroom_windows = 0
+        if level != self.level:
+            self.level = level
+            metrics.inc('quality_level_changes')
+            self._publish_level()
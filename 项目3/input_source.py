@@ -0,0 +1,309 @@
+import abc
+import time
+import wave
+
+import numpy as np
+
+from resampler import FormatConverter
+
+DEFAULT_RATE = 16000
+SAMPLE_WIDTH = 2  # 统一输出16位PCM
+
+
+class InputSource(abc.ABC):
+    """
+    音频输入源接口：所有实时路径都通过它读取16位交错PCM，
+    因此同一套采集/分析代码既能接麦克风，也能回放文件
+
+    子类必须实现 read()，需要时覆盖 open()/close()。read(frames) 的语义与 pyaudio 的
+    stream.read 一致：返回 frames 帧的字节串；数据耗尽时抛出 EOFError
+    """
+
+    realtime = True
+
+    def __init__(self, rate=DEFAULT_RATE, channels=1):
+        self.rate = rate
+        self.channels = channels
+
+    def open(self):
+        return self
+
+    @abc.abstractmethod
+    def read(self, frames):
+        pass
+
+    def close(self):
+        pass
+
+    def interrupt(self):
+        """让阻塞中的read()尽快抛出EOFError（网络源等待数据时由采集线程的stop调用）"""
+        pass
+
+    @property
+    def latency(self):
+        """
+        最近一次read()返回的最后一个样本距现在的时长（秒）：设备/抖动缓冲中还有多少更新的数据没读出。
+        采集线程用 time.time() - latency 作为该块的采集时刻；回放源为0
+        """
+        return 0.0
+
+    def read_chunks(self, count, chunk=1024):
+        """读取count个chunk并拼接；源耗尽时返回已读到的部分（可能为空）"""
+        frames = []
+        for _ in range(count):
+            try:
+                frames.append(self.read(chunk))
+            except EOFError:
+                break
+        return b''.join(frames)
+
+    def read_seconds(self, duration, chunk=1024):
+        """按chunk读取duration秒的数据（与原麦克风循环一致，不足一个chunk的尾部舍去）"""
+        return self.read_chunks(int(self.rate / chunk * duration), chunk)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class PyAudioSource(InputSource):
+    """麦克风/声卡输入"""
+
+    def __init__(self, device_index=None, rate=DEFAULT_RATE, channels=1, chunk=1024):
+        super().__init__(rate, channels)
+        self.device_index = device_index
+        self.chunk = chunk
+        self.pa = None
+        self.stream = None
+
+    def open(self):
+        import pyaudio
+        self.pa = pyaudio.PyAudio()
+        try:
+            self.stream = self.pa.open(format=pyaudio.paInt16,
+                                       channels=self.channels,
+                                       rate=self.rate,
+                                       input=True,
+                                       frames_per_buffer=self.chunk,
+                                       input_device_index=self.device_index)
+        except Exception:
+            self.pa.terminate()
+            self.pa = None
+            raise
+        return self
+
+    def read(self, frames):
+        return self.stream.read(frames, exception_on_overflow=False)
+
+    @property
+    def latency(self):
+        # 驱动报告的输入延迟，加上声卡缓冲中已采集但尚未读出的帧
+        if self.stream is None:
+            return 0.0
+        return self.stream.get_input_latency() + self.stream.get_read_available() / self.rate
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.pa is not None:
+            self.pa.terminate()
+            self.pa = None
+
+
+class ReplaySource(InputSource):
+    """
+    回放源基类：realtime=True时按墙钟节奏输出（模拟真实麦克风），
+    False时尽可能快地输出，用于离线跑完长时间录音
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, channels=1, realtime=False, loop=False):
+        super().__init__(rate, channels)
+        self.realtime = realtime
+        self.loop = loop
+        self.frames_emitted = 0
+        self.start_time = None
+
+    @abc.abstractmethod
+    def _read_frames(self, frames):
+        """读取最多frames帧，返回字节串；到达末尾时返回不足的部分"""
+
+    @abc.abstractmethod
+    def _rewind(self):
+        pass
+
+    def open(self):
+        self.frames_emitted = 0
+        self.start_time = time.perf_counter()
+        return self
+
+    def read(self, frames):
+        data = self._read_frames(frames)
+        bytes_per_frame = SAMPLE_WIDTH * self.channels
+        while self.loop and len(data) < frames * bytes_per_frame:
+            self._rewind()
+            more = self._read_frames(frames - len(data) // bytes_per_frame)
+            if not more:
+                break
+            data += more
+        if not data:
+            raise EOFError("replay source exhausted")
+        self.frames_emitted += len(data) // bytes_per_frame
+        if self.realtime:
+            due = self.start_time + self.frames_emitted / self.rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return data
+
+
+class WavReplaySource(ReplaySource):
+    """回放PCM WAV文件；非16位（8/24/32位）的样本在读取时转换为16位"""
+
+    def __init__(self, path, realtime=False, loop=False):
+        self.path = path
+        self.wf = None
+        self.converter = None  # 非16位文件的位宽转换器，open()时创建
+        with wave.open(path, 'rb') as wf:
+            self.sample_width = wf.getsampwidth()
+            rate, channels = wf.getframerate(), wf.getnchannels()
+        super().__init__(rate, channels, realtime, loop)
+
+    def open(self):
+        self.wf = wave.open(self.path, 'rb')
+        self._create_converter()
+        return super().open()
+
+    def _create_converter(self):
+        if self.sample_width != SAMPLE_WIDTH:
+            self.converter = FormatConverter(self.rate, self.channels, self.sample_width,
+                                             self.rate, self.channels)
+
+    def _read_frames(self, frames):
+        data = self.wf.readframes(frames)
+        if self.converter is not None:
+            data = self.converter.process(data)
+        return data
+
+    def _rewind(self):
+        self.wf.rewind()
+        self._create_converter()
+
+    def close(self):
+        if self.wf is not None:
+            self.wf.close()
+            self.wf = None
+
+
+class ArrayReplaySource(ReplaySource):
+    """回放NumPy数组：浮点数组按[-1, 1]转换为16位，整型数组按int16处理；多声道形状为(帧数, 声道)"""
+
+    def __init__(self, audio, rate=DEFAULT_RATE, realtime=False, loop=False):
+        audio = np.asarray(audio)
+        if np.issubdtype(audio.dtype, np.floating):
+            audio = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+        else:
+            audio = audio.astype(np.int16)
+        channels = 1 if audio.ndim == 1 else audio.shape[1]
+        super().__init__(rate, channels, realtime, loop)
+        self.pcm = audio.tobytes()
+        self.position = 0
+
+    def open(self):
+        self.position = 0
+        return super().open()
+
+    def _read_frames(self, frames):
+        size = frames * SAMPLE_WIDTH * self.channels
+        data = self.pcm[self.position:self.position + size]
+        self.position += len(data)
+        return data
+
+    def _rewind(self):
+        self.position = 0
+
+
+class ResamplingSource(InputSource):
+    """
+    在任意输入源与分析器之间做流式格式转换（采样率、声道）：
+    设备或文件按原生格式读取，输出目标采样率的单声道/多声道16位PCM
+    """
+
+    def __init__(self, source, rate=DEFAULT_RATE, channels=1):
+        super().__init__(rate, channels)
+        self.source = source
+        self.realtime = source.realtime
+        self.converter = None
+        self.buffer = b''
+        self.exhausted = False
+
+    def open(self):
+        self.source.open()
+        self.converter = FormatConverter(self.source.rate, self.source.channels, SAMPLE_WIDTH,
+                                         self.rate, self.channels)
+        self.buffer = b''
+        self.exhausted = False
+        return self
+
+    def read(self, frames):
+        needed = frames * SAMPLE_WIDTH * self.channels
+        # 每次从原始源读取的帧数按比例换算，保证一次读取通常就能凑够输出
+        source_frames = max(1, int(np.ceil(frames * self.source.rate / self.rate)))
+        while len(self.buffer) < needed and not self.exhausted:
+            try:
+                self.buffer += self.converter.process(self.source.read(source_frames))
+            except EOFError:
+                self.exhausted = True
+                self.buffer += self.converter.flush()
+        if not self.buffer:
+            raise EOFError("source exhausted")
+        data, self.buffer = self.buffer[:needed], self.buffer[needed:]
+        return data
+
+    @property
+    def latency(self):
+        # 已转换但尚未读出的数据同样晚于刚返回的样本
+        return self.source.latency + len(self.buffer) / (SAMPLE_WIDTH * self.channels) / self.rate
+
+    def close(self):
+        self.source.close()
+
+
+def create_source(spec=None, rate=DEFAULT_RATE, channels=1, realtime=False, device_rate=None):
+    """
+    根据描述字符串创建输入源
+
+    参数:
+        spec (str|int|None): None或'mic'为默认麦克风；'mic:3'或整数为指定设备；
+                             其他字符串视为WAV文件路径（.npy为NumPy数组，会话归档目录回放其中的音频）
+        rate (int): 输出采样率；文件或设备的原生格式不同时自动插入流式重采样
+        realtime (bool): 文件回放是否按墙钟节奏
+        device_rate (int, optional): 麦克风以该原生采样率打开（如44100），再重采样到rate
+
+    返回:
+        InputSource: 未打开的输入源
+    """
+    if spec is None or spec == 'mic' or isinstance(spec, int) or spec.startswith('mic:'):
+        if isinstance(spec, int):
+            device_index = spec
+        elif spec and spec.startswith('mic:'):
+            device_index = int(spec[4:])
+        else:
+            device_index = None
+        if device_rate and device_rate != rate:
+            return ResamplingSource(PyAudioSource(device_index, device_rate, channels), rate, channels)
+        return PyAudioSource(device_index, rate, channels)
+    from session_archive import ArchiveReplaySource, is_session_archive
+    if is_session_archive(spec):
+        source = ArchiveReplaySource(spec, realtime=realtime)
+    elif spec.endswith('.npy'):
+        source = ArrayReplaySource(np.load(spec), rate, realtime=realtime)
+    else:
+        source = WavReplaySource(spec, realtime=realtime)
+    if source.rate != rate or source.channels != channels:
+        return ResamplingSource(source, rate, channels)
+    return source
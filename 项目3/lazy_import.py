@@ -0,0 +1,47 @@
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+    延迟导入的模块代理：首次访问属性时才真正import，之后直接转发
+
+    用法:
+        librosa = LazyModule('librosa')
+        librosa.beat.tempo(...)  # 此时才导入librosa
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def load(self):
+        """立即导入并返回真实模块（可在后台线程中调用以提前加载）"""
+        module = self.__dict__['_module']
+        if module is None:
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+        return module
+
+    @property
+    def loaded(self):
+        return self.__dict__['_module'] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<LazyModule '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_module(name):
+    """返回name对应模块的延迟导入代理"""
+    return LazyModule(name)
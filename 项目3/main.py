@@ -1,38 +1,30 @@
 import numpy as np
 
-def realtime_bpm_detection(duration=400, segment_duration=2):
+def realtime_bpm_detection(duration=400, segment_duration=2, source=None):
     """
     实时录音并每2秒估算一次BPM。
     duration: 总录音时长（秒）
     segment_duration: 每段BPM估算时长（秒）
+    source: 可选的InputSource（如WavReplaySource），默认使用麦克风
     """
-    import pyaudio
     import librosa
+    from input_source import PyAudioSource
     CHUNK = 1024
-    FORMAT = pyaudio.paInt16
-    CHANNELS = 1
-    RATE = 16000
-    p = pyaudio.PyAudio()
-    stream = p.open(format=FORMAT,
-                    channels=CHANNELS,
-                    rate=RATE,
-                    input=True,
-                    frames_per_buffer=CHUNK)
+    RATE = source.rate if source is not None else 16000
+    source = source or PyAudioSource(rate=RATE, chunk=CHUNK)
     print(f"* 正在录音 {duration} 秒，每{segment_duration}秒输出一次BPM...")
     segment_frames = int(RATE * segment_duration)
     total_frames = int(RATE * duration)
-    for i in range(0, total_frames, segment_frames):
-        segment = b''
-        frames_needed = segment_frames // CHUNK
-        for _ in range(frames_needed):
-            data = stream.read(CHUNK)
-            segment += data
-        audio_np = np.frombuffer(segment, dtype=np.int16).astype(float) / 32768.0
-        bpm = librosa.beat.tempo(y=audio_np, sr=RATE)[0]
-        print(int(round(bpm)))
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
+    with source:
+        for i in range(0, total_frames, segment_frames):
+            segment = source.read_chunks(segment_frames // CHUNK, CHUNK)
+            if not segment:
+                break
+            audio_np = np.frombuffer(segment, dtype=np.int16).astype(float) / 32768.0
+            if source.channels > 1:
+                audio_np = audio_np.reshape(-1, source.channels)[:, 0]
+            bpm = librosa.beat.tempo(y=audio_np, sr=RATE)[0]
+            print(int(round(bpm)))
     print("* 录音结束")
 
 if __name__ == "__main__":
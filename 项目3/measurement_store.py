@@ -0,0 +1,344 @@
+import atexit
+import collections
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+from config import MEASUREMENT_DB_PATH, MEASUREMENT_BATCH_SIZE, MEASUREMENT_FLUSH_INTERVAL
+from metrics import metrics
+
+METRICS = ('bpm', 'db', 'hz')
+ROLLUPS = {'minute': 60, 'hour': 3600}
+MAX_PENDING = 100000
+EXPORT_CHUNK_ROWS = 65536
+
+
+class MeasurementStore:
+    """
+    测量数据持久化：内存中缓冲测量值，由后台线程按批次写入SQLite（WAL模式），
+    同时增量维护分钟/小时汇总表（min/max/avg）
+    """
+
+    def __init__(self, db_path=MEASUREMENT_DB_PATH, batch_size=MEASUREMENT_BATCH_SIZE,
+                 flush_interval=MEASUREMENT_FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # 待写入缓冲有上限，磁盘长时间不可写时丢弃最旧的数据而不是无限占用内存
+        self.pending = collections.deque(maxlen=max_pending)
+        self.dropped = 0
+        self.write_errors = 0
+        self.last_error = None  # 最近一次写入失败的原因；写入恢复后清空
+        self.condition = threading.Condition()
+        self.running = True
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_schema()
+
+        self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer_thread.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS measurements (
+                        ts REAL NOT NULL,
+                        stream_id TEXT NOT NULL,
+                        bpm REAL, db REAL, hz REAL,
+                        confidence REAL
+                    )""")
+                # 旧版数据库没有置信度列
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(measurements)")]
+                if 'confidence' not in columns:
+                    conn.execute("ALTER TABLE measurements ADD COLUMN confidence REAL")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_measurements_stream_ts "
+                             "ON measurements (stream_id, ts)")
+                for name in ROLLUPS:
+                    columns = ", ".join(f"{m}_min REAL, {m}_max REAL, {m}_sum REAL" for m in METRICS)
+                    conn.execute(f"""
+                        CREATE TABLE IF NOT EXISTS rollup_{name} (
+                            stream_id TEXT NOT NULL,
+                            bucket INTEGER NOT NULL,
+                            count INTEGER NOT NULL,
+                            {columns},
+                            PRIMARY KEY (stream_id, bucket)
+                        )""")
+        finally:
+            conn.close()
+
+    def add(self, bpm, db, hz, stream_id='default', ts=None, confidence=None):
+        """添加一条测量值（仅入队，不触发磁盘写入）；confidence为BPM置信度，没有时为None"""
+        with self.condition:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+                metrics.inc('dropped_measurements')
+            self.pending.append((ts if ts is not None else time.time(), stream_id,
+                                 float(bpm), float(db), float(hz),
+                                 None if confidence is None else float(confidence)))
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify()
+
+    def flush(self):
+        """
+        立即把缓冲中的数据写入磁盘
+
+        查询前会调用本方法；写入失败时把数据放回缓冲交给写线程重试，不向调用方抛出，
+        查询照常进行（只是看不到尚未落盘的数据）
+
+        返回:
+            bool: 缓冲中的数据是否都已写入
+        """
+        with self.condition:
+            rows = list(self.pending)
+            self.pending.clear()
+        if not rows:
+            return True
+        try:
+            self._write_batch(rows)
+        except (sqlite3.Error, OSError) as e:
+            self._write_failed(rows, e)
+            return False
+        self.last_error = None
+        return True
+
+    def _writer_loop(self):
+        conn = None
+        retrying = False
+        try:
+            while True:
+                with self.condition:
+                    if self.running and (retrying or len(self.pending) < self.batch_size):
+                        self.condition.wait(self.flush_interval)
+                    rows = list(self.pending)
+                    self.pending.clear()
+                    running = self.running
+                if rows:
+                    try:
+                        if conn is None:
+                            conn = self._connect()
+                        self._write_batch(rows, conn)
+                    except (sqlite3.Error, OSError) as e:
+                        # 磁盘满、数据库被锁等：放回缓冲，间隔flush_interval重试，写线程不退出
+                        self._write_failed(rows, e)
+                        if conn is not None:
+                            conn.close()
+                            conn = None
+                        retrying = True
+                        if not running:
+                            break
+                        continue
+                    if retrying:
+                        retrying = False
+                        self.last_error = None
+                        print("Measurement store writes recovered", file=sys.stderr)
+                if not running:
+                    break
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _write_failed(self, rows, error):
+        self.write_errors += 1
+        metrics.inc('store_write_errors')
+        if self.last_error is None:
+            print(f"Warning: measurement store write failed, retrying: {error}", file=sys.stderr)
+        self.last_error = str(error)
+        with self.condition:
+            # 失败的批次排在新数据之前；超出上限时与add()一样丢弃最旧的
+            combined = rows + list(self.pending)
+            overflow = len(combined) - self.pending.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+                metrics.inc('dropped_measurements', overflow)
+                combined = combined[overflow:]
+            self.pending.clear()
+            self.pending.extend(combined)
+
+    def _write_batch(self, rows, conn=None):
+        """一个事务内写入原始数据并增量更新汇总表"""
+        own_conn = conn is None
+        if own_conn:
+            conn = self._connect()
+        try:
+            with metrics.stage('store_flush'), conn:
+                conn.executemany(
+                    "INSERT INTO measurements (ts, stream_id, bpm, db, hz, confidence) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows)
+                for name, seconds in ROLLUPS.items():
+                    conn.executemany(self._rollup_upsert_sql(name), self._aggregate(rows, seconds))
+        finally:
+            if own_conn:
+                conn.close()
+
+    @staticmethod
+    def _aggregate(rows, seconds):
+        """在内存中先把一批数据按(stream, bucket)聚合，每个桶只执行一次UPSERT"""
+        buckets = {}
+        for ts, stream_id, bpm, db, hz, _confidence in rows:
+            values = (bpm, db, hz)
+            key = (stream_id, int(ts // seconds) * seconds)
+            agg = buckets.get(key)
+            if agg is None:
+                buckets[key] = [1] + [v for value in values for v in (value, value, value)]
+                continue
+            agg[0] += 1
+            for i, value in enumerate(values):
+                base = 1 + i * 3
+                agg[base] = min(agg[base], value)
+                agg[base + 1] = max(agg[base + 1], value)
+                agg[base + 2] += value
+        return [key + tuple(agg) for key, agg in buckets.items()]
+
+    @staticmethod
+    def _rollup_upsert_sql(name):
+        columns = ", ".join(f"{m}_min, {m}_max, {m}_sum" for m in METRICS)
+        placeholders = ", ".join("?" * (3 + 3 * len(METRICS)))
+        updates = ", ".join(
+            f"{m}_min = MIN({m}_min, excluded.{m}_min), "
+            f"{m}_max = MAX({m}_max, excluded.{m}_max), "
+            f"{m}_sum = {m}_sum + excluded.{m}_sum"
+            for m in METRICS)
+        return (f"INSERT INTO rollup_{name} (stream_id, bucket, count, {columns}) "
+                f"VALUES ({placeholders}) "
+                f"ON CONFLICT (stream_id, bucket) DO UPDATE SET count = count + excluded.count, {updates}")
+
+    def query(self, start=None, end=None, stream_id='default', resolution='raw', limit=None):
+        """
+        查询任意时间范围的测量数据
+
+        参数:
+            start, end (float, optional): Unix时间戳范围，None表示不限
+            stream_id (str): 流ID
+            resolution (str): 'raw'、'minute' 或 'hour'
+            limit (int, optional): 最多返回的行数
+
+        返回:
+            dict: 列式数据 {'timestamps': [...], 'bpm': [...], ...}；
+                  汇总分辨率额外包含 *_min/*_max/count
+        """
+        if resolution != 'raw' and resolution not in ROLLUPS:
+            raise ValueError(f"Unknown resolution '{resolution}'")
+        self.flush()
+        if resolution == 'raw':
+            sql = "SELECT ts, bpm, db, hz FROM measurements WHERE stream_id = ?"
+            time_column = 'ts'
+        else:
+            averages = ", ".join(f"{m}_sum / count, {m}_min, {m}_max" for m in METRICS)
+            sql = f"SELECT bucket, count, {averages} FROM rollup_{resolution} WHERE stream_id = ?"
+            time_column = 'bucket'
+        params = [stream_id]
+        if start is not None:
+            sql += f" AND {time_column} >= ?"
+            params.append(start)
+        if end is not None:
+            sql += f" AND {time_column} <= ?"
+            params.append(end)
+        sql += f" ORDER BY {time_column}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        if resolution == 'raw':
+            result = {'timestamps': [], 'bpm': [], 'db': [], 'hz': []}
+            for ts, bpm, db, hz in rows:
+                result['timestamps'].append(ts)
+                result['bpm'].append(bpm)
+                result['db'].append(db)
+                result['hz'].append(hz)
+            return result
+
+        result = {'timestamps': [], 'count': []}
+        for m in METRICS:
+            result.update({m: [], f'{m}_min': [], f'{m}_max': []})
+        for bucket, count, *values in rows:
+            result['timestamps'].append(bucket)
+            result['count'].append(count)
+            for i, m in enumerate(METRICS):
+                result[m].append(values[i * 3])
+                result[f'{m}_min'].append(values[i * 3 + 1])
+                result[f'{m}_max'].append(values[i * 3 + 2])
+        return result
+
+    def _range_filter(self, stream_id, start, end):
+        sql = "stream_id = ?"
+        params = [stream_id]
+        if start is not None:
+            sql += " AND ts >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND ts <= ?"
+            params.append(end)
+        return sql, params
+
+    def count(self, start=None, end=None, stream_id='default'):
+        """时间范围内的原始测量条数"""
+        self.flush()
+        where, params = self._range_filter(stream_id, start, end)
+        conn = self._connect()
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM measurements WHERE {where}", params).fetchone()[0]
+        finally:
+            conn.close()
+
+    def iter_chunks(self, start=None, end=None, stream_id='default', chunk_rows=EXPORT_CHUNK_ROWS):
+        """
+        按时间顺序分块读取原始测量数据（用于导出整个会话）
+
+        每块是一次独立的短查询（按 (ts, rowid) 续读），不会长时间占用读事务，
+        内存只占用一块的数据
+
+        返回:
+            生成器: 每块为列式dict {'timestamps', 'bpm', 'db', 'hz', 'confidence'}（numpy数组，
+                    没有置信度的行为NaN）
+        """
+        self.flush()
+        where, params = self._range_filter(stream_id, start, end)
+        last_ts, last_rowid = float('-inf'), -1
+        conn = self._connect()
+        try:
+            while True:
+                rows = conn.execute(
+                    f"SELECT ts, bpm, db, hz, confidence, rowid FROM measurements "
+                    f"WHERE {where} AND ts >= ? AND (ts > ? OR rowid > ?) "
+                    f"ORDER BY ts, rowid LIMIT ?",
+                    params + [last_ts, last_ts, last_rowid, int(chunk_rows)]).fetchall()
+                if not rows:
+                    return
+                last_ts, last_rowid = rows[-1][0], rows[-1][5]
+                data = np.array([row[:5] for row in rows], dtype=np.float64)  # None转为NaN
+                yield {'timestamps': data[:, 0], 'bpm': data[:, 1], 'db': data[:, 2],
+                       'hz': data[:, 3], 'confidence': data[:, 4]}
+                if len(rows) < chunk_rows:
+                    return
+        finally:
+            conn.close()
+
+    def close(self):
+        """停止写线程并写入剩余数据"""
+        with self.condition:
+            if not self.running:
+                return
+            self.running = False
+            self.condition.notify()
+        self.writer_thread.join(timeout=10)
@@ -0,0 +1,183 @@
+import bisect
+import threading
+import time
+
+from config import METRICS_ENABLED
+
+# 阶段耗时直方图的桶边界（秒）
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = 'audio'
+
+
+class _NoopTimer:
+    """指标关闭时使用的空计时器，进入/退出不做任何事"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class _StageTimer:
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    """固定桶的耗时直方图"""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """按桶边界近似分位数"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for i, c in enumerate(self.counts):
+            cumulative += c
+            if cumulative >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key):
+    """((名, 值), ...) → {名="值",...}；标签值按Prometheus文本格式转义，可含中文等任意字符"""
+    if not key:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in key) + '}'
+
+
+class MetricsRegistry:
+    """
+    热路径计时与计数：命名阶段计时器（直方图）+ 计数器 + 仪表（可带标签，如每路流一个 stream 标签）
+
+    关闭时 stage() 返回共享的空计时器，inc()/observe() 直接返回，开销只有一次属性判断
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def stage(self, name):
+        """阶段计时上下文: with metrics.stage('fft'): ..."""
+        if not self.enabled:
+            return _NOOP_TIMER
+        return _StageTimer(self, name)
+
+    def observe(self, name, seconds):
+        """记录一次阶段耗时（秒）"""
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_many(self, timings):
+        """批量记录阶段耗时，如分析进程返回的 {'tempo': 0.12, ...}"""
+        for name, seconds in (timings or {}).items():
+            self.observe(name, seconds)
+
+    def inc(self, name, value=1):
+        """计数器累加（如丢弃帧数、错误数）"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value, labels=None):
+        """设置仪表当前值；labels如 {'stream': 'a'}，同名仪表按标签区分"""
+        with self.lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    def remove_gauge(self, name, labels=None):
+        """移除仪表（如流被删除后不再输出它的仪表）"""
+        with self.lock:
+            self.gauges.pop((name, _label_key(labels)), None)
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+    def render_prometheus(self):
+        """Prometheus文本格式输出"""
+        lines = []
+        with self.lock:
+            if self.stages:
+                lines.append(f"# HELP {PREFIX}_stage_seconds Time spent in each measurement stage")
+                lines.append(f"# TYPE {PREFIX}_stage_seconds histogram")
+                for name, h in sorted(self.stages.items()):
+                    cumulative = 0
+                    for bound, count in zip(list(h.buckets) + ['+Inf'], h.counts):
+                        cumulative += count
+                        lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{name}"}} {h.sum:.6f}')
+                    lines.append(f'{PREFIX}_stage_seconds_count{{stage="{name}"}} {h.count}')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+                lines.append(f"{PREFIX}_{name}_total {value}")
+            previous = None
+            for (name, key), value in sorted(self.gauges.items()):
+                if name != previous:
+                    lines.append(f"# TYPE {PREFIX}_{name} gauge")
+                    previous = name
+                lines.append(f"{PREFIX}_{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary_lines(self):
+        """简要文本摘要（用于GUI日志页）"""
+        lines = []
+        with self.lock:
+            for name, h in sorted(self.stages.items()):
+                mean = h.sum / h.count if h.count else 0.0
+                lines.append(f"{name:<12} n={h.count:<6} mean={mean * 1000:8.1f}ms "
+                             f"p95≤{h.quantile(0.95) * 1000:7.1f}ms max={h.max * 1000:8.1f}ms")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<12} {value}")
+            for (name, key), value in sorted(self.gauges.items()):
+                lines.append(f"{name + _format_labels(key):<12} {value}")
+        return lines
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+远程PCM接入
+网络设备（带I2S麦克风的ESP32、另一台电脑等）把16位PCM推送到服务器，
+经每个源独立的抖动缓冲后作为 InputSource 进入与本地麦克风相同的采集/分析流程
+
+两种传输方式:
+    UDP: 每个数据报 = 包头 + 源ID(UTF-8) + 16位小端交错PCM
+         包头 <2sBBI: 魔数b'PC'、版本1、源ID字节数、序号(uint32，回绕)
+         乱序在抖动缓冲内重排，重复和迟到的包丢弃，缺失的包以静音补齐
+    HTTP: POST /api/audio/ingest/<stream_id>，请求体（可用chunked编码持续发送）为PCM字节流，
+          TCP保证顺序，不需要序号
+
+用法（模拟设备，把WAV文件按实时速度经UDP发送）:
+    python pcm_ingest.py send room1 music.wav --host 127.0.0.1 --port 5005
+"""
+
+import socket
+import struct
+import threading
+import time
+
+from config import (PCM_INGEST_IDLE_TIMEOUT, PCM_INGEST_JITTER_MS, PCM_INGEST_MAX_BUFFER_MS,
+                    PCM_INGEST_UDP_PORT)
+from input_source import InputSource, DEFAULT_RATE, SAMPLE_WIDTH
+from metrics import metrics
+
+PACKET_MAGIC = b'PC'
+PACKET_VERSION = 1
+PACKET_HEADER = struct.Struct('<2sBBI')
+SEQ_MODULO = 1 << 32
+MAX_DATAGRAM = 65507
+RESYNC_PACKETS = 1000  # 序号跳变超过该值视为设备重启，从新序号重新开始而不是补静音/判为迟到
+
+
+def encode_packet(source_id, seq, pcm):
+    """构造一个UDP数据报（设备端协议参考实现）"""
+    name = source_id.encode('utf-8')
+    return PACKET_HEADER.pack(PACKET_MAGIC, PACKET_VERSION, len(name), seq % SEQ_MODULO) + name + pcm
+
+
+def decode_packet(packet):
+    """
+    解析UDP数据报
+
+    返回:
+        tuple: (源ID, 序号, PCM字节)；格式不对时返回None
+    """
+    if len(packet) < PACKET_HEADER.size:
+        return None
+    magic, version, name_length, seq = PACKET_HEADER.unpack_from(packet)
+    if magic != PACKET_MAGIC or version != PACKET_VERSION:
+        return None
+    start = PACKET_HEADER.size
+    if len(packet) < start + name_length:
+        return None
+    try:
+        source_id = packet[start:start + name_length].decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    return source_id, seq, packet[start + name_length:]
+
+
+def seq_distance(seq, expected):
+    """序号差（考虑uint32回绕），负数表示迟到"""
+    diff = (seq - expected) % SEQ_MODULO
+    return diff - SEQ_MODULO if diff >= SEQ_MODULO // 2 else diff
+
+
+class NetworkSource(InputSource):
+    """
+    网络推送的PCM输入源（带抖动缓冲）
+
+    put_packet()/put_bytes() 由接收线程调用；read() 由采集线程调用，数据不足时阻塞等待。
+    开始播放前先积累 jitter_ms 的数据；后续包在缓冲中等待缺失的序号，
+    读取方等待超过 jitter_ms 仍未补上时，缺失的包按上一个包的长度以静音补齐（计入lost）。
+    收到过数据后超过 idle_timeout 秒没有新数据（设备断开）时 read() 抛出EOFError，该路流随之停止；
+    设备尚未开始发送时一直等待
+    """
+
+    realtime = True
+
+    def __init__(self, source_id, rate=DEFAULT_RATE, channels=1, jitter_ms=PCM_INGEST_JITTER_MS,
+                 max_buffer_ms=PCM_INGEST_MAX_BUFFER_MS, idle_timeout=PCM_INGEST_IDLE_TIMEOUT):
+        super().__init__(rate, channels)
+        self.source_id = source_id
+        self.frame_bytes = SAMPLE_WIDTH * channels
+        self.target_bytes = self._ms_to_bytes(jitter_ms)
+        self.max_bytes = max(self._ms_to_bytes(max_buffer_ms), self.target_bytes * 2)
+        self.jitter_seconds = jitter_ms / 1000.0
+        self.idle_timeout = idle_timeout
+        self.condition = threading.Condition()
+        self.stats_counters = dict.fromkeys(
+            ('packets', 'bytes', 'duplicates', 'late', 'lost', 'resyncs', 'overflow_bytes', 'malformed'), 0)
+        self._reset()
+        self.opened = False
+
+    def _ms_to_bytes(self, ms):
+        return int(self.rate * ms / 1000) * self.frame_bytes
+
+    def _reset(self):
+        self.ready = bytearray()   # 已按顺序排好、可读取的数据
+        self.packets = {}          # 序号 → 等待前面缺失包的数据
+        self.pending_bytes = 0
+        self.next_seq = None
+        self.last_packet_bytes = 0
+        self.partial = b''         # put_bytes 中不足一帧的尾部
+        self.primed = False
+        self.interrupted = False
+        self.last_receive = None
+
+    def open(self):
+        with self.condition:
+            self._reset()
+            self.opened = True
+        return self
+
+    def close(self):
+        with self.condition:
+            self.opened = False
+            self._reset()
+            self.condition.notify_all()
+
+    def interrupt(self):
+        with self.condition:
+            self.interrupted = True
+            self.condition.notify_all()
+
+    # ---- 接收端 ----
+
+    def put_packet(self, seq, payload):
+        """写入一个带序号的数据包（UDP）"""
+        payload = payload[:len(payload) - len(payload) % self.frame_bytes]
+        with self.condition:
+            if not self.opened:
+                return
+            self.stats_counters['packets'] += 1
+            self.stats_counters['bytes'] += len(payload)
+            self.last_receive = time.monotonic()
+            if not payload:
+                self.stats_counters['malformed'] += 1
+                return
+            if self.next_seq is None:
+                self.next_seq = seq
+            distance = seq_distance(seq, self.next_seq)
+            if abs(distance) > RESYNC_PACKETS:
+                self.packets.clear()
+                self.pending_bytes = 0
+                self.next_seq = seq
+                distance = 0
+                self.stats_counters['resyncs'] += 1
+            if distance < 0:
+                self.stats_counters['late'] += 1
+                metrics.inc('ingest_late_packets')
+                return
+            if seq in self.packets:
+                self.stats_counters['duplicates'] += 1
+                return
+            self.packets[seq] = payload
+            self.pending_bytes += len(payload)
+            self.last_packet_bytes = len(payload)
+            self._drain_in_order()
+            if self.pending_bytes > self.max_bytes:
+                # 等待的缺口太久没补上（缓冲已满），直接跳过
+                self._skip_gap()
+            self._trim()
+            self.condition.notify_all()
+
+    def put_bytes(self, data, block=False):
+        """
+        写入有序字节流（HTTP/TCP），不足一帧的部分留到下次
+
+        参数:
+            block (bool): 缓冲已满时等待读取方消费，而不是丢弃最旧的数据；
+                          发送方快于实时（如上传录音）时由TCP流控把速度降下来
+
+        返回:
+            bool: False表示输入源未打开（流未启动或已停止），数据被丢弃
+        """
+        with self.condition:
+            while (block and self.opened and not self.interrupted and self.ready
+                   and len(self.ready) + len(data) > self.max_bytes):
+                self.condition.wait(0.25)
+            if not self.opened:
+                return False
+            data = self.partial + data
+            usable = len(data) - len(data) % self.frame_bytes
+            self.partial = data[usable:]
+            self.stats_counters['bytes'] += usable
+            self.last_receive = time.monotonic()
+            self.ready += data[:usable]
+            self._trim()
+            self.condition.notify_all()
+            return True
+
+    def _drain_in_order(self):
+        while self.next_seq in self.packets:
+            payload = self.packets.pop(self.next_seq)
+            self.pending_bytes -= len(payload)
+            self.ready += payload
+            self.next_seq = (self.next_seq + 1) % SEQ_MODULO
+
+    def _skip_gap(self):
+        """把当前缺失的包记为丢失并以静音补齐，然后继续按序取出后续包"""
+        while self.packets and self.next_seq not in self.packets:
+            self.ready += bytes(self.last_packet_bytes)
+            self.next_seq = (self.next_seq + 1) % SEQ_MODULO
+            self.stats_counters['lost'] += 1
+            metrics.inc('ingest_lost_packets')
+        self._drain_in_order()
+
+    def _trim(self):
+        """消费跟不上时丢弃最旧的数据，延迟不超过 max_buffer_ms"""
+        excess = len(self.ready) - self.max_bytes
+        if excess > 0:
+            excess += (-excess) % self.frame_bytes
+            del self.ready[:excess]
+            self.stats_counters['overflow_bytes'] += excess
+            metrics.inc('ingest_overflow_bytes', excess)
+
+    # ---- 采集线程 ----
+
+    def read(self, frames):
+        needed = frames * self.frame_bytes
+        waiting_since = time.monotonic()
+        with self.condition:
+            while True:
+                if self.interrupted or not self.opened:
+                    raise EOFError(f"ingest source {self.source_id} closed")
+                threshold = needed if self.primed else max(needed, self.target_bytes)
+                if len(self.ready) >= threshold:
+                    break
+                now = time.monotonic()
+                if self.packets and now - waiting_since >= self.jitter_seconds:
+                    # 读取方已等待一个抖动缓冲时长，缺失的包不再等待
+                    self._skip_gap()
+                    continue
+                if self.last_receive is not None and now - self.last_receive >= self.idle_timeout:
+                    raise EOFError(f"ingest source {self.source_id} idle for {self.idle_timeout}s")
+                self.condition.wait(min(self.jitter_seconds, 0.25))
+            self.primed = True
+            data = bytes(self.ready[:needed])
+            del self.ready[:needed]
+            self.condition.notify_all()  # 唤醒等待缓冲空间的 put_bytes(block=True)
+            return data
+
+    @property
+    def latency(self):
+        # 抖动缓冲中排在后面的数据（含等待缺失序号的包）都是在刚读出的样本之后到达的
+        with self.condition:
+            return (len(self.ready) + self.pending_bytes) / self.frame_bytes / self.rate
+
+    def stats(self):
+        with self.condition:
+            data = dict(self.stats_counters)
+            data.update({'source_id': self.source_id, 'rate': self.rate, 'channels': self.channels,
+                         'buffered_ms': round(len(self.ready) / self.frame_bytes / self.rate * 1000, 1),
+                         'receiving': self.last_receive is not None
+                                      and time.monotonic() - self.last_receive < self.idle_timeout})
+            return data
+
+
+class IngestHub:
+    """源ID → NetworkSource 的注册表；UDP服务器与HTTP接口按源ID分发数据"""
+
+    def __init__(self):
+        self.sources = {}
+        self.lock = threading.Lock()
+        self.unknown_packets = 0
+        self.udp_socket = None
+        self.udp_thread = None
+
+    def register(self, source_id, rate=DEFAULT_RATE, channels=1, **kwargs):
+        with self.lock:
+            if source_id in self.sources:
+                raise ValueError(f"Ingest source '{source_id}' already exists")
+            source = NetworkSource(source_id, rate, channels, **kwargs)
+            self.sources[source_id] = source
+            return source
+
+    def unregister(self, source_id):
+        with self.lock:
+            source = self.sources.pop(source_id, None)
+        if source is not None:
+            source.interrupt()
+        return source is not None
+
+    def get(self, source_id):
+        with self.lock:
+            return self.sources.get(source_id)
+
+    def handle_datagram(self, packet):
+        decoded = decode_packet(packet)
+        if decoded is None:
+            metrics.inc('ingest_malformed_packets')
+            return
+        source_id, seq, payload = decoded
+        source = self.get(source_id)
+        if source is None:
+            self.unknown_packets += 1
+            metrics.inc('ingest_unknown_packets')
+            return
+        source.put_packet(seq, payload)
+
+    def start_udp(self, host='0.0.0.0', port=PCM_INGEST_UDP_PORT):
+        """在后台线程中接收UDP数据报"""
+        if self.udp_thread is not None:
+            return self
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.udp_socket.bind((host, port))
+        self.udp_thread = threading.Thread(target=self._udp_loop, args=(self.udp_socket,), daemon=True)
+        self.udp_thread.start()
+        return self
+
+    def _udp_loop(self, sock):
+        while True:
+            try:
+                packet, _ = sock.recvfrom(MAX_DATAGRAM)
+            except OSError:
+                return  # stop_udp() 关闭了套接字
+            self.handle_datagram(packet)
+
+    def stop_udp(self):
+        if self.udp_socket is not None:
+            self.udp_socket.close()
+            self.udp_socket = None
+        if self.udp_thread is not None:
+            self.udp_thread.join(timeout=2)
+            self.udp_thread = None
+
+    def list_sources(self):
+        with self.lock:
+            sources = list(self.sources.values())
+        return [s.stats() for s in sources]
+
+
+ingest_hub = IngestHub()
+
+
+def send_wav(source_id, path, host='127.0.0.1', port=PCM_INGEST_UDP_PORT, packet_ms=20, loop=False):
+    """把WAV文件按实时速度经UDP发送（模拟远程设备）"""
+    from input_source import WavReplaySource
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    source = WavReplaySource(path, realtime=True, loop=loop)
+    frames = max(1, int(source.rate * packet_ms / 1000))
+    seq = 0
+    print(f"Sending {path} ({source.rate} Hz, {source.channels} ch) as '{source_id}' to {host}:{port}")
+    with source:
+        while True:
+            try:
+                pcm = source.read(frames)
+            except EOFError:
+                break
+            sock.sendto(encode_packet(source_id, seq, pcm), (host, port))
+            seq += 1
+    print(f"Sent {seq} packets")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='远程PCM接入（UDP发送端）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    send = subparsers.add_parser('send', help='把WAV文件按实时速度发送到接入服务器')
+    send.add_argument('source_id')
+    send.add_argument('wav')
+    send.add_argument('--host', default='127.0.0.1')
+    send.add_argument('--port', type=int, default=PCM_INGEST_UDP_PORT)
+    send.add_argument('--packet-ms', type=int, default=20)
+    send.add_argument('--loop', action='store_true')
+    args = parser.parse_args()
+    send_wav(args.source_id, args.wav, args.host, args.port, args.packet_ms, args.loop)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+推送服务器压力测试：单机模拟大量显示终端长连接
+
+每个模拟客户端连接后持续读取推送行，统计送达延迟（接收时刻 - 消息ts，同一台机器上时钟一致）、
+收到的消息数和连接错误；可设置一部分"慢客户端"验证背压处理不会拖慢其他客户端
+
+用法:
+    python push_client_sim.py --clients 5000 --spawn-server --rate 10 --duration 30   # 另起服务器进程
+    python push_client_sim.py --host 192.168.1.10 --port 8765 --clients 2000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from push_server import DEFAULT_PORT
+
+
+def raise_fd_limit(needed):
+    """每个连接占用一个文件描述符，尽量调高软限制（子进程继承）"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+    if soft < target:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def spawn_server(port, rate, timeout=10.0):
+    """在独立进程中启动推送服务器（与客户端不争用同一个GIL/事件循环），等待端口可连接"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'push_server.py')
+    process = subprocess.Popen([sys.executable, script, '--host', '127.0.0.1', '--port', str(port),
+                                '--simulate', str(rate)], stdout=subprocess.PIPE, text=True)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"Push server did not start on port {port}")
+
+
+def stop_server(process):
+    """发送Ctrl+C让服务器打印统计信息后退出"""
+    process.send_signal(signal.SIGINT)
+    try:
+        output, _ = process.communicate(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        output, _ = process.communicate()
+    return output.strip().splitlines()[-1] if output.strip() else ''
+
+
+class ClientStats:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.disconnected = 0
+        self.messages = 0
+        self.latencies = []
+
+
+async def run_client(host, port, stats, stop, slow=False):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats.failed += 1
+        return
+    stats.connected += 1
+    try:
+        while not stop.is_set():
+            if slow:
+                # 慢客户端：很少读取，服务器端的队列与写缓冲会填满
+                await asyncio.sleep(1.0)
+            line = await reader.readline()
+            if not line:
+                stats.disconnected += 1
+                return
+            message = json.loads(line)
+            if message.get('type') == 'measurement':
+                stats.messages += 1
+                if not slow:
+                    stats.latencies.append(time.time() - message['ts'])
+    except (ConnectionError, OSError):
+        stats.disconnected += 1
+    finally:
+        writer.close()
+
+
+async def run_load_test(host, port, clients, duration, ramp_per_second=2000, slow_fraction=0.0):
+    stats = ClientStats()
+    stop = asyncio.Event()
+    tasks = []
+    slow_every = int(1 / slow_fraction) if slow_fraction > 0 else 0
+    start = time.perf_counter()
+    for i in range(clients):
+        slow = slow_every > 0 and i % slow_every == 0
+        tasks.append(asyncio.ensure_future(run_client(host, port, stats, stop, slow)))
+        if (i + 1) % 100 == 0:
+            # 分批建立连接，避免瞬间打满监听队列
+            await asyncio.sleep(100 / ramp_per_second)
+    connect_seconds = time.perf_counter() - start
+    # 只统计全部连接建立之后的测量期
+    stats.messages = 0
+    stats.latencies = []
+    await asyncio.sleep(duration)
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies = np.asarray(stats.latencies) * 1000
+    report = {
+        'clients': clients,
+        'connected': stats.connected,
+        'failed': stats.failed,
+        'disconnected': stats.disconnected,
+        'connect_seconds': round(connect_seconds, 2),
+        'messages': stats.messages,
+        'messages_per_second': round(stats.messages / duration, 1),
+        'client_cpu_seconds': round(time.process_time(), 2),
+    }
+    if len(latencies):
+        report.update({f'latency_p{p}_ms': round(float(np.percentile(latencies, p)), 2) for p in (50, 95, 99)})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='推送服务器压力测试')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=10.0, help='全部连接建立后持续测量的秒数')
+    parser.add_argument('--slow-fraction', type=float, default=0.0, help='慢客户端比例（0~1）')
+    parser.add_argument('--spawn-server', action='store_true', help='另起一个服务器进程并推送模拟数据')
+    parser.add_argument('--rate', type=float, default=10.0, help='--spawn-server时每秒推送的消息数')
+    args = parser.parse_args()
+
+    limit = raise_fd_limit(args.clients * (2 if args.spawn_server else 1) + 256)
+    if limit is not None and limit < args.clients:
+        print(f"Warning: open file limit {limit} is lower than --clients {args.clients}")
+
+    server = spawn_server(args.port, args.rate) if args.spawn_server else None
+    try:
+        report = asyncio.run(run_load_test(args.host, args.port, args.clients, args.duration,
+                                           slow_fraction=args.slow_fraction))
+    finally:
+        if server is not None:
+            server_stats = stop_server(server)
+    if server is not None:
+        report['server'] = server_stats
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
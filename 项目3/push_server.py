@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+显示终端推送服务器（asyncio，仅标准库）
+客户端（ESP32灯光、显示屏等）建立一条TCP长连接，服务器把每一条新测量值以一行JSON推送给所有客户端，
+替代每个终端反复发起HTTP轮询
+
+协议:
+    服务器 → 客户端，每行一个JSON（UTF-8，'\\n'结尾）:
+        {"type": "hello", "server_time": ...}
+        {"type": "measurement", "stream_id": "default", "bpm": 128, "db": 25, "hz": 2500, "ts": 1715000000.123}
+            多路流的测量还带 "no_signal": true/false（无信号时 bpm/hz 为0，只有 db 有效）
+        {"type": "ping", "ts": ...}      空闲时的心跳
+    客户端无需发送任何数据
+
+背压: 每个客户端一个有界队列，消费跟不上时丢弃最旧的消息（只保留最新状态）；
+      写入长时间阻塞（对端不读）的客户端会被断开，不会拖慢其他客户端
+
+用法:
+    python push_server.py --port 8765 --simulate 10     # 独立运行，每秒推送10条模拟数据
+"""
+
+import asyncio
+import collections
+import json
+import threading
+import time
+
+from metrics import metrics
+
+DEFAULT_HOST = '0.0.0.0'
+DEFAULT_PORT = 8765
+CLIENT_QUEUE_SIZE = 16     # 每个客户端最多积压的消息数，超出时丢弃最旧的
+WRITE_TIMEOUT = 5.0        # 秒；单次写入排空超过该时间视为客户端失联
+HEARTBEAT_INTERVAL = 15.0  # 秒；没有新数据时发送心跳，及时发现断开的连接
+WRITE_BUFFER_LIMIT = 64 * 1024  # 字节；传输层写缓冲超过该值时新消息进入队列（与asyncio默认高水位一致）
+
+
+class _Client:
+    """
+    一个已连接的客户端
+
+    正常情况下消息直接写入传输层（不唤醒任何协程）；写缓冲积压超过上限时改为进入有界队列，
+    由该客户端的写协程等待排空后再写出
+    """
+
+    def __init__(self, writer, queue_size):
+        self.writer = writer
+        self.messages = collections.deque(maxlen=queue_size)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.sent = 0
+        self.closed = False
+
+    def offer(self, line):
+        if self.closed:
+            return
+        if not self.messages and self.writer.transport.get_write_buffer_size() < WRITE_BUFFER_LIMIT:
+            self.writer.write(line)
+            self.sent += 1
+            return
+        if len(self.messages) == self.messages.maxlen:
+            self.dropped += 1
+            metrics.inc('push_dropped_messages')
+        self.messages.append(line)
+        self.ready.set()
+
+
+class PushServer:
+    """
+    NDJSON推送服务器
+
+    publish() 可以在任意线程调用；事件循环运行在 start() 创建的后台线程中（或由调用方通过 serve() 运行）
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, queue_size=CLIENT_QUEUE_SIZE,
+                 write_timeout=WRITE_TIMEOUT, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.write_timeout = write_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.clients = set()
+        self.handlers = set()  # 各客户端的处理协程
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.started = threading.Event()
+        self.published = 0
+        self.disconnected_slow = 0
+        self.last_publish = time.monotonic()
+
+    # ---- 事件循环内 ----
+
+    async def serve(self):
+        """在当前事件循环中运行直到被取消"""
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port,
+                                                 backlog=4096, reuse_address=True)
+        self.port = self.server.sockets[0].getsockname()[1]  # port=0时取实际端口
+        self.started.set()
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass  # stop() 关闭了监听
+        finally:
+            heartbeat.cancel()
+            for client in list(self.clients):
+                client.closed = True
+                client.ready.set()
+            if self.handlers:
+                await asyncio.wait(list(self.handlers), timeout=self.write_timeout)
+
+    async def _handle_client(self, reader, writer):
+        client = _Client(writer, self.queue_size)
+        client.offer(self._encode({'type': 'hello', 'server_time': time.time()}))
+        self.clients.add(client)
+        self.handlers.add(asyncio.current_task())
+        metrics.set_gauge('push_clients', len(self.clients))
+        watcher = asyncio.ensure_future(self._watch_reader(reader, client))
+        try:
+            while True:
+                await client.ready.wait()
+                client.ready.clear()
+                if client.closed:
+                    break
+                try:
+                    await asyncio.wait_for(writer.drain(), self.write_timeout)
+                except asyncio.TimeoutError:
+                    self.disconnected_slow += 1
+                    metrics.inc('push_slow_disconnects')
+                    break
+                if client.messages:
+                    # 一次取走积压的全部消息，合并为一次写入
+                    lines = list(client.messages)
+                    client.messages.clear()
+                    writer.write(b''.join(lines))
+                    client.sent += len(lines)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            watcher.cancel()
+            client.closed = True
+            self.clients.discard(client)
+            self.handlers.discard(asyncio.current_task())
+            metrics.set_gauge('push_clients', len(self.clients))
+            writer.close()
+
+    @staticmethod
+    async def _watch_reader(reader, client):
+        """丢弃客户端发来的数据直到连接关闭，然后唤醒写协程退出"""
+        try:
+            while await reader.read(1024):
+                pass
+        except (ConnectionError, OSError):
+            pass
+        client.closed = True
+        client.ready.set()
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if time.monotonic() - self.last_publish >= self.heartbeat_interval:
+                self._broadcast(self._encode({'type': 'ping', 'ts': time.time()}))
+
+    def _broadcast(self, line):
+        for client in self.clients:
+            client.offer(line)
+
+    @staticmethod
+    def _encode(message):
+        return (json.dumps(message, separators=(',', ':')) + '\n').encode('utf-8')
+
+    # ---- 任意线程 ----
+
+    def publish(self, message):
+        """推送一条消息给所有客户端（线程安全，不阻塞调用方）；消息只编码一次"""
+        if self.loop is None or self.loop.is_closed():
+            return
+        line = self._encode(message)
+        self.published += 1
+        self.last_publish = time.monotonic()
+        self.loop.call_soon_threadsafe(self._broadcast, line)
+
+    def publish_measurement(self, bpm, db, hz, stream_id='default', ts=None, **extra):
+        message = {'type': 'measurement', 'stream_id': stream_id, 'bpm': bpm, 'db': db, 'hz': hz,
+                   'ts': ts if ts is not None else time.time()}
+        message.update(extra)
+        self.publish(message)
+
+    def start(self, timeout=5.0):
+        """在后台线程中启动事件循环，返回时已开始监听"""
+        if self.thread is not None:
+            return self
+        self.thread = threading.Thread(target=asyncio.run, args=(self.serve(),), daemon=True)
+        self.thread.start()
+        if not self.started.wait(timeout):
+            raise RuntimeError(f"Push server failed to start on {self.host}:{self.port}")
+        return self
+
+    def stop(self):
+        if self.loop is not None and self.server is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def stats(self):
+        return {'clients': len(self.clients), 'published': self.published,
+                'dropped': sum(c.dropped for c in list(self.clients)),
+                'slow_disconnects': self.disconnected_slow,
+                'cpu_seconds': round(time.process_time(), 2)}
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+
+    parser = argparse.ArgumentParser(description='测量值TCP推送服务器')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--simulate', type=float, default=1.0, help='每秒推送的模拟测量条数')
+    args = parser.parse_args()
+
+    push_server = PushServer(args.host, args.port).start()
+    print(f"Push server listening on {args.host}:{push_server.port}")
+    try:
+        bpm, db, hz = 128, 25, 2500
+        while True:
+            time.sleep(1.0 / args.simulate)
+            bpm = max(60, min(200, bpm + random.randint(-2, 2)))
+            db = max(10, min(50, db + random.randint(-1, 1)))
+            hz = max(100, min(8000, hz + random.randint(-50, 50)))
+            push_server.publish_measurement(bpm, db, hz)
+    except KeyboardInterrupt:
+        print(push_server.stats(), flush=True)
+        push_server.stop()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件回放：把录音送入与实时麦克风完全相同的采集/分析流水线（StreamManager）
+无需音频设备，可在无界面的服务器上运行；默认尽可能快地回放
+
+用法:
+    python replay.py data/recording.wav
+    python replay.py data/recording.wav --realtime --split-time 1
+    python replay.py data/recording.wav --output data/replay.csv --store
+    python replay.py data/long_recording.wav --batch        # 仅dB/主频，向量化批量分析
+"""
+
+import argparse
+import csv
+import sys
+import time
+
+from audio_analysis import analyze_batch, pcm16_to_float
+from input_source import create_source
+from stream_manager import StreamManager
+
+BATCH_WINDOWS = 256  # 批量模式每次从文件读取的窗口数
+
+
+def replay_file(path, split_time=2.0, realtime=False, max_workers=None, store=None, on_result=None):
+    """
+    回放一个WAV/NPY文件并返回全部窗口的测量结果
+
+    参数:
+        path (str): 音频文件路径
+        split_time (float): 分析窗口长度（秒）
+        realtime (bool): 是否按墙钟节奏回放
+        store (MeasurementStore, optional): 同时写入持久化存储
+        on_result (callable, optional): 每个窗口完成时调用 on_result(row)
+
+    返回:
+        list: [{'time': 媒体时间(s), 'bpm':..., 'db':..., 'hz':...}, ...]
+    """
+    manager = StreamManager(max_workers=max_workers)
+    manager.measurement_store = store
+    rows = []
+
+    def collect(audio_stream, result):
+        # 实时回放时分析跟不上的窗口会被丢弃，时间取窗口在文件中的实际位置而不是序号
+        row = {'time': round(result['media_time'], 3),
+               'bpm': result['bpm'], 'db': result['db'], 'hz': result['hz']}
+        rows.append(row)
+        if on_result is not None:
+            on_result(row)
+
+    manager.result_listeners.append(collect)
+    source = create_source(path, realtime=realtime)
+    manager.add_stream('replay', source=source, split_time=split_time)
+    try:
+        manager.start_stream('replay')
+        manager.wait_stream('replay')
+        error = manager.get_stream('replay').error
+        if error:
+            raise RuntimeError(error)
+    finally:
+        manager.shutdown()
+    rows.sort(key=lambda row: row['time'])
+    return rows
+
+
+def batch_report(path, split_time=2.0):
+    """
+    向量化批量分析：按块读取文件，每块内所有窗口一次二维rfft算出dB与主频（不估算BPM），
+    数值与实时流水线逐窗口计算的结果相同
+
+    返回:
+        list: [{'time': 媒体时间(s), 'db':..., 'hz':...}, ...]
+    """
+    rows = []
+    with create_source(path) as source:
+        window = int(source.rate * split_time)
+        while True:
+            pcm = source.read_chunks(BATCH_WINDOWS, window)
+            if not pcm:
+                break
+            audio = pcm16_to_float(pcm)
+            if source.channels > 1:
+                audio = audio.reshape(-1, source.channels)[:, 0]
+            result = analyze_batch(audio, source.rate, split_time)
+            offset = len(rows) * split_time
+            rows.extend({'time': round(offset + t, 3), 'db': db, 'hz': hz}
+                        for t, db, hz in zip(result['times'], result['db'], result['hz']))
+            if len(result['times']) < BATCH_WINDOWS:
+                break
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回放音频文件，驱动实时分析流水线')
+    parser.add_argument('path', help='WAV（16位PCM）或NPY文件')
+    parser.add_argument('--split-time', type=float, default=2.0, help='分析窗口长度（秒）')
+    parser.add_argument('--realtime', action='store_true', help='按真实时间节奏回放')
+    parser.add_argument('--workers', type=int, help='分析进程数（默认CPU核数）')
+    parser.add_argument('--output', help='结果CSV路径（默认输出到终端）')
+    parser.add_argument('--store', action='store_true', help='同时写入测量数据库')
+    parser.add_argument('--batch', action='store_true', help='只计算dB/主频的向量化批量模式（不估算BPM）')
+    args = parser.parse_args()
+
+    if args.batch:
+        start = time.perf_counter()
+        rows = batch_report(args.path, args.split_time)
+        elapsed = time.perf_counter() - start
+        _write_csv(args.output, ['time', 'db', 'hz'], rows)
+        _print_summary(rows, args.split_time, elapsed)
+        return
+
+    store = None
+    if args.store:
+        from measurement_store import MeasurementStore
+        store = MeasurementStore()
+
+    start = time.perf_counter()
+    rows = replay_file(args.path, args.split_time, args.realtime, args.workers, store)
+    elapsed = time.perf_counter() - start
+    if store is not None:
+        store.close()
+
+    _write_csv(args.output, ['time', 'bpm', 'db', 'hz'], rows)
+    _print_summary(rows, args.split_time, elapsed)
+
+
+def _write_csv(output, columns, rows):
+    out = open(output, 'w', newline='', encoding='utf-8-sig') if output else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([row['time']] + [round(float(row[c]), 2) for c in columns[1:]])
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def _print_summary(rows, split_time, elapsed):
+    audio_seconds = rows[-1]['time'] + split_time if rows else 0.0
+    print(f"* {len(rows)} windows, {audio_seconds:.0f}s of audio in {elapsed:.1f}s "
+          f"({audio_seconds / max(elapsed, 1e-9):.0f}x realtime)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import math
+
+import numpy as np
+
+FILTER_ZEROS = 16   # 低通滤波器单侧的过零点数（决定每相抽头数与阻带衰减）
+KAISER_BETA = 8.6   # Kaiser窗参数，约80dB阻带衰减
+ROLLOFF = 0.95      # 截止频率相对于较低奈奎斯特频率的比例
+
+
+def pcm_to_float(pcm, sample_width=2, channels=1):
+    """
+    PCM字节流转为[-1, 1]浮点数组，形状为(帧数,)或(帧数, 声道)
+
+    支持8位（无符号）、16位、24位、32位整型PCM
+    """
+    if sample_width == 1:
+        audio = (np.frombuffer(pcm, dtype=np.uint8).astype(np.float32) - 128) / 128.0
+    elif sample_width == 2:
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        raw = np.frombuffer(pcm, dtype=np.uint8).reshape(-1, 3)
+        values = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                  | (raw[:, 2].astype(np.int32) << 16))
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        audio = values.astype(np.float32) / 8388608.0
+    elif sample_width == 4:
+        audio = (np.frombuffer(pcm, dtype=np.int32).astype(np.float64) / 2147483648.0).astype(np.float32)
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    if channels > 1:
+        audio = audio[:len(audio) // channels * channels].reshape(-1, channels)
+    return audio
+
+
+def float_to_pcm16(audio):
+    """浮点数组转16位PCM字节流（超出[-1, 1]的部分截断）"""
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+
+def mix_channels(audio, channels=1):
+    """声道转换：多声道转单声道取平均，单声道转多声道复制"""
+    in_channels = 1 if audio.ndim == 1 else audio.shape[1]
+    if in_channels == channels:
+        return audio
+    mono = audio if audio.ndim == 1 else audio.mean(axis=1)
+    if channels == 1:
+        return mono
+    return np.repeat(mono[:, None], channels, axis=1)
+
+
+class StreamResampler:
+    """
+    有状态的流式多相重采样器（有理数比例 out_rate/in_rate）
+
+    每次 process() 传入任意长度的数据块，输出对应的重采样数据；块与块之间保留滤波器历史，
+    因此分块处理的结果与整段一次处理相同。滤波器群延迟已补偿，输出与输入对齐。
+    结束时调用 flush() 取出滤波器中剩余的尾部样本
+    """
+
+    def __init__(self, in_rate, out_rate, zeros=FILTER_ZEROS, beta=KAISER_BETA, rolloff=ROLLOFF):
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        g = math.gcd(self.in_rate, self.out_rate)
+        self.up = self.out_rate // g
+        self.down = self.in_rate // g
+        self.passthrough = self.up == self.down
+
+        # Kaiser窗sinc低通，设计在上采样后的采样率上，按相拆分为 (up, taps) 的多相矩阵
+        factor = max(self.up, self.down)
+        half = zeros * factor
+        n = np.arange(-half, half + 1)
+        cutoff = rolloff / factor
+        h = cutoff * np.sinc(cutoff * n) * np.kaiser(len(n), beta) * self.up
+        self.taps = -(-len(h) // self.up)
+        h = np.concatenate([h, np.zeros(self.taps * self.up - len(h))])
+        # 每行按输入时间正序排列，便于与滑动窗口直接点乘
+        self.phases = h.reshape(self.taps, self.up).T[:, ::-1].copy()
+        self.delay = half  # 上采样域中的群延迟
+
+        self.reset()
+
+    def reset(self):
+        """清空滤波器状态（开始新的一段音频时调用）"""
+        self.history = None
+        self.consumed = 0                 # 已输入的样本数
+        self.next_output = 0              # 下一个输出样本的序号（含被丢弃的延迟部分）
+        self.skip = self.delay // self.down
+        self.pending_flush = False
+
+    def _prepare(self, audio):
+        audio = np.asarray(audio, dtype=np.float64)
+        if self.history is None:
+            shape = (self.taps - 1,) + audio.shape[1:]
+            self.history = np.zeros(shape)
+        return audio
+
+    def process(self, audio):
+        """
+        重采样一块数据
+
+        参数:
+            audio (np.ndarray): 形状(帧数,)或(帧数, 声道)的浮点数据
+
+        返回:
+            np.ndarray: 重采样后的数据，形状与输入一致（帧数按比例变化）
+        """
+        if self.passthrough:
+            return np.asarray(audio, dtype=np.float32)
+        audio = self._prepare(audio)
+        buffer = np.concatenate([self.history, audio])
+        self.consumed += len(audio)
+
+        # 上采样域中 t = m*down 对应的最新输入样本为 t // up，需要已经到达
+        last = self.consumed * self.up - 1
+        end = last // self.down + 1
+        outputs = np.arange(self.next_output, end)
+        self.next_output = end
+        positions = outputs * self.down
+        base = self.consumed - len(buffer)  # buffer[0] 的全局输入序号
+        newest = positions // self.up - base
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, self.taps, axis=0)
+        rows = windows[newest - (self.taps - 1)]
+        coeffs = self.phases[positions % self.up]
+        if rows.ndim == 3:
+            result = np.einsum('mck,mk->mc', rows, coeffs)
+        else:
+            result = np.einsum('mk,mk->m', rows, coeffs)
+
+        self.history = buffer[len(buffer) - (self.taps - 1):]
+        if self.skip:
+            dropped = min(self.skip, len(result))
+            result = result[dropped:]
+            self.skip -= dropped
+        return result.astype(np.float32)
+
+    def flush(self):
+        """输入结束时补零，取出与剩余输入对应的输出样本"""
+        if self.passthrough or self.history is None:
+            return np.zeros(0, dtype=np.float32)
+        expected = -(-self.consumed * self.up // self.down)
+        produced = self.next_output - self.delay // self.down
+        tail = self.process(np.zeros((self.taps,) + self.history.shape[1:]))
+        return tail[:max(0, expected - produced)]
+
+
+class FormatConverter:
+    """
+    PCM格式转换：采样位宽、声道数、采样率（流式，保留块间状态）
+
+    例: FormatConverter(44100, 2, 4) 把44.1kHz立体声32位数据转换为16kHz单声道16位
+    """
+
+    def __init__(self, in_rate, in_channels=1, in_width=2, out_rate=16000, out_channels=1, out_width=2):
+        if out_width != 2:
+            raise ValueError("Only 16-bit output is supported")
+        self.in_rate = in_rate
+        self.in_channels = in_channels
+        self.in_width = in_width
+        self.out_rate = out_rate
+        self.out_channels = out_channels
+        self.out_width = out_width
+        self.resampler = StreamResampler(in_rate, out_rate)
+        self.remainder = b''  # 不足一帧的尾部字节，留到下一块
+
+    @property
+    def identity(self):
+        return (self.in_rate == self.out_rate and self.in_channels == self.out_channels
+                and self.in_width == self.out_width)
+
+    def process_float(self, pcm):
+        """转换一块PCM字节，返回浮点数组"""
+        frame_bytes = self.in_width * self.in_channels
+        pcm = self.remainder + pcm
+        usable = len(pcm) // frame_bytes * frame_bytes
+        self.remainder = pcm[usable:]
+        audio = pcm_to_float(pcm[:usable], self.in_width, self.in_channels)
+        audio = mix_channels(audio, self.out_channels)
+        return self.resampler.process(audio)
+
+    def process(self, pcm):
+        """转换一块PCM字节，返回16位PCM字节"""
+        if self.identity:
+            return pcm
+        return float_to_pcm16(self.process_float(pcm))
+
+    def flush(self):
+        """输入结束时取出重采样器中剩余的数据（16位PCM字节）"""
+        if self.identity:
+            return b''
+        return float_to_pcm16(self.resampler.flush())
+
+
+def convert_file_rate(pcm, in_rate, in_channels, in_width, out_rate=16000, out_channels=1,
+                      chunk_frames=65536):
+    """按块把整段PCM转换为目标格式（16位），内存只占用一个块的中间结果"""
+    converter = FormatConverter(in_rate, in_channels, in_width, out_rate, out_channels)
+    step = chunk_frames * in_channels * in_width
+    parts = [converter.process(pcm[i:i + step]) for i in range(0, len(pcm), step)]
+    parts.append(converter.flush())
+    return b''.join(parts)
@@ -0,0 +1,352 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from input_source import ReplaySource, SAMPLE_WIDTH
+
+DATA_FILE = 'session.dat'
+AUDIO_INDEX_FILE = 'audio.idx'
+MEASUREMENT_INDEX_FILE = 'measurements.idx'
+META_FILE = 'meta.json'
+
+KIND_AUDIO = 1
+KIND_MEASUREMENT = 2
+
+# 数据文件中每个块的头：类型、负载长度、媒体时间（秒）；块自描述，索引丢失时可扫描重建
+CHUNK_HEADER = struct.Struct('<IId')
+# 测量记录负载：墙钟时间戳、bpm、db、hz
+MEASUREMENT_RECORD = struct.Struct('<dddd')
+# 索引项：媒体时间、负载在数据文件中的偏移、负载长度；按时间非递减追加，可直接二分
+INDEX_ENTRY = struct.Struct('<dQQ')
+INDEX_DTYPE = np.dtype([('time', '<f8'), ('offset', '<u8'), ('length', '<u8')])
+FLUSH_EVERY_MEASUREMENTS = 10  # 每追加这么多条测量记录（即分析窗口）把数据和索引落盘一次
+FLUSH_INTERVAL_SECONDS = 30.0  # 距上次落盘超过这么久也落盘（无信号/降档跳过的窗口只追加音频、没有测量记录）
+FLUSH_EVERY_BYTES = 8 * 1024 * 1024  # 未落盘的数据超过这么多字节也落盘，限制崩溃时丢失的数据和内存中的待写索引
+
+
+class SessionArchiveWriter:
+    """
+    会话归档写入：原始PCM块与每个窗口的测量记录交替追加到同一个数据文件，
+    另外为两类数据各维护一个定长索引文件（时间 → 偏移），用于按时间范围二分查找
+
+    目录结构:
+        meta.json         采样率、声道、创建时间
+        session.dat       [块头 + 负载] 依次追加
+        audio.idx         音频块索引
+        measurements.idx  测量记录索引
+
+    索引项先缓存在内存中，flush() 时数据文件落盘后才写入索引文件，
+    读取方（包括崩溃后）看到的每个索引项都指向已写入的数据。
+    追加测量记录或音频时，按测量条数、距上次落盘的时间或未落盘字节数任一达到阈值即落盘
+    """
+
+    def __init__(self, path, rate, channels=1, sample_width=SAMPLE_WIDTH,
+                 flush_every=FLUSH_EVERY_MEASUREMENTS, flush_interval=FLUSH_INTERVAL_SECONDS,
+                 flush_bytes=FLUSH_EVERY_BYTES):
+        self.path = path
+        self.rate = rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_bytes = channels * sample_width
+        self.lock = threading.Lock()
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.pending_index = []  # (索引文件, 索引项)，等数据落盘后写入
+        self.unflushed_measurements = 0
+        self.unflushed_bytes = 0
+        self.last_flush = time.monotonic()
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if (meta['rate'], meta['channels'], meta['sample_width']) != (rate, channels, sample_width):
+                raise ValueError(f"Archive format mismatch: {path}")
+        else:
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({'rate': rate, 'channels': channels, 'sample_width': sample_width,
+                           'created': datetime.now().isoformat()}, f, indent=2)
+
+        self.data = open(os.path.join(path, DATA_FILE), 'ab')
+        self.audio_index = open(os.path.join(path, AUDIO_INDEX_FILE), 'ab')
+        self.measurement_index = open(os.path.join(path, MEASUREMENT_INDEX_FILE), 'ab')
+        # 续写已有会话时从已归档的音频末尾继续计时
+        self.frames_written = 0
+        self.last_measurement_time = float('-inf')
+        reader = SessionArchive(path)
+        try:
+            self.frames_written = reader.total_frames()
+            if reader.measurement_count():
+                self.last_measurement_time = reader.measurement_times()[-1]
+        finally:
+            reader.close()
+
+    def _append(self, kind, media_time, payload, index_file):
+        offset = self.data.tell() + CHUNK_HEADER.size
+        self.data.write(CHUNK_HEADER.pack(kind, len(payload), media_time))
+        self.data.write(payload)
+        self.pending_index.append((index_file, INDEX_ENTRY.pack(media_time, offset, len(payload))))
+        self.unflushed_bytes += CHUNK_HEADER.size + len(payload)
+
+    def _maybe_flush(self):
+        """调用方持有self.lock"""
+        if ((self.flush_every and self.unflushed_measurements >= self.flush_every)
+                or (self.flush_bytes and self.unflushed_bytes >= self.flush_bytes)
+                or (self.flush_interval is not None
+                    and time.monotonic() - self.last_flush >= self.flush_interval)):
+            self._flush()
+
+    def append_audio(self, pcm):
+        """
+        追加一块PCM数据，媒体时间由已写入的帧数推算
+
+        返回:
+            float: 该块起始的媒体时间（秒）
+        """
+        usable = len(pcm) // self.frame_bytes * self.frame_bytes
+        if not usable:
+            return self.frames_written / self.rate
+        with self.lock:
+            media_time = self.frames_written / self.rate
+            self._append(KIND_AUDIO, media_time, pcm[:usable], self.audio_index)
+            self.frames_written += usable // self.frame_bytes
+            self._maybe_flush()
+            return media_time
+
+    def append_measurement(self, bpm, db, hz, media_time=None, ts=None):
+        """追加一条测量记录；media_time默认取当前已归档音频的末尾，必须非递减"""
+        with self.lock:
+            if media_time is None:
+                media_time = self.frames_written / self.rate
+            if media_time < self.last_measurement_time:
+                raise ValueError("Measurement times must be non-decreasing")
+            self.last_measurement_time = media_time
+            payload = MEASUREMENT_RECORD.pack(ts if ts is not None else time.time(),
+                                              float(bpm), float(db), float(hz))
+            self._append(KIND_MEASUREMENT, media_time, payload, self.measurement_index)
+            self.unflushed_measurements += 1
+            self._maybe_flush()
+
+    def flush(self):
+        """数据先于索引落盘：索引中出现的项一定能在数据文件中读到"""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        self.data.flush()
+        os.fsync(self.data.fileno())
+        for index_file, entry in self.pending_index:
+            index_file.write(entry)
+        self.pending_index.clear()
+        self.audio_index.flush()
+        self.measurement_index.flush()
+        self.unflushed_measurements = 0
+        self.unflushed_bytes = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.data.close()
+            self.audio_index.close()
+            self.measurement_index.close()
+
+
+class SessionArchive:
+    """
+    会话归档读取：数据文件与索引均通过mmap访问，
+    按时间范围查询只需在索引上二分（O(log n)），再直接读取对应的块，不扫描整个文件
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.rate = self.meta['rate']
+        self.channels = self.meta['channels']
+        self.sample_width = self.meta['sample_width']
+        self.frame_bytes = self.channels * self.sample_width
+        self._maps = {}
+        self.refresh()
+
+    def _map(self, name):
+        """只读映射一个文件；文件为空时返回空bytes（mmap不支持长度为0）"""
+        # 旧映射可能仍被调用方持有的数组引用，不主动关闭，由引用计数回收
+        self._maps.pop(name, None)
+        file_path = os.path.join(self.path, name)
+        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+            return b''
+        with open(file_path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[name] = mapped
+        return mapped
+
+    def _index(self, name):
+        mapped = self._map(name)
+        # 只取完整的索引项（写入方可能正在追加）
+        count = len(mapped) // INDEX_ENTRY.size
+        return np.frombuffer(mapped, dtype=INDEX_DTYPE, count=count)
+
+    def refresh(self):
+        """重新映射文件，读取正在录制的会话新追加的数据"""
+        self.audio_index = self._index(AUDIO_INDEX_FILE)
+        self.measurement_index = self._index(MEASUREMENT_INDEX_FILE)
+        self.data = self._map(DATA_FILE)
+
+    def close(self):
+        self.audio_index = self.measurement_index = None
+        self.data = b''
+        for mapped in self._maps.values():
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # 仍有数组引用该映射，随引用释放
+        self._maps.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def total_frames(self):
+        if not len(self.audio_index):
+            return 0
+        last = self.audio_index[-1]
+        return int(round(last['time'] * self.rate)) + int(last['length']) // self.frame_bytes
+
+    def duration(self):
+        """已归档音频的时长（秒）"""
+        return self.total_frames() / self.rate
+
+    def measurement_count(self):
+        return len(self.measurement_index)
+
+    def measurement_times(self):
+        return self.measurement_index['time']
+
+    def read_audio(self, start=0.0, end=None):
+        """
+        读取 [start, end) 秒的音频
+
+        返回:
+            np.ndarray: int16数组，多声道时形状为(帧数, 声道)
+        """
+        end_frame = None if end is None else int(round(end * self.rate))
+        return self.read_frames(int(round(max(0.0, start) * self.rate)), end_frame)
+
+    def read_frames(self, start_frame, end_frame=None):
+        """按帧序号读取 [start_frame, end_frame) 的音频"""
+        index = self.audio_index
+        total = self.total_frames()
+        end_frame = total if end_frame is None else min(end_frame, total)
+        if not len(index) or end_frame <= start_frame:
+            return np.zeros((0,) if self.channels == 1 else (0, self.channels), dtype=np.int16)
+        first = max(0, int(np.searchsorted(index['time'], start_frame / self.rate, side='right')) - 1)
+        last = int(np.searchsorted(index['time'], end_frame / self.rate, side='left'))
+        parts = []
+        for entry in index[first:last]:
+            block_start = int(round(entry['time'] * self.rate))
+            block_frames = int(entry['length']) // self.frame_bytes
+            lo = max(start_frame, block_start) - block_start
+            hi = min(end_frame, block_start + block_frames) - block_start
+            if hi <= lo:
+                continue
+            offset = int(entry['offset'])
+            parts.append(self.data[offset + lo * self.frame_bytes:offset + hi * self.frame_bytes])
+        audio = np.frombuffer(b''.join(parts), dtype=np.int16)
+        if self.channels > 1:
+            audio = audio.reshape(-1, self.channels)
+        return audio
+
+    def read_measurements(self, start=None, end=None):
+        """
+        读取媒体时间在 [start, end] 内的测量记录
+
+        返回:
+            dict: 列式数据 {'times': 媒体时间, 'timestamps': 墙钟时间, 'bpm': ..., 'db': ..., 'hz': ...}
+        """
+        index = self.measurement_index
+        lo = 0 if start is None else int(np.searchsorted(index['time'], start, side='left'))
+        hi = len(index) if end is None else int(np.searchsorted(index['time'], end, side='right'))
+        selected = index[lo:hi]
+        records = np.empty((len(selected), 4))
+        for i, entry in enumerate(selected):
+            offset = int(entry['offset'])
+            records[i] = MEASUREMENT_RECORD.unpack_from(self.data, offset)
+        return {'times': selected['time'].tolist(), 'timestamps': records[:, 0].tolist(),
+                'bpm': records[:, 1].tolist(), 'db': records[:, 2].tolist(), 'hz': records[:, 3].tolist()}
+
+
+def rebuild_index(path):
+    """
+    扫描数据文件重建两个索引（索引文件损坏或丢失时使用）；截断末尾不完整的块
+
+    返回:
+        (音频块数, 测量记录数)
+    """
+    data_path = os.path.join(path, DATA_FILE)
+    size = os.path.getsize(data_path)
+    entries = {KIND_AUDIO: [], KIND_MEASUREMENT: []}
+    valid = 0
+    with open(data_path, 'rb') as f:
+        while valid + CHUNK_HEADER.size <= size:
+            f.seek(valid)
+            kind, length, media_time = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+            end = valid + CHUNK_HEADER.size + length
+            if kind not in entries or end > size:
+                break
+            entries[kind].append(INDEX_ENTRY.pack(media_time, valid + CHUNK_HEADER.size, length))
+            valid = end
+    if valid < size:
+        with open(data_path, 'r+b') as f:
+            f.truncate(valid)
+    for kind, name in ((KIND_AUDIO, AUDIO_INDEX_FILE), (KIND_MEASUREMENT, MEASUREMENT_INDEX_FILE)):
+        with open(os.path.join(path, name), 'wb') as f:
+            f.write(b''.join(entries[kind]))
+    return len(entries[KIND_AUDIO]), len(entries[KIND_MEASUREMENT])
+
+
+def is_session_archive(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+class ArchiveReplaySource(ReplaySource):
+    """回放会话归档中 [start, end) 秒的音频"""
+
+    def __init__(self, path, start=0.0, end=None, realtime=False, loop=False):
+        self.path = path
+        self.archive = SessionArchive(path)
+        super().__init__(self.archive.rate, self.archive.channels, realtime, loop)
+        self.start_frame = int(round(start * self.rate))
+        self.end_frame = self.archive.total_frames() if end is None else int(round(end * self.rate))
+        self.position = self.start_frame
+
+    def open(self):
+        if self.archive is None:
+            self.archive = SessionArchive(self.path)
+        self.position = self.start_frame
+        return super().open()
+
+    def _read_frames(self, frames):
+        end = min(self.end_frame, self.position + frames)
+        audio = self.archive.read_frames(self.position, end)
+        self.position = end
+        return audio.tobytes()
+
+    def _rewind(self):
+        self.position = self.start_frame
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None  # 再次open()时重新映射
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+整个会话的列式导出
+从 MeasurementStore 分块读取全部测量记录（timestamps, bpm, db, hz, confidence），
+写入压缩NPZ；安装了pyarrow时也可写入Parquet。内存只占用一块数据
+
+用法:
+    python session_export.py session.npz --stream gui
+    python session_export.py session.parquet --stream gui --start 2024-05-01T08:00:00
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+import numpy as np
+
+from measurement_store import EXPORT_CHUNK_ROWS
+
+COLUMNS = ('timestamps', 'bpm', 'db', 'hz', 'confidence')
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_npz(store, path, stream_id='default', start=None, end=None,
+               chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    """
+    导出为压缩NPZ（np.load(path)['bpm'] 等直接读取）
+
+    每列先按块写入临时.npy（内存映射），最后逐个压缩进zip，不需要把整列放进内存
+
+    返回:
+        int: 导出的行数
+    """
+    total = store.count(start, end, stream_id)
+    tmp_dir = tempfile.mkdtemp(prefix='export_', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        arrays = {name: np.lib.format.open_memmap(os.path.join(tmp_dir, f'{name}.npy'), mode='w+',
+                                                  dtype=np.float64, shape=(total,))
+                  for name in COLUMNS}
+        written = 0
+        for chunk in store.iter_chunks(start, end, stream_id, chunk_rows):
+            n = min(len(chunk['timestamps']), total - written)
+            for name in COLUMNS:
+                arrays[name][written:written + n] = chunk[name][:n]
+            written += n
+            if progress is not None:
+                progress(written, total)
+            if written >= total:
+                break
+        for name in COLUMNS:
+            arrays[name][written:] = np.nan
+            arrays[name].flush()
+        del arrays
+
+        tmp_path = path + '.tmp'
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name in COLUMNS:
+                archive.write(os.path.join(tmp_dir, f'{name}.npy'), arcname=f'{name}.npy')
+        os.replace(tmp_path, path)
+        return written
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def export_parquet(store, path, stream_id='default', start=None, end=None,
+                   chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    """
+    导出为Parquet（需要pyarrow），每块写成一个row group
+
+    返回:
+        int: 导出的行数
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    total = store.count(start, end, stream_id)
+    schema = pa.schema([(name, pa.float64()) for name in COLUMNS])
+    tmp_path = path + '.tmp'
+    written = 0
+    with pq.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+        for chunk in store.iter_chunks(start, end, stream_id, chunk_rows):
+            writer.write_table(pa.table({name: chunk[name] for name in COLUMNS}, schema=schema))
+            written += len(chunk['timestamps'])
+            if progress is not None:
+                progress(written, total)
+    os.replace(tmp_path, path)
+    return written
+
+
+def export_session(store, path, stream_id='default', start=None, end=None,
+                   chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    """
+    按扩展名选择格式导出（.parquet/.pq 为Parquet，其余为NPZ）
+
+    参数:
+        store (MeasurementStore): 测量数据存储
+        path (str): 输出文件
+        stream_id (str): 流ID（GUI为'gui'，模拟数据为'default'）
+        start, end (float, optional): Unix时间戳范围；end默认取导出开始的时刻，
+                                      导出过程中新增的数据不会混入
+        progress (callable, optional): progress(已写行数, 总行数)
+
+    返回:
+        int: 导出的行数
+    """
+    end = time.time() if end is None else end
+    if path.lower().endswith(PARQUET_EXTENSIONS):
+        return export_parquet(store, path, stream_id, start, end, chunk_rows, progress)
+    return export_npz(store, path, stream_id, start, end, chunk_rows, progress)
+
+
+def export_in_background(store, path, stream_id='default', start=None, end=None, on_done=None, progress=None):
+    """
+    在后台线程中导出，不阻塞调用方（如界面线程）
+
+    参数:
+        on_done (callable, optional): on_done(行数, 错误)，成功时错误为None
+
+    返回:
+        threading.Thread: 导出线程
+    """
+    def run():
+        try:
+            rows = export_session(store, path, stream_id, start, end, progress=progress)
+        except Exception as e:
+            if on_done is not None:
+                on_done(0, e)
+            return
+        if on_done is not None:
+            on_done(rows, None)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _parse_time(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+if __name__ == "__main__":
+    import argparse
+    from measurement_store import MeasurementStore
+
+    parser = argparse.ArgumentParser(description='导出整个会话的测量数据（NPZ/Parquet）')
+    parser.add_argument('output', help='输出文件（.npz 或 .parquet）')
+    parser.add_argument('--stream', default='default', help='流ID（GUI为gui）')
+    parser.add_argument('--start', help='开始时间（Unix时间戳或ISO格式）')
+    parser.add_argument('--end', help='结束时间（Unix时间戳或ISO格式）')
+    args = parser.parse_args()
+
+    measurement_store = MeasurementStore()
+    try:
+        begin = time.perf_counter()
+        count = export_session(measurement_store, args.output, args.stream,
+                               _parse_time(args.start), _parse_time(args.end))
+        print(f"Exported {count} rows to {args.output} in {time.perf_counter() - begin:.2f}s")
+    finally:
+        measurement_store.close()
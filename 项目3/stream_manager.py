@@ -0,0 +1,536 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import numpy as np
+
+from activity_gate import ActivityGate
+from audio_analysis import analyze_window, window_level, DEFAULT_RATE
+from beat_tracker import BeatTracker
+from config import DEVICE_SAMPLE_RATE, TEMPO_TRACKING_ENABLED
+from governor import QualityGovernor
+from input_source import PyAudioSource, ResamplingSource
+from metrics import metrics
+from tempo_tracker import TempoTracker
+from warmup import configure_jit_cache
+
+CHUNK = 1024
+MAX_HISTORY = 100
+
+
+def analyze_in_worker(audio, rate, noise_templates, collect_timings, freq_range=None, quality=None,
+                      with_tempo=True):
+    """进程池中执行的分析任务；阶段耗时随结果带回主进程汇总"""
+    timings = {} if collect_timings else None
+    result = analyze_window(audio, rate, noise_templates, timings=timings, freq_range=freq_range,
+                            quality=quality, with_tempo=with_tempo)
+    return result, timings
+
+
+class AudioStream:
+    """单路音频流：拥有独立的采集缓冲、分析状态和历史数据"""
+
+    def __init__(self, stream_id, device_index=None, channel=0, name=None,
+                 rate=DEFAULT_RATE, split_time=2.0, max_history=MAX_HISTORY, source=None,
+                 frequency_range=None):
+        self.stream_id = stream_id
+        self.device_index = device_index
+        self.channel = channel
+        self.name = name or f"stream-{stream_id}"
+        self.source = source  # 可选：独占的InputSource（如文件回放），None表示使用设备采集
+        self.rate = source.rate if source is not None else rate
+        self.split_time = split_time
+        self.max_history = max_history
+        self.noise_templates = []
+        self.frequency_range = frequency_range  # {'min': Hz, 'max': Hz}，None表示全频带argmax
+        self.beat_tracker = BeatTracker(self.rate)  # 逐块跟踪节拍，供灯光同步预测下一拍
+        self.tempo_tracker = TempoTracker(self.rate) if TEMPO_TRACKING_ENABLED else None
+        self.tempo = None         # 最近一次跨窗口速度跟踪结果
+        self.governor = QualityGovernor(gauge_labels={'stream': stream_id})
+        self.activity_gate = ActivityGate(gauge_labels={'stream': stream_id})  # 静音窗口跳过分析
+        self.submitted_at = None  # pending窗口的提交时刻，用于统计分析延迟
+
+        self.lock = threading.Lock()
+        self.buffer = []          # 采集缓冲：当前窗口内已收到的样本块
+        self.buffered_samples = 0
+        self.consumed_samples = 0  # 开始采集以来已切出窗口的样本数
+        self.window_start = 0.0    # 最近切出的窗口在流中的起始时刻（秒），回放时即媒体时间
+        self.pending = None       # 正在分析的窗口（Future）
+        self.result_applied = threading.Event()  # pending窗口的结果已写入
+        self.result_applied.set()
+        self.dropped_windows = 0
+        self.error = None
+        self.state = {
+            'bpm': 0,
+            'db': 0,
+            'hz': 0,
+            'bpm_confidence': 0.0,
+            'no_signal': False,
+            'timestamp': datetime.now().isoformat(),
+            'is_recording': False,
+        }
+        self.history = {'bpm': [], 'db': [], 'hz': [], 'timestamps': []}
+
+    def window_samples(self):
+        """一个分析窗口包含的样本数"""
+        return int(self.rate * self.split_time)
+
+    def push_samples(self, samples, captured_at=None):
+        """
+        写入采集到的样本，凑满一个窗口时返回该窗口，否则返回None
+
+        参数:
+            captured_at (float, optional): 最后一个样本的采集时刻（墙钟时间），用于节拍预测；默认当前时间
+        """
+        with self.lock:
+            if not self.state['is_recording']:
+                return None
+            self.beat_tracker.push(samples, captured_at)
+            self.buffer.append(samples)
+            self.buffered_samples += len(samples)
+            needed = self.window_samples()
+            if self.buffered_samples < needed:
+                return None
+            audio = np.concatenate(self.buffer)
+            rest = audio[needed:]
+            self.buffer = [rest] if len(rest) else []
+            self.buffered_samples = len(rest)
+            self.window_start = self.consumed_samples / self.rate
+            self.consumed_samples += needed
+            return audio[:needed]
+
+    def track_tempo(self, window):
+        """速度跟踪依赖窗口顺序，在采集线程中按到达顺序更新（只做一次分帧FFT，开销很小）"""
+        if self.tempo_tracker is None:
+            return
+        with metrics.stage('tempo_track'):
+            tempo = self.tempo_tracker.update(window)
+        with self.lock:
+            self.tempo = tempo
+
+    def apply_result(self, result):
+        """写入一个窗口的分析结果并更新历史"""
+        with self.lock:
+            if self.tempo is not None:
+                # 跨窗口跟踪的速度替换单窗口估算，持久化和监听者拿到的也是跟踪值
+                result['bpm'] = self.tempo['bpm']
+                result['confidence'] = self.tempo['confidence']
+                self.state['bpm_confidence'] = round(self.tempo['confidence'], 3)
+            elif result['bpm'] is None:
+                result['bpm'] = 0.0  # 跟踪状态在分析期间被重置（重新开始采集）
+            bpm = result['bpm']
+            self.state['bpm'] = int(round(bpm))
+            self.state['db'] = int(round(result['db']))
+            self.state['hz'] = int(round(result['hz']))
+            self.state['no_signal'] = False
+            self.state['timestamp'] = datetime.now().isoformat()
+            self.beat_tracker.set_tempo_hint(bpm)
+            self.error = None
+            self._append_history()
+
+    def apply_no_signal(self, db):
+        """
+        写入一个无信号窗口：只有响度，BPM/主频置0；速度跟踪从下一个有信号的窗口重新开始，
+        节拍预测暂停到下一个有信号的窗口
+        """
+        with self.lock:
+            if self.tempo_tracker is not None and not self.state['no_signal']:
+                self.tempo_tracker.reset()
+            self.tempo = None
+            self.beat_tracker.suspend()
+            self.state.update(bpm=0, db=int(round(db)), hz=0, bpm_confidence=0.0, no_signal=True,
+                              timestamp=datetime.now().isoformat())
+            self.error = None
+            self._append_history()
+
+    def _append_history(self):
+        """调用方持有 self.lock"""
+        self.history['bpm'].append(self.state['bpm'])
+        self.history['db'].append(self.state['db'])
+        self.history['hz'].append(self.state['hz'])
+        self.history['timestamps'].append(self.state['timestamp'])
+        for key in self.history:
+            if len(self.history[key]) > self.max_history:
+                self.history[key] = self.history[key][-self.max_history:]
+
+    def snapshot(self):
+        """当前数据快照（用于HTTP接口）"""
+        with self.lock:
+            data = dict(self.state)
+            data.update({
+                'stream_id': self.stream_id,
+                'name': self.name,
+                'device_index': self.device_index,
+                'channel': self.channel,
+                'split_time': self.split_time,
+                'frequency_range': self.frequency_range,
+                'dropped_windows': self.dropped_windows,
+                'quality_level': self.governor.level,
+                'quality': self.governor.settings['name'],
+                'error': self.error,
+            })
+            return data
+
+    def history_snapshot(self):
+        """历史数据快照"""
+        with self.lock:
+            return {key: list(values) for key, values in self.history.items()}
+
+
+class DeviceCapture:
+    """单个输入源的采集线程，按声道把数据分发给订阅它的各路流"""
+
+    def __init__(self, manager, device_index=None, rate=DEFAULT_RATE, chunk=CHUNK, source=None):
+        self.manager = manager
+        self.device_index = device_index
+        self.rate = rate
+        self.chunk = chunk
+        self.source = source  # 预先构造的输入源；None时按设备索引打开麦克风
+        self.streams = []
+        self.running = False
+        self.thread = None
+        self.stop_event = None  # 每次start()一个新的事件：超时未退出的旧线程不会影响新线程
+
+    def channels(self):
+        return max([s.channel for s in self.streams] + [0]) + 1
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(self.stop_event,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.stop_event is not None:
+            self.stop_event.set()
+        if self.source is not None:
+            self.source.interrupt()
+        thread, self.thread = self.thread, None
+        if thread is not None:
+            thread.join(timeout=2)
+            if thread.is_alive() and self.source is not None:
+                # 预先构造的输入源由新旧线程共用，旧线程关闭它之后才能重新打开
+                thread.join()
+
+    def join(self, timeout=None):
+        """等待采集线程结束（文件回放读完时自行结束）"""
+        thread = self.thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _open_source(self):
+        if self.source is not None:
+            return self.source.open()
+        if DEVICE_SAMPLE_RATE and DEVICE_SAMPLE_RATE != self.rate:
+            # 设备以原生采样率采集，流式重采样到分析采样率
+            device = PyAudioSource(self.device_index, DEVICE_SAMPLE_RATE, self.channels(), self.chunk)
+            return ResamplingSource(device, self.rate, self.channels()).open()
+        return PyAudioSource(self.device_index, self.rate, self.channels(), self.chunk).open()
+
+    def _run(self, stop_event):
+        try:
+            source = self._open_source()
+            try:
+                channels = source.channels
+                # 非实时源（快速回放）不丢窗口，而是等待上一窗口分析完成
+                block = not source.realtime
+                while not stop_event.is_set():
+                    with metrics.stage('capture'):
+                        data = source.read(self.chunk)
+                    # 块内最后一个样本的采集时刻：扣除设备/抖动缓冲中排在它后面的数据
+                    captured_at = time.time() - source.latency
+                    frames = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+                    frames = frames.reshape(-1, channels)
+                    for audio_stream in list(self.streams):
+                        window = audio_stream.push_samples(frames[:, audio_stream.channel].copy(), captured_at)
+                        if window is not None:
+                            self.manager.submit(audio_stream, window, block=block)
+            finally:
+                source.close()
+        except EOFError:
+            if stop_event.is_set():
+                return  # stop() 中断了等待数据的网络源
+            # 回放结束（或网络源断开）：停止各路流，已提交的窗口仍会完成分析
+            for audio_stream in self.streams:
+                with audio_stream.lock:
+                    audio_stream.state['is_recording'] = False
+        except Exception as e:
+            metrics.inc('errors')
+            for audio_stream in self.streams:
+                with audio_stream.lock:
+                    audio_stream.error = str(e)
+        finally:
+            if self.stop_event is stop_event:
+                self.running = False
+
+
+class StreamManager:
+    """多路音频流管理：每个设备一个采集线程，分析任务调度到按CPU核数配置的进程池"""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = None
+        self.streams = {}
+        self.captures = {}
+        self.lock = threading.Lock()
+        self.measurement_store = None  # 可选：MeasurementStore，用于持久化每个窗口的结果
+        self.result_listeners = []     # 每个窗口分析完成后调用 listener(audio_stream, result)；result['media_time']为窗口起始时刻
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                # 子进程同样使用持久化JIT缓存，避免每个worker重新编译
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                    initializer=configure_jit_cache)
+            return self.executor
+
+    def _submit_to_pool(self, *args):
+        """
+        提交分析任务；进程池已损坏（工作进程被OOM等杀掉）时丢弃并用新建的进程池重试一次
+
+        返回:
+            tuple: (Future, 所用的进程池)
+        """
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                return executor.submit(analyze_in_worker, *args), executor
+            except BrokenProcessPool:
+                self._discard_executor(executor)
+                if attempt:
+                    raise
+
+    def _discard_executor(self, executor):
+        """丢弃已损坏的进程池，下一次提交时重建"""
+        with self.lock:
+            if self.executor is not executor:
+                return
+            self.executor = None
+        metrics.inc('stream_pool_restarts')
+        executor.shutdown(wait=False)
+
+    @staticmethod
+    def _drop_window(audio_stream):
+        with audio_stream.lock:
+            audio_stream.dropped_windows += 1
+        metrics.inc('dropped_windows')
+
+    def add_stream(self, stream_id, device_index=None, channel=0, **kwargs):
+        """注册一路流，返回AudioStream；stream_id重复时抛出ValueError"""
+        with self.lock:
+            if stream_id in self.streams:
+                raise ValueError(f"Stream '{stream_id}' already exists")
+            audio_stream = AudioStream(stream_id, device_index, channel, **kwargs)
+            self.streams[stream_id] = audio_stream
+            return audio_stream
+
+    def remove_stream(self, stream_id):
+        """停止并移除一路流"""
+        self.stop_stream(stream_id)
+        with self.lock:
+            audio_stream = self.streams.pop(stream_id, None)
+        if audio_stream is None:
+            return False
+        audio_stream.governor.drop_gauge()
+        audio_stream.activity_gate.drop_gauge()
+        return True
+
+    def get_stream(self, stream_id):
+        with self.lock:
+            return self.streams.get(stream_id)
+
+    def list_streams(self):
+        with self.lock:
+            streams = list(self.streams.values())
+        return [s.snapshot() for s in streams]
+
+    @staticmethod
+    def _capture_key(audio_stream):
+        """同一设备+采样率的流共享一个采集线程；独占输入源的流各自一个"""
+        if audio_stream.source is not None:
+            return ('source', audio_stream.stream_id)
+        return (audio_stream.device_index, audio_stream.rate)
+
+    def start_stream(self, stream_id):
+        """开始采集和分析；同一设备上的新声道会触发该设备采集重启"""
+        audio_stream = self.get_stream(stream_id)
+        if audio_stream is None:
+            return False
+        with audio_stream.lock:
+            if not audio_stream.state['is_recording']:
+                audio_stream.beat_tracker.reset()
+                if audio_stream.tempo_tracker is not None:
+                    audio_stream.tempo_tracker.reset()
+                audio_stream.tempo = None
+                audio_stream.governor.reset()
+                audio_stream.activity_gate.reset()
+                audio_stream.state['no_signal'] = False
+                audio_stream.consumed_samples = 0
+            audio_stream.state['is_recording'] = True
+        with self.lock:
+            key = self._capture_key(audio_stream)
+            capture = self.captures.get(key)
+            if capture is None:
+                capture = DeviceCapture(self, audio_stream.device_index, audio_stream.rate,
+                                        source=audio_stream.source)
+                self.captures[key] = capture
+            restart = capture.running and audio_stream.channel >= capture.channels()
+            if audio_stream not in capture.streams:
+                capture.streams.append(audio_stream)
+        if restart:
+            capture.stop()
+        capture.start()
+        return True
+
+    def stop_stream(self, stream_id):
+        """停止一路流；设备上没有其他流时关闭该设备采集"""
+        audio_stream = self.get_stream(stream_id)
+        if audio_stream is None:
+            return False
+        with audio_stream.lock:
+            audio_stream.state['is_recording'] = False
+            audio_stream.buffer = []
+            audio_stream.buffered_samples = 0
+        with self.lock:
+            key = self._capture_key(audio_stream)
+            capture = self.captures.get(key)
+            if capture is not None and audio_stream in capture.streams:
+                capture.streams.remove(audio_stream)
+            idle = capture is not None and not capture.streams
+            if idle:
+                del self.captures[key]
+        if idle:
+            capture.stop()
+        return True
+
+    def submit(self, audio_stream, audio, block=False):
+        """
+        提交一个窗口到进程池
+
+        上一个窗口仍在分析时：实时采集丢弃本窗口以避免积压；block=True（快速回放）时等待其完成。
+        无信号的窗口不提交，直接发布无信号状态
+        """
+        if block:
+            self.wait_pending(audio_stream)
+        media_time = audio_stream.window_start  # push_samples刚切出这个窗口（同一采集线程）
+        if not audio_stream.activity_gate.check(audio, audio_stream.rate):
+            self._on_no_signal(audio_stream, audio, media_time)
+            return None
+        audio_stream.beat_tracker.resume()
+        audio_stream.track_tempo(audio)
+        with audio_stream.lock:
+            if audio_stream.pending is not None and not audio_stream.pending.done():
+                audio_stream.dropped_windows += 1
+                metrics.inc('dropped_windows')
+                audio_stream.governor.record_overrun()
+                return None
+            if not audio_stream.governor.should_analyze():
+                metrics.inc('skipped_windows')
+                return None
+            noise_templates = list(audio_stream.noise_templates)
+            freq_range = audio_stream.frequency_range
+            quality = audio_stream.governor.settings
+            audio_stream.submitted_at = time.perf_counter()
+            audio_stream.result_applied.clear()
+        try:
+            # 有速度跟踪时BPM取跟踪值，进程池中不再做单窗口速度估算
+            future, executor = self._submit_to_pool(audio, audio_stream.rate, noise_templates, metrics.enabled,
+                                                    freq_range, quality, audio_stream.tempo_tracker is None)
+        except BrokenProcessPool:
+            # 新建的进程池也无法提交：只丢弃这个窗口，采集线程和同设备的其他流继续运行
+            audio_stream.result_applied.set()
+            self._drop_window(audio_stream)
+            return None
+        except Exception:
+            audio_stream.result_applied.set()
+            raise
+        with audio_stream.lock:
+            audio_stream.pending = future
+        window_seconds = len(audio) / audio_stream.rate
+        future.add_done_callback(
+            lambda f, s=audio_stream: self._on_done(s, f, window_seconds, media_time, executor))
+        return future
+
+    @staticmethod
+    def wait_pending(audio_stream, timeout=None):
+        """等待该流正在分析的窗口完成（包括结果回调）"""
+        with audio_stream.lock:
+            pending = audio_stream.pending
+        if pending is not None:
+            try:
+                pending.result(timeout)
+            except Exception:
+                pass
+            audio_stream.result_applied.wait(timeout)
+
+    def wait_stream(self, stream_id, timeout=None):
+        """等待一路流的采集结束并完成最后一个窗口的分析（用于文件回放）"""
+        audio_stream = self.get_stream(stream_id)
+        if audio_stream is None:
+            return False
+        with self.lock:
+            capture = self.captures.get(self._capture_key(audio_stream))
+        if capture is not None:
+            capture.join(timeout)
+        self.wait_pending(audio_stream, timeout)
+        return True
+
+    def _on_no_signal(self, audio_stream, audio, media_time):
+        # 不写入测量库（静音期间没有可用的BPM/主频），监听者照常收到一条
+        with audio_stream.lock:
+            noise_templates = list(audio_stream.noise_templates)
+            quality = audio_stream.governor.settings
+        # 响度与有信号的窗口一样按噪声模板去噪后计算，门限开合时读数不跳变
+        result = {'bpm': 0.0, 'db': window_level(audio, noise_templates, quality), 'hz': 0.0, 'no_signal': True,
+                  'media_time': media_time}
+        audio_stream.apply_no_signal(result['db'])
+        try:
+            for listener in list(self.result_listeners):
+                listener(audio_stream, result)
+        except Exception as e:
+            metrics.inc('errors')
+            with audio_stream.lock:
+                audio_stream.error = str(e)
+
+    def _on_done(self, audio_stream, future, window_seconds, media_time, executor):
+        try:
+            result, timings = future.result()
+            result['media_time'] = media_time
+            with audio_stream.lock:
+                # 从提交到拿到结果的耗时（含进程池排队），超出预算时下一个窗口降档
+                audio_stream.governor.record(time.perf_counter() - audio_stream.submitted_at, window_seconds)
+            metrics.observe_many(timings)
+            audio_stream.apply_result(result)
+            if self.measurement_store is not None:
+                self.measurement_store.add(result['bpm'], result['db'], result['hz'],
+                                           stream_id=audio_stream.stream_id,
+                                           confidence=result.get('confidence'))
+            for listener in list(self.result_listeners):
+                listener(audio_stream, result)
+        except BrokenProcessPool:
+            # 工作进程异常退出：这个窗口丢失，不算流错误；下一个窗口提交到重建的进程池
+            self._discard_executor(executor)
+            self._drop_window(audio_stream)
+        except Exception as e:
+            metrics.inc('errors')
+            with audio_stream.lock:
+                audio_stream.error = str(e)
+        finally:
+            audio_stream.result_applied.set()
+
+    def shutdown(self):
+        """停止所有流并关闭进程池"""
+        for stream_id in list(self.streams):
+            self.stop_stream(stream_id)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+stream_manager = StreamManager()
@@ -0,0 +1,128 @@
+import threading
+
+import numpy as np
+
+from audio_analysis import DEFAULT_RATE, OnsetEnvelope
+
+N_FFT = 1024
+HOP = 256
+MIN_BPM = 40
+MAX_BPM = 240
+STATES_PER_OCTAVE = 48     # 对数速度网格的密度（约1.5%一格），整数便于按八度平移
+HISTORY_SECONDS = 8.0      # 跨窗口保留的起音包络长度，短窗口也能看到足够多的拍
+PRIOR_BPM = 120.0          # 初始先验：以120BPM为中心、标准差1个八度的对数正态（与librosa一致）
+PRIOR_STD_OCTAVES = 1.0
+DRIFT_OCTAVES = 0.04       # 速度每秒漂移的标准差（八度）
+RESET_RATE = 0.002         # 每秒跳到任意速度（切歌）的概率
+OBSERVATION_SHARPNESS = 8.0
+OCTAVE_SUPPORT = 0.8       # 二倍/二分之一速度处的峰值对当前速度的支持权重
+CONFIDENCE_OCTAVES = 1/24  # 置信度：后验在峰值±半个半音范围内的概率质量
+
+
+class TempoTracker:
+    """
+    跨窗口的速度跟踪（离散速度网格上的HMM前向滤波）
+
+    每个分析窗口只有几秒甚至不到一秒的音频，单独估算时读数跳动且常出现半速/倍速错误。
+    这里用流式起音包络把各窗口接续成最近 HISTORY_SECONDS 的历史，每次更新：
+        1. 预测：后验按高斯漂移扩散（时间越长扩散越大），并混入少量先验以便切歌后重新收敛
+        2. 观测：历史包络自相关在各速度对应滞后处的值（分数滞后线性插值），
+           并用二倍/二分之一速度处的值做八度折叠，使八度误读支持当前跟踪的速度而不是把它拉走
+        3. 后验 = 预测 × exp(锐度 × 观测)，归一化
+
+    返回后验峰值（对数域抛物线插值）作为BPM，峰值附近的概率质量作为置信度
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, n_fft=N_FFT, hop=HOP, history_seconds=HISTORY_SECONDS):
+        self.rate = rate
+        self.onsets = OnsetEnvelope(n_fft, hop)
+        self.frame_rate = rate / hop
+        self.history_frames = int(history_seconds * self.frame_rate)
+        octaves = np.log2(MAX_BPM / MIN_BPM)
+        self.log_bpms = np.log2(MIN_BPM) + np.arange(int(octaves * STATES_PER_OCTAVE) + 1) / STATES_PER_OCTAVE
+        self.bpms = 2.0 ** self.log_bpms
+        self.lags = 60.0 * self.frame_rate / self.bpms
+        self.prior = np.exp(-0.5 * ((self.log_bpms - np.log2(PRIOR_BPM)) / PRIOR_STD_OCTAVES) ** 2)
+        self.prior /= self.prior.sum()
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清空历史（开始新的测量时调用）"""
+        with self.lock:
+            self.onsets.reset()
+            self.envelope = np.zeros(0, dtype=np.float32)
+            self.posterior = self.prior.copy()
+            self.bpm = 0.0
+            self.confidence = 0.0
+
+    def _predict(self, seconds):
+        sigma = DRIFT_OCTAVES * np.sqrt(max(seconds, 1e-3)) * STATES_PER_OCTAVE
+        radius = max(1, int(np.ceil(3 * sigma)))
+        kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+        spread = np.convolve(self.posterior, kernel / kernel.sum(), mode='same')
+        reset = min(1.0, RESET_RATE * seconds)
+        spread = (1 - reset) * spread / spread.sum() + reset * self.prior
+        return spread
+
+    def _observe(self):
+        """历史包络在网格各速度上的归一化自相关（0~1），包络无起伏时返回None"""
+        env = self.envelope - self.envelope.mean()
+        n = len(env)
+        if n < 2 or not np.any(env):
+            return None
+        spectrum = np.fft.rfft(env, 2 * n)
+        autocorr = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+        if autocorr[0] <= 0:
+            return None
+        autocorr = np.maximum(autocorr / autocorr[0], 0)
+        valid = self.lags < n - 1
+        observation = np.zeros(len(self.lags))
+        observation[valid] = np.interp(self.lags[valid], np.arange(n), autocorr)
+        # 八度折叠：速度t同时获得2t、t/2处观测的（打折）支持
+        octave = STATES_PER_OCTAVE
+        folded = observation.copy()
+        folded[:-octave] = np.maximum(folded[:-octave], OCTAVE_SUPPORT * observation[octave:])
+        folded[octave:] = np.maximum(folded[octave:], OCTAVE_SUPPORT * observation[:-octave])
+        return folded
+
+    def update(self, audio, seconds=None, contiguous=True):
+        """
+        送入一个分析窗口的音频
+
+        参数:
+            audio (np.ndarray): 该窗口的浮点音频（与上一窗口连续时历史包络无缝衔接）
+            seconds (float, optional): 距上次更新的时长，默认按音频长度计算
+            contiguous (bool): 与上一窗口之间没有间隔；False时丢弃起音历史和上一帧频谱
+                               （拼接不连续的音频会在接缝处产生伪起音并破坏自相关），速度后验保留
+
+        返回:
+            dict: {'bpm': 跟踪后的BPM, 'confidence': 0~1}
+        """
+        seconds = len(audio) / self.rate if seconds is None else seconds
+        with self.lock:
+            if not contiguous:
+                self.onsets.reset()
+                self.envelope = np.zeros(0, dtype=np.float32)
+            onset_env = self.onsets.push(audio)
+            self.envelope = np.concatenate([self.envelope, onset_env])[-self.history_frames:]
+            posterior = self._predict(seconds)
+            observation = self._observe()
+            if observation is not None:
+                # 减去最大值避免指数溢出，归一化后不影响结果
+                likelihood = np.exp(OBSERVATION_SHARPNESS * (observation - observation.max()))
+                posterior = posterior * likelihood
+            self.posterior = posterior / posterior.sum()
+            self.bpm, self.confidence = self._estimate()
+            return {'bpm': self.bpm, 'confidence': self.confidence}
+
+    def _estimate(self):
+        i = int(np.argmax(self.posterior))
+        log_bpm = self.log_bpms[i]
+        if 0 < i < len(self.posterior) - 1:
+            left, center, right = np.log(self.posterior[i - 1:i + 2] + 1e-300)
+            denominator = left - 2 * center + right
+            if denominator:
+                log_bpm += float(np.clip(0.5 * (left - right) / denominator, -0.5, 0.5)) / STATES_PER_OCTAVE
+        near = np.abs(self.log_bpms - log_bpm) <= CONFIDENCE_OCTAVES
+        return float(2.0 ** log_bpm), float(self.posterior[near].sum())
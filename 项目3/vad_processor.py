@@ -4,18 +4,26 @@ import webrtcvad
 import wave
 import os
 from config import VAD_AGGRESSIVENESS, VAD_SEGMENTS_DIR, INPUT_AUDIO_PATH
+from resampler import convert_file_rate
+
+VAD_RATES = (8000, 16000, 32000, 48000)
+VAD_DEFAULT_RATE = 16000
 
 def read_wave(path):
-    """Reads a .wav file. Returns (samp_rate, audio_data)."""
+    """Reads a .wav file. Returns (samp_rate, audio_data).
+
+    Audio that WebRTC VAD cannot take directly (stereo, non 16-bit samples or
+    an unsupported rate) is converted to 16-bit mono, resampled to 16 kHz if needed.
+    """
     with wave.open(path, 'rb') as wf:
         num_channels = wf.getnchannels()
-        assert num_channels == 1
         sample_width = wf.getsampwidth()
-        assert sample_width == 2
         sample_rate = wf.getframerate()
-        assert sample_rate in (8000, 16000, 32000, 48000)
         pcm_data = wf.readframes(wf.getnframes())
+    if num_channels == 1 and sample_width == 2 and sample_rate in VAD_RATES:
         return sample_rate, pcm_data
+    out_rate = sample_rate if sample_rate in VAD_RATES else VAD_DEFAULT_RATE
+    return out_rate, convert_file_rate(pcm_data, sample_rate, num_channels, sample_width, out_rate)
 
 def write_wave(path, audio, sample_rate):
     """Writes a .wav file. Returns nothing."""
@@ -120,9 +128,10 @@ if __name__ == "__main__":
     os.makedirs(output_dir, exist_ok=True)
 
     segments = vad_segment_audio(input_audio_path)
+    sample_rate = read_wave(input_audio_path)[0]
     for i, (start, end, audio_segment) in enumerate(segments):
         segment_filename = os.path.join(output_dir, f"segment_{i:03d}_{start:.2f}-{end:.2f}.wav")
-        write_wave(segment_filename, audio_segment, read_wave(input_audio_path)[0])
+        write_wave(segment_filename, audio_segment, sample_rate)
         print(f"Saved segment {i} to {segment_filename}")
 
 
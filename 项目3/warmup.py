@@ -0,0 +1,62 @@
+import os
+import threading
+import time
+
+from config import JIT_CACHE_DIR
+
+
+def configure_jit_cache(cache_dir=JIT_CACHE_DIR):
+    """
+    为numba设置可写的持久化缓存目录，librosa中cache=True的JIT函数编译结果可跨进程复用
+
+    必须在numba（即librosa）首次导入之前调用；已设置NUMBA_CACHE_DIR时保持不变
+    """
+    if 'NUMBA_CACHE_DIR' in os.environ:
+        return os.environ['NUMBA_CACHE_DIR']
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError:
+        return None
+    os.environ['NUMBA_CACHE_DIR'] = cache_dir
+    return cache_dir
+
+
+def warm_up(rate=16000, duration=2.0):
+    """
+    在静音缓冲上跑一遍完整的窗口分析路径，触发librosa导入与JIT编译
+
+    返回:
+        float: 预热耗时（秒）
+    """
+    import numpy as np
+    from audio_analysis import analyze_window
+    start = time.perf_counter()
+    analyze_window(np.zeros(int(rate * duration), dtype=np.float32), rate)
+    return time.perf_counter() - start
+
+
+def start_warmup(rate=16000, duration=2.0, on_done=None):
+    """
+    后台线程中预热分析路径
+
+    参数:
+        on_done (callable, optional): 完成后调用 on_done(elapsed, error)，error为None表示成功
+
+    返回:
+        threading.Event: 预热完成（无论成功与否）时置位
+    """
+    done = threading.Event()
+
+    def run():
+        elapsed, error = 0.0, None
+        try:
+            elapsed = warm_up(rate, duration)
+        except Exception as e:
+            error = e
+        finally:
+            done.set()
+        if on_done is not None:
+            on_done(elapsed, error)
+
+    threading.Thread(target=run, daemon=True).start()
+    return done